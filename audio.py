@@ -0,0 +1,143 @@
+import os
+import time
+from collections import deque
+
+import numpy as np
+import pygame
+
+import latency
+from settings import *
+
+# Sound effects. The mixer is opened with a small buffer so a tap is heard
+# within a few milliseconds, every sample is decoded into memory up front
+# (sounds/<name>.wav, or a synthesized fallback) and FRENZY's combo levels
+# play pitched variants that are also made up front, so playing a sound
+# never allocates or touches the disk.
+#
+# Taps share a pool of channels and steal the one that has played longest
+# when all are busy. Game events (bonus, time added, game over) have their
+# own reserved channels so taps can't cut them off.
+
+class Audio:
+
+    SOUNDS = ('tap', 'bonus', 'time', 'game_over')
+    EVENT_CHANNELS = 2 # reserved for everything but taps
+    PITCH_STEP = 2 # semitones per FRENZY combo level
+    DELAY_SAMPLES = 4096 # tap delays kept for the report, the oldest are dropped
+
+    def __init__(self, channels=AUDIO_CHANNELS, buffer=AUDIO_BUFFER, frequency=AUDIO_FREQUENCY, soundDir=SOUND_DIR) -> None:
+        self.enabled = False
+        self.tapDelays = deque(maxlen=self.DELAY_SAMPLES) # event arrival -> tap handed to the mixer, seconds
+        self.steals = 0
+
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.pre_init(frequency, -16, 2, buffer)
+                pygame.mixer.init()
+        except pygame.error as error:
+            print("audio disabled: {}".format(error))
+            return
+        self.enabled = True
+        self.frequency, sampleFormat, self.outputChannels = pygame.mixer.get_init()
+        self.buffer = buffer
+
+        pygame.mixer.set_num_channels(channels + self.EVENT_CHANNELS)
+        pygame.mixer.set_reserved(self.EVENT_CHANNELS)
+        self.eventChannels = [pygame.mixer.Channel(i) for i in range(self.EVENT_CHANNELS)]
+        self.tapChannels = [pygame.mixer.Channel(i) for i in range(self.EVENT_CHANNELS, channels + self.EVENT_CHANNELS)]
+        self.tapStarts = [0.0] * channels
+        self.nextEventChannel = 0
+
+        self.sounds = {name: self.load(name, soundDir) for name in self.SOUNDS}
+        # tap pitched up per FRENZY score multiplier (combo level)
+        samples = pygame.sndarray.array(self.sounds['tap'])
+        self.tapVariants = [self.sounds['tap']] + [self.pitched(samples, level * self.PITCH_STEP) for level in range(1, FRENZY_SCORE_STEPS + 1)]
+
+    def load(self, name, soundDir):
+        path = os.path.join(soundDir, name + '.wav')
+        if os.path.isfile(path):
+            # Sound decodes the whole file into memory
+            return pygame.mixer.Sound(path)
+        return self.make_sound(self.synthesize(name))
+
+    # Fallback effects so the game has sound without any files
+    def synthesize(self, name):
+        def tone(frequencies, duration, decay):
+            t = np.arange(int(self.frequency * duration)) / self.frequency
+            freq = np.linspace(frequencies[0], frequencies[-1], len(t))
+            phase = 2 * np.pi * np.cumsum(freq) / self.frequency
+            return np.sin(phase) * np.exp(-t * decay)
+
+        if name == 'tap':
+            wave = tone((1800, 1200), 0.04, 90)
+        elif name == 'bonus':
+            wave = tone((500, 1500), 0.35, 6)
+        elif name == 'time':
+            wave = np.concatenate((tone((880, 880), 0.1, 20), tone((1320, 1320), 0.15, 15)))
+        else:
+            wave = tone((600, 150), 0.6, 4)
+        return wave * 0.4
+
+    def make_sound(self, wave):
+        samples = (np.clip(wave, -1, 1) * 32767).astype(np.int16)
+        if self.outputChannels > 1:
+            samples = np.repeat(samples[:, None], self.outputChannels, axis=1)
+        return pygame.sndarray.make_sound(np.ascontiguousarray(samples))
+
+    # Resampled copy that plays semitones higher (and shorter)
+    def pitched(self, samples, semitones):
+        ratio = 2 ** (semitones / 12)
+        positions = np.arange(0, len(samples) - 1, ratio)
+        if samples.ndim == 1:
+            resampled = np.interp(positions, np.arange(len(samples)), samples)
+        else:
+            resampled = np.stack([np.interp(positions, np.arange(len(samples)), samples[:, channel]) for channel in range(samples.shape[1])], axis=1)
+        return pygame.sndarray.make_sound(np.ascontiguousarray(resampled.astype(samples.dtype)))
+
+    # Play the tap for a combo level on a pooled channel. eventTime is when
+    # the click that caused it arrived, for the tap latency stats; it is only
+    # passed while latency is being measured.
+    def play_tap(self, level=0, eventTime=None):
+        if not self.enabled:
+            return
+        sound = self.tapVariants[min(level, len(self.tapVariants) - 1)]
+
+        channels = self.tapChannels
+        starts = self.tapStarts
+        slot = -1
+        for i in range(len(channels)):
+            if not channels[i].get_busy():
+                slot = i
+                break
+        if slot == -1:
+            # voice stealing, cut off the tap that started first
+            slot = starts.index(min(starts))
+            self.steals += 1
+
+        channels[slot].play(sound)
+        now = time.perf_counter()
+        starts[slot] = now
+        if eventTime is not None:
+            self.tapDelays.append(now - eventTime)
+
+    def play(self, name):
+        if not self.enabled:
+            return
+        self.eventChannels[self.nextEventChannel].play(self.sounds[name])
+        self.nextEventChannel = (self.nextEventChannel + 1) % self.EVENT_CHANNELS
+
+    def reset(self):
+        self.tapDelays.clear()
+        self.steals = 0
+
+    def report(self):
+        if not self.enabled:
+            return "audio disabled"
+        delays = sorted(self.tapDelays)
+        lines = ["tap audio over {} taps (ms), {} voices stolen".format(len(delays), self.steals)]
+        lines.append("  {:<20} ".format("event -> mixer") + "  ".join(
+            "p{} {:.2f}".format(p, latency.percentile(delays, p) * 1000) if p < 100 else "max {:.2f}".format(latency.percentile(delays, p) * 1000)
+            for p in latency.LatencyStats.PERCENTILES))
+        # the mixer then plays it within one buffer
+        lines.append("  {:<20} {:.2f}".format("mixer buffer", self.buffer / self.frequency * 1000))
+        return "\n".join(lines)
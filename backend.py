@@ -0,0 +1,174 @@
+from collections import OrderedDict
+
+import pygame
+
+from settings import *
+
+# Rendering backends. Everything is drawn in logical coordinates
+# (SCREEN_WIDTH x SCREEN_HEIGHT) and the backend scales it to the window.
+#
+# SurfaceBackend draws with software blits onto a logical-size surface. When
+# the window has a different size that surface is scaled to it on present.
+# TextureBackend uploads surfaces once as textures through
+# pygame._sdl2.video and lets SDL's renderer scale and present them.
+#
+# The texture backend keeps the textures it uploaded keyed on the surface
+# they came from, so surfaces that are cached and reused (text, tiles,
+# layers) are only uploaded once.
+
+class SurfaceBackend:
+
+    textured = False
+
+    # screen is drawn on directly. If window is given, screen is an offscreen
+    # logical-size canvas that gets scaled to window on present.
+    def __init__(self, screen, window=None) -> None:
+        self.canvas = screen
+        self.window = window
+        self.logicalSize = screen.get_size()
+        self.capture = None # capture.FrameCapture that gets every presented frame
+
+    @classmethod
+    def create(cls, windowSize=None, logicalSize=(SCREEN_WIDTH, SCREEN_HEIGHT)):
+        window = pygame.display.set_mode(windowSize or logicalSize)
+        pygame.display.set_caption("Don't Tap")
+        if window.get_size() == tuple(logicalSize):
+            return cls(window)
+        return cls(pygame.Surface(logicalSize).convert(), window)
+
+    def to_logical(self, pos):
+        if self.window is None:
+            return pos
+        return (pos[0] * self.logicalSize[0] / self.window.get_width(),
+                pos[1] * self.logicalSize[1] / self.window.get_height())
+
+    def clear(self, color):
+        self.canvas.fill(color)
+
+    def fill_rect(self, color, rect):
+        return pygame.draw.rect(self.canvas, color, rect)
+
+    def draw_rect(self, color, rect, width):
+        return pygame.draw.rect(self.canvas, color, rect, width)
+
+    def blit(self, surface, pos, alpha=None):
+        if alpha is not None:
+            surface.set_alpha(alpha)
+        return self.canvas.blit(surface, pos)
+
+    # Blit a sequence of (surface, pos) pairs in one call
+    def blits(self, items):
+        return self.canvas.blits(items)
+
+    # Scale surface to fill rect (nearest neighbour), changed tells whether
+    # surface was modified since it was last drawn
+    def blit_scaled(self, surface, rect, changed=True):
+        rect = pygame.Rect(rect)
+        if self.canvas.get_rect().contains(rect):
+            pygame.transform.scale(surface, rect.size, self.canvas.subsurface(rect))
+            return rect
+        return self.canvas.blit(pygame.transform.scale(surface, rect.size), rect)
+
+    def present(self, rects=None):
+        if self.window is not None:
+            pygame.transform.smoothscale(self.canvas, self.window.get_size(), self.window)
+            rects = None
+        if self.capture is not None:
+            self.capture.grab()
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+class TextureBackend:
+
+    textured = True
+
+    def __init__(self, windowSize=None, logicalSize=(SCREEN_WIDTH, SCREEN_HEIGHT), cacheSize=TEXTURE_CACHE_SIZE) -> None:
+        from pygame._sdl2 import video
+
+        self.video = video
+        self.logicalSize = tuple(logicalSize)
+        self.window = video.Window("Don't Tap", size=windowSize or self.logicalSize)
+        self.renderer = video.Renderer(self.window)
+        self.renderer.logical_size = self.logicalSize
+        self.cacheSize = cacheSize
+        self.textures = OrderedDict() # surface -> texture
+        self.uploads = 0
+        self.capture = None
+
+    @classmethod
+    def create(cls, windowSize=None, logicalSize=(SCREEN_WIDTH, SCREEN_HEIGHT)):
+        return cls(windowSize, logicalSize)
+
+    # SDL already maps mouse positions to the renderer's logical size
+    def to_logical(self, pos):
+        return pos
+
+    def texture(self, surface):
+        texture = self.textures.get(surface)
+        if texture is not None:
+            self.textures.move_to_end(surface)
+            return texture
+
+        texture = self.video.Texture.from_surface(self.renderer, surface)
+        self.textures[surface] = texture
+        self.uploads += 1
+        if len(self.textures) > self.cacheSize:
+            self.textures.popitem(last=False)
+        return texture
+
+    def clear(self, color):
+        self.renderer.draw_color = pygame.Color(color)
+        self.renderer.clear()
+
+    def fill_rect(self, color, rect):
+        rect = pygame.Rect(rect)
+        self.renderer.draw_color = pygame.Color(color)
+        self.renderer.fill_rect(rect)
+        return rect
+
+    def draw_rect(self, color, rect, width):
+        rect = pygame.Rect(rect)
+        self.renderer.draw_color = pygame.Color(color)
+        for i in range(width):
+            self.renderer.draw_rect(rect.inflate(-2 * i, -2 * i))
+        return rect
+
+    def blit(self, surface, pos, alpha=None):
+        texture = self.texture(surface)
+        texture.alpha = 255 if alpha is None else alpha
+        rect = pygame.Rect(pos, surface.get_size())
+        texture.draw(dstrect=rect)
+        return rect
+
+    def blits(self, items):
+        return [self.blit(surface, pos) for surface, pos in items]
+
+    # The renderer scales with nearest neighbour by default, so this only
+    # has to re-upload the surface when it changed
+    def blit_scaled(self, surface, rect, changed=True):
+        texture = self.texture(surface)
+        if changed:
+            texture.update(surface)
+        texture.alpha = 255
+        rect = pygame.Rect(rect)
+        texture.draw(dstrect=rect)
+        return rect
+
+    # Everything is redrawn every frame, so rects are ignored
+    def present(self, rects=None):
+        if self.capture is not None:
+            self.capture.grab()
+        self.renderer.present()
+
+# Game and Menu accept either a backend or a plain surface to draw on
+def as_backend(target):
+    if isinstance(target, pygame.Surface):
+        return SurfaceBackend(target)
+    return target
+
+def create_backend(kind=RENDER_BACKEND, windowSize=WINDOW_SIZE):
+    if kind == 'texture':
+        return TextureBackend.create(windowSize)
+    return SurfaceBackend.create(windowSize)
@@ -0,0 +1,282 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import pygame
+
+import core
+import modes
+from settings import *
+
+# Benchmarks for game logic, rendering and stats I/O. Runs headless under
+# the SDL dummy video driver.
+#
+#   py ./bench.py run [-o results.json]
+#   py ./bench.py compare baseline.json results.json [--threshold 0.1]
+
+BOARD_SIZES = (4, 16, 64, 128)
+RENDER_BOARD_SIZES = (SIZE, 32, 64, 128)
+BATCH_SIZES = (256, 4096, 65536)
+RESOLUTIONS = ((1280, 720), (1920, 1080), (SCREEN_WIDTH, SCREEN_HEIGHT))
+HISTORY_SIZES = (10, 10000, 1000000)
+WIDGET_COUNTS = (5, 100, 500)
+
+# Best time per call in ns over a few repeats
+def measure(fn, number, repeat=5):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter_ns()
+        for j in range(number):
+            fn()
+        elapsed = (time.perf_counter_ns() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_click(size, clicks=200000):
+    game = core.GameCore(ENDURANCE, seed=1, size=size)
+
+    start = time.perf_counter()
+    for i in range(clicks):
+        game.click_tile(game.tileOrder[0])
+    elapsed = time.perf_counter() - start
+
+    return elapsed / clicks * 1e9
+
+# Spawn cost on a board where only a handful of white tiles are left
+def bench_spawn_full_board(size, spawns=200000):
+    game = core.GameCore(ENDURANCE, seed=1, size=size)
+    game.make_all_tiles_black()
+    for i in range(4):
+        game.make_tile_white(game.tileOrder[0])
+
+    start = time.perf_counter()
+    for i in range(spawns):
+        game.make_random_tile_black()
+        game.make_tile_white(game.tileOrder[game.blackTiles - 1])
+    elapsed = time.perf_counter() - start
+
+    return elapsed / spawns * 1e9
+
+# Click cost in every registered mode, plugins included, on the default board
+def bench_mode_click(mode, clicks=200000):
+    game = core.GameCore(mode, seed=1)
+
+    start = time.perf_counter()
+    for i in range(clicks):
+        game.click_tile(game.tileOrder[0])
+    elapsed = time.perf_counter() - start
+
+    return elapsed / clicks * 1e9
+
+def bench_logic(results, quick):
+    clicks = 20000 if quick else 200000
+    for size in BOARD_SIZES:
+        results["click_tile/size{}".format(size)] = bench_click(size, clicks)
+        results["make_random_tile_black/size{}".format(size)] = bench_spawn_full_board(size, clicks)
+    for mode in modes.all_modes():
+        results["click_tile/{}".format(mode.name.lower())] = bench_mode_click(mode.id, clicks)
+
+# ns per board-step of the batched environment, with a bot that always
+# clicks the first black tile
+def bench_vecenv(results, quick):
+    import numpy as np
+    import vecenv
+
+    steps = 20 if quick else 200
+    for mode in (ENDURANCE, FRENZY):
+        for count in BATCH_SIZES:
+            env = vecenv.BatchEnv(count, mode, seeds=1)
+            actions = np.zeros(count, dtype=np.int64)
+            def step():
+                np.argmax(env.board, axis=1, out=actions)
+                env.step(actions)
+            results["vecenv_step/mode{}/{}".format(mode, count)] = measure(step, steps) / count
+
+def bench_rendering(results, quick):
+    import game
+
+    number = 20 if quick else 200
+    for width, height in RESOLUTIONS:
+        screen = pygame.display.set_mode((width, height))
+        g = game.Game(screen, FRENZY)
+        g.reset(FRENZY, seed=1)
+        name = "{}x{}".format(width, height)
+        results["draw_background/" + name] = measure(g.draw_background, number)
+        results["draw_tiles/size{}/{}".format(SIZE, name)] = measure(g.draw_tiles, number)
+        results["display_information/" + name] = measure(g.display_information, number)
+
+        g.dirtyRendering = True
+        g.fullRedraw = True
+        g.render_dirty()
+        # one click and its score popup per frame, cleared again so frames
+        # don't pile up effects from the ones before
+        def dirty_frame():
+            g.effects.clear()
+            g.click(g.tileOrder[0])
+            g.render_dirty()
+        results["render_dirty_frame/" + name] = measure(dirty_frame, number)
+        results["render_full_frame/" + name] = measure(g.render_full, number)
+
+    # board sizes at the logical resolution, large boards go through the grid renderer
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    g = game.Game(screen, FRENZY)
+    for size in RENDER_BOARD_SIZES:
+        g.resize(size)
+        g.reset(FRENZY, seed=1)
+        results["draw_tiles/size{}".format(size)] = measure(g.draw_tiles, number)
+
+        g.fullRedraw = True
+        g.render_dirty()
+        def dirty_frame():
+            g.effects.clear()
+            g.click(g.tileOrder[0])
+            g.render_dirty()
+        results["render_dirty_frame/size{}".format(size)] = measure(dirty_frame, number)
+        results["render_full_frame/size{}".format(size)] = measure(g.render_full, number)
+        results["get_tile_from_pos/size{}".format(size)] = measure(lambda: g.get_tile_from_pos((1000, 700)), number * 100)
+
+    # whole frames including present, drawn at the logical resolution and
+    # scaled to the window by each backend
+    import backend
+    for width, height in RESOLUTIONS:
+        name = "{}x{}".format(width, height)
+        for kind in ('surface', 'texture'):
+            g = game.Game(backend.create_backend(kind, (width, height)), FRENZY, dirtyRendering=False)
+            g.reset(FRENZY, seed=1)
+            def frame():
+                g.effects.clear()
+                g.click(g.tileOrder[0])
+                g.render()
+            results["{}_frame/{}".format(kind, name)] = measure(frame, number)
+
+# Grids of small buttons covering the logical screen
+def bench_widgets(results, quick):
+    import backend
+    import ui
+
+    number = 20 if quick else 200
+    screen = backend.as_backend(pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT)))
+    for count in WIDGET_COUNTS:
+        columns = max(1, int(count ** 0.5))
+        rows = (count + columns - 1) // columns
+        width, height = SCREEN_WIDTH / columns, SCREEN_HEIGHT / rows
+        def layout(size):
+            return [((i % columns) * width, (i // columns) * height, width - 2, height - 2) for i in range(count)]
+        widgets = ui.WidgetTree(screen, layout)
+        for i in range(count):
+            widgets.add(ui.Button(screen, 0, 0, 0, 0, str(i), (255, 255, 255), (217, 201, 111), lambda: None))
+        widgets.draw()
+
+        results["widgets_draw/{}".format(count)] = measure(widgets.draw, number)
+        points = [(random.randrange(SCREEN_WIDTH), random.randrange(SCREEN_HEIGHT)) for i in range(256)]
+        def hit_test():
+            for point in points:
+                widgets.hit_test(point)
+        results["widgets_hit_test/{}".format(count)] = measure(hit_test, number) / len(points)
+
+# Replace the mode's history with entries random scores
+def populate(store, mode, entries):
+    rnd = random.Random(1)
+    with store.connection:
+        store.connection.execute("DELETE FROM scores WHERE mode = ?", (mode,))
+        store.connection.executemany(
+            "INSERT INTO scores (mode, seq, score, time) VALUES (?, ?, ?, ?)",
+            ((mode, seq, rnd.randint(0, 500), 0.0) for seq in range(entries)))
+
+def bench_stats(results, quick):
+    import menu
+
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    with tempfile.TemporaryDirectory() as directory:
+        m = menu.Menu(screen, statsPath=os.path.join(directory, 'bench.db'))
+        # every size in the same mode, so only the history length changes
+        mode = ENDURANCE
+        for entries in HISTORY_SIZES[:2] if quick else HISTORY_SIZES:
+            populate(m.scoreStore, mode, entries)
+            number = 3 if entries >= 100000 else 20
+
+            results["read_stats/{}".format(entries)] = measure(lambda: m.read_stats(mode), number, 3)
+            results["top10/{}".format(entries)] = measure(lambda: m.scoreStore.top(mode, 10), number)
+
+            def draw_plot_cold():
+                m.statsPlot.clear()
+                m.draw_plot(mode)
+            results["draw_plot_cold/{}".format(entries)] = measure(draw_plot_cold, number, 3)
+            results["draw_plot_cached/{}".format(entries)] = measure(lambda: m.draw_plot(mode), number)
+        m.scoreStore.close()
+
+def run(output, quick):
+    pygame.display.init()
+    pygame.font.init()
+    modes.load_plugins()
+
+    results = {}
+    for group in (bench_logic, bench_vecenv, bench_rendering, bench_widgets, bench_stats):
+        group(results, quick)
+
+    for name, value in results.items():
+        print("{:<40}{:>16.1f} ns".format(name, value))
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'time': time.time(),
+            'quick': quick,
+        },
+        'results': results, # ns per call, lower is better
+    }
+    if output:
+        with open(output, 'w') as file:
+            json.dump(report, file, indent=2)
+    return report
+
+# Returns the names of benchmarks that got slower than threshold allows
+def compare(baselinePath, currentPath, threshold):
+    with open(baselinePath) as file:
+        baseline = json.load(file)['results']
+    with open(currentPath) as file:
+        current = json.load(file)['results']
+
+    regressions = []
+    for name in sorted(baseline.keys() & current.keys()):
+        change = current[name] / baseline[name] - 1 if baseline[name] else 0
+        flag = ""
+        if change > threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "faster"
+        print("{:<40}{:>14.1f}{:>14.1f}{:>+9.1%}  {}".format(name, baseline[name], current[name], change, flag))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="DontTap benchmarks")
+    commands = parser.add_subparsers(dest='command')
+
+    runParser = commands.add_parser('run', help="run the benchmarks")
+    runParser.add_argument('-o', '--output', help="write results as JSON to this file")
+    runParser.add_argument('--quick', action='store_true', help="fewer iterations, skip the 1M entry history")
+
+    compareParser = commands.add_parser('compare', help="compare results against a baseline")
+    compareParser.add_argument('baseline')
+    compareParser.add_argument('current')
+    compareParser.add_argument('--threshold', type=float, default=0.1, help="allowed slowdown, 0.1 = 10%%")
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        regressions = compare(args.baseline, args.current, args.threshold)
+        if regressions:
+            print("{} benchmark(s) regressed".format(len(regressions)))
+            sys.exit(1)
+    else:
+        run(getattr(args, 'output', None), getattr(args, 'quick', False))
@@ -0,0 +1,203 @@
+import os
+import queue
+import shutil
+import threading
+import time
+
+import numpy as np
+import pygame
+
+from settings import *
+
+# Gameplay video capture. The backend hands every frame to grab() right
+# before presenting it, grab copies the pixels straight out of the surface's
+# buffer into a free slot of a ring of preallocated buffers and returns. An
+# encoder thread turns filled slots into a Y4M stream (YUV 4:2:0, plays in
+# ffplay/mpv and converts with ffmpeg) or a PNG sequence, optionally scaled
+# down by an integer factor. When every slot is still waiting to be encoded
+# the frame is dropped instead of making the game wait.
+#
+# Frames are only presented when something changed, so the video is put on
+# a wall clock schedule at fps: each grabbed frame is held back until the
+# next one arrives and then written once for every output frame it was on
+# screen. A newer frame within the same output frame replaces it, and a
+# dropped frame leaves the one before it on screen for longer, so the
+# video plays back at the speed it was recorded.
+#
+# The texture backend has no pixels in memory, so its frames are read back
+# from the renderer into a preallocated surface first, which costs a lot
+# more than the copy.
+
+# Average over scale x scale blocks of a 2D array
+def box_filter(plane, scale):
+    height, width = plane.shape[0] // scale, plane.shape[1] // scale
+    total = np.zeros((height, width), dtype=np.int32)
+    for dy in range(scale):
+        for dx in range(scale):
+            total += plane[dy:height * scale:scale, dx:width * scale:scale]
+    return total // (scale * scale)
+
+class FrameCapture:
+
+    def __init__(self, backend, path=None, fmt=CAPTURE_FORMAT, scale=CAPTURE_SCALE, buffers=CAPTURE_BUFFERS, fps=None) -> None:
+        if fmt not in ('y4m', 'png'):
+            raise ValueError("capture format must be y4m or png")
+        self.format = fmt
+        self.scale = max(1, scale)
+        self.fps = fps or REFRESH_RATE or TICK_RATE
+        if path is None:
+            name = "capture_{}".format(int(time.time()))
+            path = os.path.join(CAPTURE_DIR, name + '.y4m' if fmt == 'y4m' else name)
+        self.path = path
+
+        # frames come from what the surface backend puts on screen (the window
+        # when the canvas is scaled to it), or a readback surface for textures
+        if backend.textured:
+            self.renderer = backend.renderer
+            self.source = pygame.Surface(backend.renderer.get_viewport().size, depth=32)
+        else:
+            self.renderer = None
+            self.source = backend.canvas if backend.window is None else backend.window
+        source = self.source
+        if source.get_bytesize() not in (3, 4):
+            raise ValueError("can only capture 24 or 32 bit surfaces")
+        self.sourceSize = source.get_size()
+        self.pitch = source.get_pitch()
+        self.bytesize = source.get_bytesize()
+        # byte offset of red, green and blue within a pixel (little endian)
+        self.channels = [shift // 8 for shift in source.get_shifts()[:3]]
+
+        # 4:2:0 needs even sizes, odd edges are cropped
+        width, height = self.sourceSize[0] // self.scale, self.sourceSize[1] // self.scale
+        if fmt == 'y4m':
+            width, height = width & ~1, height & ~1
+        self.size = (width, height)
+
+        self.slots = [bytearray(self.pitch * self.sourceSize[1]) for i in range(buffers)]
+        self.free = queue.SimpleQueue()
+        for i in range(buffers):
+            self.free.put(i)
+        self.filled = queue.SimpleQueue()
+
+        self.start = None # time of the first frame
+        self.pending = None # [slot, output frame] of the last frame, not handed over yet
+
+        self.captured = 0 # frames handed to the encoder
+        self.dropped = 0 # frames left out, every slot was busy or a newer one replaced it
+        self.encoded = 0 # output frames written, repeats included
+        self.error = None
+
+        if fmt == 'y4m':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.file = open(path, 'wb')
+            self.file.write("YUV4MPEG2 W{} H{} F{}:1 Ip A1:1 C420jpeg\n".format(width, height, self.fps).encode())
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.file = None
+        self.thread = threading.Thread(target=self.encode_loop, name="capture", daemon=True)
+        self.thread.start()
+
+    # Output frame number at time now
+    def frame_at(self, now):
+        return int((now - self.start) * self.fps)
+
+    # Hand the pending frame to the encoder, to be written until output frame stop
+    def release(self, stop):
+        slot, frame = self.pending
+        self.pending = None
+        self.captured += 1
+        self.filled.put((slot, max(1, stop - frame)))
+
+    # Called by the backend with the finished frame, before it is presented
+    def grab(self):
+        now = time.perf_counter()
+        if self.start is None:
+            self.start = now
+        frame = self.frame_at(now)
+
+        pending = self.pending
+        if pending is not None and pending[1] == frame:
+            # still the same output frame, the newer picture replaces the pending one
+            slot = pending[0]
+            self.dropped += 1
+        else:
+            try:
+                slot = self.free.get_nowait()
+            except queue.Empty:
+                # the pending frame stays on screen until a slot frees up
+                self.dropped += 1
+                return False
+            if pending is not None:
+                self.release(frame)
+            self.pending = [slot, frame]
+        if self.renderer is not None:
+            self.renderer.to_surface(self.source)
+        self.slots[slot][:] = self.source.get_buffer()
+        return True
+
+    # Red, green and blue planes of a slot as int32 arrays, scaled down
+    def planes(self, slot):
+        width, height = self.size
+        scale = self.scale
+        pixels = np.frombuffer(self.slots[slot], dtype=np.uint8).reshape(self.sourceSize[1], self.pitch)
+        planes = []
+        for channel in self.channels:
+            plane = pixels[:height * scale, channel:width * scale * self.bytesize:self.bytesize]
+            planes.append(box_filter(plane, scale) if scale > 1 else plane.astype(np.int32))
+        return planes
+
+    def encode_y4m(self, planes, count):
+        r, g, b = planes
+        # BT.601 full range (C420jpeg) in 8 bit fixed point, chroma from
+        # the average of each 2 x 2 block
+        y = (77 * r + 150 * g + 29 * b + 128) >> 8
+        r, g, b = (box_filter(plane, 2) for plane in planes)
+        u = ((-43 * r - 85 * g + 128 * b + 128) >> 8) + 128
+        v = ((128 * r - 107 * g - 21 * b + 128) >> 8) + 128
+        frame = b'FRAME\n' + b''.join(np.clip(plane, 0, 255).astype(np.uint8).tobytes() for plane in (y, u, v))
+        for i in range(count):
+            self.file.write(frame)
+            self.encoded += 1
+
+    def encode_png(self, planes, count):
+        rgb = np.stack(planes, axis=-1).astype(np.uint8)
+        frame = pygame.image.frombuffer(rgb.tobytes(), self.size, 'RGB')
+        first = os.path.join(self.path, "frame_{:06d}.png".format(self.encoded))
+        pygame.image.save(frame, first)
+        self.encoded += 1
+        # repeats are copies of the file
+        for i in range(count - 1):
+            shutil.copyfile(first, os.path.join(self.path, "frame_{:06d}.png".format(self.encoded)))
+            self.encoded += 1
+
+    def encode_loop(self):
+        encode = self.encode_y4m if self.format == 'y4m' else self.encode_png
+        while True:
+            entry = self.filled.get()
+            if entry is None:
+                break
+            slot, count = entry
+            try:
+                if self.error is None:
+                    encode(self.planes(slot), count)
+            except (OSError, pygame.error) as error:
+                self.error = error # keep taking frames so the game never blocks
+            self.free.put(slot)
+
+    # Encode what was captured and close the output
+    def close(self):
+        if not self.thread.is_alive():
+            return
+        # the last frame stays on screen until the capture ends
+        if self.pending is not None:
+            self.release(self.frame_at(time.perf_counter()) + 1)
+        self.filled.put(None)
+        self.thread.join()
+        if self.file is not None:
+            self.file.close()
+
+    def report(self):
+        lines = ["captured {} frames, dropped {}, encoded {} to {}".format(self.captured, self.dropped, self.encoded, self.path)]
+        if self.error is not None:
+            lines.append("capture failed: {}".format(self.error))
+        return "\n".join(lines)
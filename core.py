@@ -0,0 +1,210 @@
+import random
+import sys
+from array import array
+
+import modes
+from settings import *
+
+# One fixed tick in whole microseconds, so a recorded or raced game replays exactly
+TICK_TIME = round(1e6 / TICK_RATE) / 1e6
+
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+
+# Game rules without any pygame dependency. Game renders on top of this, and
+# the same object can be driven headless through click()/advance()/step().
+class GameCore:
+
+    COMBO_THRESHOLD = modes.COMBO_THRESHOLD
+    COMBO_GAIN = modes.COMBO_GAIN
+    COMBO_LOSS_PER_FRAME = modes.COMBO_LOSS_PER_FRAME
+
+    def __init__(self, mode=ENDURANCE, seed=None, size=SIZE) -> None:
+        self.rnd = random.Random(seed)
+        self.resize(size)
+        self.reset(mode)
+
+    # Change the board to size x size tiles, the board is cleared on the next reset()
+    def resize(self, size):
+        self.size = size
+        self.tileCount = size * size
+
+        # The board is one bit per tile (1 = black) in an array of 64-bit
+        # words that is updated in place, so flipping a tile costs the same on
+        # any board size. tileOrder keeps every black tile ahead of every
+        # white one and tilePosition maps a tile back to its slot, so a random
+        # white tile can be picked and moved across the boundary in constant time.
+        self.words = array('Q', bytes(8 * ((self.tileCount + WORD_BITS - 1) // WORD_BITS)))
+        self.blackTiles = 0
+        self.tileOrder = list(range(self.tileCount))
+        self.tilePosition = list(range(self.tileCount))
+
+    def reset(self, mode=ENDURANCE, seed=None):
+        if seed is not None:
+            self.rnd.seed(seed)
+
+        self.running = True
+        self.words = array('Q', bytes(8 * len(self.words)))
+        self.blackTiles = 0
+        # spawns index into the tile order, so it has to start out the same every game
+        self.tileOrder[:] = range(self.tileCount)
+        self.tilePosition[:] = range(self.tileCount)
+        self.score = 0
+        self.combo = 0
+        self.patternsCleared = 0
+        self.bonusActive = False
+        self.mode = mode # id of a registered mode, see modes.py
+
+        # the mode is looked up once, clicks and ticks call its handlers directly
+        rules = modes.get(mode)
+        self.rules = rules
+        self.miss_rule = rules.miss
+        self.respawn_rule = rules.respawn
+        self.score_rule = rules.score_click
+        self.advance_rule = rules.advance
+        self.timer = rules.startTimer
+
+        # init random black tiles
+        self.init_tiles()
+
+    # Board as an int bitmask (bit i = tile i is black), built on demand from the words
+    @property
+    def board(self):
+        words = self.words
+        if sys.byteorder != 'little':
+            words = array('Q', words)
+            words.byteswap()
+        return int.from_bytes(words.tobytes(), 'little')
+
+    # Board as a list of ints (1 = black), built on demand from the words
+    @property
+    def tiles(self):
+        board = self.board
+        return [(board >> i) & 1 for i in range(self.tileCount)]
+
+    def is_black(self, tileIdx):
+        return (self.words[tileIdx >> 6] >> (tileIdx & 63)) & 1
+
+    def init_tiles(self):
+        for i in range(self.rules.startTiles):
+            self.make_random_tile_black()
+
+    def swap_tile(self, tileIdx, slot):
+        tileOrder = self.tileOrder
+        tilePosition = self.tilePosition
+        otherIdx = tileOrder[slot]
+        oldSlot = tilePosition[tileIdx]
+        tileOrder[slot] = tileIdx
+        tileOrder[oldSlot] = otherIdx
+        tilePosition[tileIdx] = slot
+        tilePosition[otherIdx] = oldSlot
+
+    def make_random_tile_black(self, ignore_tile=None):
+        whiteTiles = self.tileCount - self.blackTiles
+
+        # park the ignored tile in the last white slot so it can't be chosen
+        if ignore_tile is not None and not (self.words[ignore_tile >> 6] >> (ignore_tile & 63)) & 1:
+            self.swap_tile(ignore_tile, self.tileCount - 1)
+            whiteTiles -= 1
+
+        # If all tiles already black then return
+        if whiteTiles <= 0:
+            return -1
+
+        self.make_tile_black(self.tileOrder[self.blackTiles + int(self.rnd.random() * whiteTiles)])
+        return 0
+
+    def make_all_tiles_black(self):
+        self.blackTiles = self.tileCount
+        words = self.words
+        for i in range(len(words)):
+            words[i] = WORD_MASK
+        words[-1] = WORD_MASK >> (len(words) * WORD_BITS - self.tileCount)
+
+    def make_tile_black(self, tileIdx):
+        word = tileIdx >> 6
+        bit = 1 << (tileIdx & 63)
+        if self.words[word] & bit:
+            return
+        self.words[word] |= bit
+        self.swap_tile(tileIdx, self.blackTiles)
+        self.blackTiles += 1
+
+    def make_tile_white(self, tileIdx):
+        word = tileIdx >> 6
+        bit = 1 << (tileIdx & 63)
+        if not self.words[word] & bit:
+            return
+        self.words[word] ^= bit
+        self.blackTiles -= 1
+        self.swap_tile(tileIdx, self.blackTiles)
+
+    # Returns the score gained, or modes.MISS / modes.PENALTY if a white tile
+    # was clicked and it did / didn't end the game
+    def click_tile(self, tileIdx):
+        # Handle clicking on white tile
+        if not (self.words[tileIdx >> 6] >> (tileIdx & 63)) & 1:
+            return self.miss_rule(self, tileIdx)
+
+        # Handle clicking on black tile
+        self.make_tile_white(tileIdx)
+        self.respawn_rule(self, tileIdx)
+        return self.score_rule(self)
+
+    def endurance_add_time(self):
+        self.timer += EUNDRANCE_TIME_GAIN
+
+    def endurance_spawn_bonus(self):
+        self.make_all_tiles_black()
+        self.combo = 0
+        self.bonusActive = True
+
+    # Clicks after the game has ended are ignored
+    def click(self, tileIdx):
+        if not self.running:
+            return modes.MISS
+        return self.click_tile(tileIdx)
+
+    # Run the once-per-frame rules for a frame that lasted dt seconds
+    def advance(self, dt):
+        if not self.running:
+            return False
+        return self.advance_rule(self, dt)
+
+    # One fixed step: apply the frame's clicks in order, then advance by dt
+    def step(self, clicks=(), dt=1 / TICK_RATE):
+        for tileIdx in clicks:
+            self.click(tileIdx)
+            if not self.running:
+                break
+        return self.advance(dt)
+
+    # Everything the rest of the game depends on, including the spawn
+    # sequence, for going back to it later with load_state()
+    def save_state(self):
+        return (array('Q', self.words), self.blackTiles, self.tileOrder[:], self.tilePosition[:], self.rnd.getstate(),
+                self.score, self.combo, self.timer, self.patternsCleared, self.bonusActive, self.running)
+
+    # Go back to a state from save_state() of a game with the same mode and size
+    def load_state(self, state):
+        words, self.blackTiles, tileOrder, tilePosition, rndState, self.score, self.combo, self.timer, self.patternsCleared, self.bonusActive, self.running = state
+        self.words = array('Q', words) # a copy, the state can be loaded again
+        self.tileOrder[:] = tileOrder
+        self.tilePosition[:] = tilePosition
+        self.rnd.setstate(rndState)
+
+    def result(self):
+        return {
+            'score': self.rules.final_score(self),
+            'mode': self.mode,
+            'save_score': self.rules.save_score(self)
+        }
+
+# Play a full game headless. frames yields the list of tile indices clicked
+# during each frame; the game runs until it ends or the script runs out.
+def play(frames, mode=ENDURANCE, seed=None, dt=1 / TICK_RATE, size=SIZE):
+    core = GameCore(mode, seed, size)
+    for clicks in frames:
+        if not core.step(clicks, dt):
+            break
+    return core.result()
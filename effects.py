@@ -0,0 +1,111 @@
+import numpy as np
+import pygame
+
+import ui
+from settings import *
+
+# Floating text effects (the "+1" popups) stored as struct-of-arrays in
+# preallocated NumPy buffers. Positions and alpha of every live effect are
+# updated in one vectorized pass and dead effects are compacted into a second
+# buffer that is swapped in, so nothing is allocated per frame besides the
+# list handed to Surface.blits.
+class EffectPool:
+
+    FIELDS = 6
+    X, Y, FLOAT_SPEED, ALPHA, DECAY, GLYPH = range(FIELDS) # GLYPH holds glyph id * ALPHA_LEVELS
+
+    TEXT_FLOAT_SPEED = 5
+    ALPHA_LEVELS = 32 # alpha is drawn from this many pre-made surfaces per glyph
+
+    def __init__(self, capacity=EFFECTS_CAPACITY) -> None:
+        self.capacity = capacity
+        self.data = np.zeros((self.FIELDS, capacity))
+        self.scratch = np.zeros((self.FIELDS, capacity))
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.levelValues = np.zeros(capacity)
+        self.levels = np.zeros(capacity, dtype=np.int64)
+        self.count = 0
+        self.dropped = 0 # effects that didn't fit in the pool
+
+        self.glyphIds = {} # (text, color, size) -> glyph id
+        self.glyphSizes = []
+        self.variants = [] # glyph id * ALPHA_LEVELS + alpha level -> surface
+
+    def clear(self):
+        self.count = 0
+
+    def glyph(self, text, color, size):
+        key = (text, color, size)
+        glyphId = self.glyphIds.get(key)
+        if glyphId is None:
+            glyphId = len(self.glyphSizes)
+            surface = ui.textCache.render(text, color, size)
+            self.glyphSizes.append(surface.get_size())
+            for level in range(self.ALPHA_LEVELS):
+                variant = surface.copy()
+                variant.set_alpha(int(level * 255 / (self.ALPHA_LEVELS - 1)))
+                self.variants.append(variant)
+            self.glyphIds[key] = glyphId
+        return glyphId
+
+    # Text centered on (x, y), starting at alpha transparency and fading by
+    # decayRate per frame, rising if float is set
+    def spawn_text(self, x, y, text, color, size, transparency, float, decayRate):
+        if self.count >= self.capacity:
+            self.dropped += 1
+            return
+
+        glyphId = self.glyph(text, color, size)
+        width, height = self.glyphSizes[glyphId]
+        column = self.data[:, self.count]
+        column[self.X] = x - width / 2
+        column[self.Y] = y - height / 2
+        column[self.FLOAT_SPEED] = self.TEXT_FLOAT_SPEED if float else 0
+        column[self.ALPHA] = transparency
+        column[self.DECAY] = decayRate
+        column[self.GLYPH] = glyphId * self.ALPHA_LEVELS
+        self.count += 1
+
+    def update(self):
+        count = self.count
+        if count == 0:
+            return
+        data = self.data
+        np.subtract(data[self.Y, :count], data[self.FLOAT_SPEED, :count], out=data[self.Y, :count])
+        np.subtract(data[self.ALPHA, :count], data[self.DECAY, :count], out=data[self.ALPHA, :count])
+
+        alive = self.alive[:count]
+        np.greater(data[self.ALPHA, :count], 0, out=alive)
+        aliveCount = int(np.count_nonzero(alive))
+        if aliveCount < count:
+            np.compress(alive, data[:, :count], axis=1, out=self.scratch[:, :aliveCount])
+            self.data, self.scratch = self.scratch, self.data
+            self.count = aliveCount
+
+    # Blit every live effect through a rendering backend, returns the rects drawn
+    def draw(self, backend):
+        count = self.count
+        if count == 0:
+            return []
+        data = self.data
+
+        # pick the pre-made surface for each effect's glyph and alpha level
+        levelValues = self.levelValues[:count]
+        np.multiply(data[self.ALPHA, :count], (self.ALPHA_LEVELS - 1) / 255, out=levelValues)
+        np.clip(levelValues, 0, self.ALPHA_LEVELS - 1, out=levelValues)
+        np.add(levelValues, data[self.GLYPH, :count], out=levelValues)
+        levels = self.levels[:count]
+        np.copyto(levels, levelValues, casting='unsafe')
+
+        variants = self.variants
+        effects = zip(levels.tolist(), data[self.X, :count].tolist(), data[self.Y, :count].tolist())
+        if backend.textured:
+            # textures take their alpha at draw time, so only the opaque
+            # variant of each glyph gets uploaded
+            top = self.ALPHA_LEVELS - 1
+            rects = []
+            for variant, x, y in effects:
+                level = variant % self.ALPHA_LEVELS
+                rects.append(backend.blit(variants[variant - level + top], (x, y), int(level * 255 / top)))
+            return rects
+        return backend.blits([(variants[variant], (x, y)) for variant, x, y in effects])
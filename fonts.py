@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+
+import pygame
+
+from settings import *
+
+# Font lookup for the text cache. Names go through an index of the installed
+# system fonts that is saved to FONT_INDEX_PATH, so pygame's scan of every
+# system font (which runs fc-list on Linux) only happens again when the font
+# directories change.
+
+def system_font_dirs():
+    if sys.platform == 'win32':
+        return [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts')]
+    if sys.platform == 'darwin':
+        return ['/Library/Fonts', '/System/Library/Fonts', os.path.expanduser('~/Library/Fonts')]
+    return ['/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.fonts'),
+            os.path.expanduser('~/.local/share/fonts')]
+
+# pygame and SDL_ttf versions and the modification times of each font
+# directory and of the entries right under it. Installing or removing a font
+# changes the time of the directory it was in, and font packages go into
+# their own directory one level down, so nothing deeper has to be read.
+def font_dirs_signature():
+    signature = [pygame.version.ver, list(pygame.font.get_sdl_ttf_version())]
+    for directory in system_font_dirs():
+        try:
+            signature.append([directory, os.stat(directory).st_mtime_ns])
+            with os.scandir(directory) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    signature.append([entry.path, entry.stat().st_mtime_ns])
+        except OSError:
+            pass
+    return signature
+
+# Same normalization pygame uses for SysFont names
+def normalize(name):
+    return ''.join(char for char in name.lower() if char.isalnum())
+
+class FontIndex:
+
+    def __init__(self, path=FONT_INDEX_PATH) -> None:
+        self.path = path
+        self.fonts = None # normalized name -> file
+        self.rebuilt = False
+
+    def load(self):
+        signature = font_dirs_signature()
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+            if data['signature'] == signature:
+                self.fonts = data['fonts']
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.fonts = self.scan()
+        self.rebuilt = True
+        try:
+            with open(self.path, 'w') as file:
+                json.dump({'signature': signature, 'fonts': self.fonts}, file)
+        except OSError:
+            pass
+
+    def scan(self):
+        fonts = {}
+        for name in pygame.font.get_fonts():
+            path = pygame.font.match_font(name)
+            if path is not None:
+                fonts[name] = path
+        return fonts
+
+    def find(self, name):
+        if self.fonts is None:
+            self.load()
+        return self.fonts.get(normalize(name))
+
+index = FontIndex()
+
+# Path of the font file for name, None for pygame's default font
+def find_font(name):
+    return index.find(name)
@@ -1,14 +1,19 @@
+import os
 import pygame
-import random as rnd
-
+import time
+
+import core
+import effects
+import grid
+import backend
+import latency
+import profiler
+import replay
+import scheduler
 import ui
 from settings import *
 
-class Game:
-
-    COMBO_THRESHOLD = 500
-    COMBO_GAIN = 45
-    COMBO_LOSS_PER_FRAME = 2.5
+class Game(core.GameCore):
 
     COMBO_UI_WIDTH = GAME_WIDTH / 2
     COMBO_UI_HEIGHT = 25
@@ -19,238 +24,550 @@ class Game:
     TIME_WARNING_COLOR = (255, 179, 0 )
     TIME_DANGER_COLOR = (255, 0, 0)
 
-    def __init__(self, screen, mode=ENDURANCE) -> None:
-        self.running = True
-        self.tiles = [0] * (SIZE * SIZE)
-        self.blackTiles = 0
-        self.score = 0
-        self.timer = 0
-        self.combo = 0
-        self.patternsCleared = 0
-        self.bonusActive = False
-        self.mode = mode # 0 endurance 1 pattern 2 frenzy
-        self.screen = screen
-        self.infoText = pygame.font.SysFont('Monocraft', INFO_TEXT_SIZE)
-        self.numericalText = pygame.font.SysFont('Monocraft', NUMERICAL_TEXT_SIZE)
-        self.tempTextsObJs = []
-
-    def init_tiles(self):
-        tilesToSpawn = BLACK_TILES if self.mode is not PATTERN else PATTERN_SIZE
-        for i in range(tilesToSpawn):
-            self.make_random_tile_black()
-    
-    def make_random_tile_black(self, ignore_tile=None):
-        candidates = [i for i in range(SIZE * SIZE)]
-
-        if ignore_tile is not None:
-            candidates.remove(ignore_tile)
-
-        while True:
-            # If all tiles already black then return
-            if len(candidates) <= 0:
-                return -1
-            
-            # choose a random tile, if white turn it black otherwise remove it from candidates and try another
-            consideredCandidate = rnd.choice(candidates)
-            if self.tiles[consideredCandidate] == 0:
-                self.tiles[consideredCandidate] = 1
-                self.blackTiles += 1
-                return 0
-            else:
-                candidates.remove(consideredCandidate)
+    # screen is a rendering backend or a surface to draw on
+    def __init__(self, screen, mode=ENDURANCE, dirtyRendering=DIRTY_RECT_RENDERING, measureLatency=False, profileFrames=False, recordReplays=False, size=SIZE, audio=None, touchInput=TOUCH_INPUT, race=None) -> None:
+        self.backend = backend.as_backend(screen)
+        self.screen = None if self.backend.textured else self.backend.canvas # software canvas
+        self.effects = effects.EffectPool()
+        self.latency = latency.LatencyStats() if measureLatency else None
+        self.profiler = profiler.FrameProfiler() if profileFrames else None
+        self.recorder = replay.Recorder() if recordReplays else None
+        self.replayPath = None # replay file of the last game, if recorded
+        self.audio = audio
+        self.clickTime = None # arrival time of the click being handled
+        self.touchInput = touchInput
+        self.fingers = {} # (touch_id, finger_id) -> tile it went down on, for fingers still down
+        self.taps = 0 # clicks and touches that reached the board this game
+
+        # head-to-head, a race.RaceClient that is matched when the game begins
+        self.race = race
+        self.raceTick = 0 # ticks run this game
+        self.opponentGrid = None
+        self.opponentBoard = None
+
+        # damage tracking
+        self.dirtyRendering = dirtyRendering
+        self.boardRect = pygame.Rect(GAME_START_POS_X, GAME_START_POS_Y, GAME_WIDTH, GAME_HEIGHT)
+        self.backgroundLayer = None
+        self.boardLayer = None
+        self.dirtyTiles = set()
+        self.lastDynamicRects = []
+        self.fullRedraw = True
+        self.redrawnArea = 0 # pixels presented since the game started
+        self.tileSurfaces = None # white and black tile, for the texture backend
+
+        # fixed timestep
+        self.tickTime = core.TICK_TIME
+        self.lastTime = 0
+        self.accumulator = 0 # time not yet run as ticks
+        self.alpha = 0 # how far the frame being drawn is between this tick and the next
+        self.droppedTicks = 0 # ticks skipped by the frame skip policy this game
+
+        super().__init__(mode, size=size)
+
+    def resize(self, size):
+        super().resize(size)
+        self.tileWidth = GAME_WIDTH / size
+        self.tileHeight = GAME_HEIGHT / size
+        # large boards are drawn scaled up from one pixel per tile
+        self.grid = grid.GridRenderer(size) if size >= LARGE_GRID_SIZE else None
+        self.boardLayer = None
+        self.tileSurfaces = None
+        self.dirtyTiles.clear()
+        self.fullRedraw = True
+
+    def reset(self, mode=ENDURANCE, seed=None):
+        super().reset(mode, seed)
+        if self.grid is not None:
+            self.grid.load(self.board)
+            self.dirtyTiles.clear()
 
-    def make_all_tiles_black(self):
-        self.blackTiles = SIZE*SIZE
-        for i in range(len(self.tiles)):
-            self.tiles[i] = 1
+    def get_tile_from_pos(self, pos):
+        posX = int(pos[0]) - self.boardRect.x
+        posY = int(pos[1]) - self.boardRect.y
+
+        # check if pos in game window
+        if posX < 0 or posX >= GAME_WIDTH or posY < 0 or posY >= GAME_HEIGHT:
+            return -1
+
+        x = posX * self.size // GAME_WIDTH
+        y = posY * self.size // GAME_HEIGHT
+        return x + y * self.size
+
+    def click_tile(self, tileIdx):
+        scoreGain = super().click_tile(tileIdx)
+        # misses neither tap nor pop up a score, the game over sound plays in finish()
+        if scoreGain < 0:
+            return scoreGain
+        if self.audio is not None:
+            # FRENZY taps go up in pitch with the score multiplier
+            self.audio.play_tap(self.rules.tap_level(scoreGain), self.clickTime if self.latency is not None else None)
+
+        tilePosX = GAME_START_POS_X + (tileIdx % self.size) * self.tileWidth + self.tileWidth / 2
+        tilePosY = GAME_START_POS_Y + (tileIdx // self.size) * self.tileHeight + self.tileHeight / 2
+        self.effects.spawn_text(tilePosX, tilePosY, "+" + str(scoreGain), (0,255,0), INFO_TEXT_SIZE, 255, False, 20)
+        return scoreGain
+
+    def click(self, tileIdx):
+        if self.recorder is not None and self.running:
+            self.recorder.record_click(tileIdx)
+        if self.race is not None and self.running:
+            self.race.record_click(self.raceTick, tileIdx)
+        return super().click(tileIdx)
+
+    def advance(self, dt):
+        if self.recorder is not None and self.running:
+            dt = self.recorder.record_frame(dt)
+        self.effects.update()
+        running = super().advance(dt)
+        if self.race is not None:
+            self.raceTick += 1
+            self.race.record_tick(self, self.raceTick)
+        return running
+
+    # Take over the state the race client rolled back to when the server ran
+    # the game differently than predicted here, a game that ended in the
+    # replay goes back to the tick it ended during
+    def sync_race(self):
+        corrected = self.race.poll()
+        if corrected is not None:
+            self.raceTick, state = corrected
+            self.load_state(state)
+
+    def load_state(self, state):
+        board = self.board
+        super().load_state(state)
+        flips = board ^ self.board
+        while flips:
+            low = flips & -flips
+            self.dirtyTiles.add(low.bit_length() - 1)
+            flips ^= low
+
+    # The opponent's board and score next to the board, as last sent by the server
+    def draw_opponent(self):
+        opponent = self.race.opponent
+        if self.opponentGrid is None:
+            self.opponentGrid = grid.GridRenderer(self.size, RACE_BOARD_SIZE, RACE_BOARD_SIZE)
+        if opponent[1] != self.opponentBoard:
+            self.opponentBoard = opponent[1]
+            self.opponentGrid.load(self.opponentBoard)
+
+        x = GAME_START_POS_X + GAME_WIDTH + TEXT_MARGIN * 4
+        rects = [self.opponentGrid.draw(self.backend, (x, GAME_START_POS_Y))]
+        value = opponent[2] if self.rules.showScore else "{:.1f}".format(opponent[4] / 1000)
+        text = ui.textCache.render("OPPONENT {}".format(value), INFO_TEXT_COLOR, INFO_TEXT_SIZE)
+        rects.append(self.backend.blit(text, (x, GAME_START_POS_Y + RACE_BOARD_SIZE + TEXT_MARGIN)))
+        return rects
+
+    # Timer and combo as drawn, moved alpha of the way toward their value
+    # at the next tick so they run smoothly above the tick rate
+    def display_timer(self):
+        if not self.running:
+            return self.timer
+        if self.rules.timerUp:
+            return self.timer + self.tickTime * self.alpha
+        return max(self.timer - self.tickTime * self.alpha, 0)
+
+    def display_combo(self):
+        if not self.running or self.combo <= 0:
+            return self.combo
+        return max(self.combo - self.COMBO_LOSS_PER_FRAME * self.alpha, 0)
 
     def make_tile_black(self, tileIdx):
-        self.tiles[tileIdx] = 1
+        super().make_tile_black(tileIdx)
+        self.dirtyTiles.add(tileIdx)
 
     def make_tile_white(self, tileIdx):
-        self.tiles[tileIdx] = 0
-        self.blackTiles -= 1
+        super().make_tile_white(tileIdx)
+        self.dirtyTiles.add(tileIdx)
 
-    def get_tile_from_pos(self, pos):
-        posX = pos[0]
-        posY = pos[1]
-        
-        # check if pos in game window
-        if ( posX < GAME_START_POS_X
-            or posX > GAME_START_POS_X + GAME_WIDTH
-            or posY < GAME_START_POS_Y
-            or posY > GAME_START_POS_Y + GAME_HEIGHT
-            ):
-            return -1
+    def make_all_tiles_black(self):
+        super().make_all_tiles_black()
+        self.dirtyTiles.update(range(self.tileCount))
 
-        x = int((posX - GAME_START_POS_X) / TILE_WIDTH)
-        y = int((posY - GAME_START_POS_Y) / TILE_HEIGHT)
-        return ((x + 1) + (y * SIZE)) - 1
+    def draw_background(self, surface=None):
+        surface = self.screen if surface is None else surface
+        surface.fill(BACKGROUND_COLOR)
+        pygame.draw.rect(surface, color=self.COMBO_UI_BACKGROUND_COLOR, rect=(GAME_START_POS_X, 0, GAME_WIDTH, SCREEN_HEIGHT))
+        pygame.draw.rect(surface, color=self.COMBO_UI_COLOR, rect=(GAME_START_POS_X, GAME_START_POS_Y, GAME_WIDTH, GAME_HEIGHT))
 
-    def click_tile(self, tileIdx):
-        # Handle clicking on white tile
-        if self.tiles[tileIdx] == 0:
-            self.running = False
-        else: # Handle clicking on black tile
-            self.make_tile_white(tileIdx)
-
-            # create new black tile if not bonus active
-            if not self.bonusActive and self.mode is not PATTERN:
-                self.make_random_tile_black(tileIdx)
-            if self.bonusActive or self.mode is PATTERN: # if complete bonus spawn new set of black tiles
-                if self.blackTiles == 0:
-                    self.bonusActive = False
-                    self.init_tiles()
-                    if self.mode is PATTERN:
-                        self.patternsCleared += 1
-
-            scoreGain = 1
-            if self.mode is FRENZY:
-                scoreGain = int((self.combo * FRENZY_SCORE_STEPS) / self.COMBO_THRESHOLD) + 1
-            elif self.mode is PATTERN:
-                scoreGain = 0
-
-            self.score += scoreGain
-
-            if self.mode is not PATTERN:
-                self.combo += self.COMBO_GAIN
-            
-            if self.mode is ENDURANCE:
-                if self.score % ENDURANCE_TIME_GAIN_THRESHOLD == 0:
-                    self.endurance_add_time()
-
-            tilePosX = GAME_START_POS_X + int(tileIdx % SIZE) * TILE_WIDTH + TILE_WIDTH / 2
-            tilePosY = GAME_START_POS_Y + int(tileIdx / SIZE) * TILE_HEIGHT + TILE_HEIGHT / 2
-            self.tempTextsObJs.append(ui.TempText(self.screen, tilePosX, tilePosY, "+" + str(scoreGain), (0,255,0), self.infoText, 255, False, 20))
-
-    def draw_background(self):
-        self.screen.fill(BACKGROUND_COLOR)
-        pygame.draw.rect(self.screen, color=self.COMBO_UI_BACKGROUND_COLOR, rect=(GAME_START_POS_X, 0, GAME_WIDTH, SCREEN_HEIGHT))
-        pygame.draw.rect(self.screen, color=self.COMBO_UI_COLOR, rect=(GAME_START_POS_X, GAME_START_POS_Y, GAME_WIDTH, GAME_HEIGHT))
-
-    def draw_temp_text_objs(self):
-        for text in self.tempTextsObJs:
-            text.draw()
-            text.update()
-            if text.transparency <= 0:
-                self.tempTextsObJs.remove(text)
+    def draw_effects(self):
+        return self.effects.draw(self.backend)
+
+    def draw_tile(self, surface, tileIdx, offsetX, offsetY):
+        size = (self.tileWidth, self.tileHeight)
+        pos = (offsetX + self.tileWidth * (tileIdx % self.size), offsetY + self.tileHeight * (tileIdx // self.size))
+        color = BLACK_TILE_COLOR if self.is_black(tileIdx) else WHITE_TILE_COLOR
+        pygame.draw.rect(surface, color=color, rect=(pos, size))                                       # draw tile
+        return pygame.draw.rect(surface, color=TILE_BORDER_COLOR, rect=(pos, size), width=TILE_BORDER) # draw tile border
 
     def draw_tiles(self):
-        for i, tile in enumerate(self.tiles):
-            pos = (GAME_START_POS_X + TILE_WIDTH * int((i%SIZE)), GAME_START_POS_Y + TILE_HEIGHT * (int((i/SIZE) % SIZE)))
-            color = WHITE_TILE_COLOR if tile == 0 else BLACK_TILE_COLOR
-            pygame.draw.rect(self.screen, color=color, rect=(pos, (TILE_WIDTH, TILE_HEIGHT)))                                # draw tile
-            pygame.draw.rect(self.screen, color=TILE_BORDER_COLOR, rect=(pos, (TILE_WIDTH, TILE_HEIGHT)), width=TILE_BORDER) # draw tile border
+        if self.grid is not None:
+            self.update_grid()
+            self.grid.draw(self.backend, self.boardRect.topleft)
+            return
+        for i in range(self.tileCount):
+            self.draw_tile(self.screen, i, GAME_START_POS_X, GAME_START_POS_Y)
+
+    def update_grid(self):
+        for tileIdx in self.dirtyTiles:
+            self.grid.set_tile(tileIdx, self.is_black(tileIdx))
+        self.dirtyTiles.clear()
         
     def draw_combo(self):
-        pygame.draw.rect(self.screen, color=(0,0,0), rect=(GAME_START_POS_X + GAME_WIDTH / 2 - self.COMBO_UI_WIDTH / 2, GAME_START_POS_Y + GAME_HEIGHT + self.COMBO_UI_HEIGHT, self.COMBO_UI_WIDTH, self.COMBO_UI_HEIGHT))
-        pygame.draw.rect(self.screen, color=(255, 255, 255), rect=(GAME_START_POS_X + GAME_WIDTH / 2 - self.COMBO_UI_WIDTH / 2, GAME_START_POS_Y + GAME_HEIGHT + self.COMBO_UI_HEIGHT, self.combo / self.COMBO_THRESHOLD * self.COMBO_UI_WIDTH, self.COMBO_UI_HEIGHT))
+        comboRect = self.backend.fill_rect((0,0,0), (GAME_START_POS_X + GAME_WIDTH / 2 - self.COMBO_UI_WIDTH / 2, GAME_START_POS_Y + GAME_HEIGHT + self.COMBO_UI_HEIGHT, self.COMBO_UI_WIDTH, self.COMBO_UI_HEIGHT))
+        comboFillRect = self.backend.fill_rect((255, 255, 255), (GAME_START_POS_X + GAME_WIDTH / 2 - self.COMBO_UI_WIDTH / 2, GAME_START_POS_Y + GAME_HEIGHT + self.COMBO_UI_HEIGHT, self.display_combo() / self.COMBO_THRESHOLD * self.COMBO_UI_WIDTH, self.COMBO_UI_HEIGHT))
+        # the fill can overshoot the bar before the bonus triggers
+        return [comboRect.union(comboFillRect)]
 
     def display_information(self):
-        infoScoreText = self.infoText.render("SCORE", False, INFO_TEXT_COLOR)
-        infoTimeText = self.infoText.render("TIME", False, INFO_TEXT_COLOR)
-        scoreText = self.numericalText.render(str(self.score), False, NUMERICAL_TEXT_COLOR)
-
-        if self.timer > 5:
-            timeText = self.numericalText.render(str("{:.1f}".format(self.timer)), False, self.TIME_NORMAL_COLOR)
-        elif self.timer > 2:
-            timeText = self.numericalText.render(str("{:.1f}".format(self.timer)), False, self.TIME_WARNING_COLOR)
+        infoScoreText = ui.textCache.render("SCORE", INFO_TEXT_COLOR, INFO_TEXT_SIZE)
+        infoTimeText = ui.textCache.render("TIME", INFO_TEXT_COLOR, INFO_TEXT_SIZE)
+        scoreText = str(self.score)
+        scoreAtlas = ui.textCache.get_atlas(NUMERICAL_TEXT_COLOR, NUMERICAL_TEXT_SIZE)
+
+        timer = self.display_timer()
+        timeText = "{:.1f}".format(timer)
+        if timer > 5:
+            timeAtlas = ui.textCache.get_atlas(self.TIME_NORMAL_COLOR, NUMERICAL_TEXT_SIZE)
+        elif timer > 2:
+            timeAtlas = ui.textCache.get_atlas(self.TIME_WARNING_COLOR, NUMERICAL_TEXT_SIZE)
         else:
-            timeText = self.numericalText.render(str("{:.1f}".format(self.timer)), False, self.TIME_DANGER_COLOR)
+            timeAtlas = ui.textCache.get_atlas(self.TIME_DANGER_COLOR, NUMERICAL_TEXT_SIZE)
+        timeTextWidth = timeAtlas.get_width(timeText)
 
-        if self.mode is not PATTERN:
-            self.screen.blit(infoScoreText, (GAME_START_POS_X + (GAME_WIDTH / 2) - (infoScoreText.get_width() / 2), GAME_START_POS_Y - ( INFO_TEXT_SIZE + NUMERICAL_TEXT_SIZE + TEXT_MARGIN)))
-            self.screen.blit(scoreText, (GAME_START_POS_X + (GAME_WIDTH / 2) - (scoreText.get_width() / 2), GAME_START_POS_Y - (NUMERICAL_TEXT_SIZE + TEXT_MARGIN)))
+        rects = []
+        if self.rules.showScore:
+            rects.append(self.backend.blit(infoScoreText, (GAME_START_POS_X + (GAME_WIDTH / 2) - (infoScoreText.get_width() / 2), GAME_START_POS_Y - ( INFO_TEXT_SIZE + NUMERICAL_TEXT_SIZE + TEXT_MARGIN))))
+            rects.append(scoreAtlas.draw(self.backend, scoreText, (GAME_START_POS_X + (GAME_WIDTH / 2) - (scoreAtlas.get_width(scoreText) / 2), GAME_START_POS_Y - (NUMERICAL_TEXT_SIZE + TEXT_MARGIN))))
 
-        self.screen.blit(infoTimeText, (GAME_START_POS_X + (GAME_WIDTH - (timeText.get_width() / 2 + infoTimeText.get_width() / 2) - TEXT_MARGIN), GAME_START_POS_Y - (INFO_TEXT_SIZE + NUMERICAL_TEXT_SIZE + TEXT_MARGIN)))
-        self.screen.blit(timeText, (GAME_START_POS_X + (GAME_WIDTH - timeText.get_width() - TEXT_MARGIN), GAME_START_POS_Y - (NUMERICAL_TEXT_SIZE + TEXT_MARGIN)))
+        rects.append(self.backend.blit(infoTimeText, (GAME_START_POS_X + (GAME_WIDTH - (timeTextWidth / 2 + infoTimeText.get_width() / 2) - TEXT_MARGIN), GAME_START_POS_Y - (INFO_TEXT_SIZE + NUMERICAL_TEXT_SIZE + TEXT_MARGIN))))
+        rects.append(timeAtlas.draw(self.backend, timeText, (GAME_START_POS_X + (GAME_WIDTH - timeTextWidth - TEXT_MARGIN), GAME_START_POS_Y - (NUMERICAL_TEXT_SIZE + TEXT_MARGIN))))
+        return rects
     
     def endurance_add_time(self):
-        self.timer += EUNDRANCE_TIME_GAIN
-        self.tempTextsObJs.append(ui.TempText(self.screen, GAME_START_POS_X + GAME_WIDTH / 2, GAME_START_POS_Y + GAME_HEIGHT / 2, "+" + str(EUNDRANCE_TIME_GAIN) + "seconds", (255, 225, 0), self.infoText, 255, False, 5))
+        super().endurance_add_time()
+        self.effects.spawn_text(GAME_START_POS_X + GAME_WIDTH / 2, GAME_START_POS_Y + GAME_HEIGHT / 2, "+" + str(EUNDRANCE_TIME_GAIN) + "seconds", (255, 225, 0), INFO_TEXT_SIZE, 255, False, 5)
+        if self.audio is not None:
+            self.audio.play('time')
 
     def endurance_spawn_bonus(self):
-        self.make_all_tiles_black()
-        self.combo = 0
-        self.bonusActive = True
-            
-    def start_game(self, mode=ENDURANCE):
-        # init values
-        self.running = True
-        self.tiles = [0] * (SIZE*SIZE)
-        self.score = 0
-        self.combo = 0
-        self.blackTiles = 0
-        self.patternsCleared = 0
-        self.mode = mode
-
-        if self.mode is ENDURANCE:
-            self.timer = ENDURANCE_START_TIMER
-        elif self.mode is PATTERN:
-            self.timer = PATTERN_START_TIMER
-        elif self.mode is FRENZY:
-            self.timer = FRENZY_START_TIMER
-
-        clock = pygame.time.Clock()
-        dt = 0
-        saveScore = True
-
-        # init random black tiles
-        self.init_tiles()
-
-        # Game loop
-        while self.running:
-            # If user exits then exit
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                    break
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1: # left click
-                        mousePos = event.pos
-                        tileClicked = self.get_tile_from_pos(mousePos)
-                        if tileClicked != -1:
-                            self.click_tile(tileClicked)
-
-            # if endurance mode
-            if self.mode is ENDURANCE:
-                # if combo exceeds threshold spawn bonus
-                if self.combo >= self.COMBO_THRESHOLD:
-                    self.endurance_spawn_bonus()
-
-            # Render
-            self.draw_background()
-            self.draw_tiles()
-            
-            if self.mode is not PATTERN:
-                self.draw_combo()
-            
-            self.draw_temp_text_objs()
-            self.display_information()
-            pygame.display.flip()
-            
-            dt = clock.tick(REFRESH_RATE) / 1000
-            self.combo -= self.COMBO_LOSS_PER_FRAME if self.combo > 0 else 0
-            
-            if self.mode is ENDURANCE or self.mode is FRENZY:
-                self.timer -= dt
+        super().endurance_spawn_bonus()
+        if self.audio is not None:
+            self.audio.play('bonus')
+
+    def build_layers(self):
+        # static background only has to be drawn once
+        if self.backgroundLayer is None:
+            self.backgroundLayer = pygame.Surface(self.screen.get_size()).convert()
+            self.draw_background(self.backgroundLayer)
+
+        if self.boardLayer is None:
+            self.boardLayer = pygame.Surface((GAME_WIDTH, GAME_HEIGHT)).convert()
+        if self.grid is not None:
+            self.update_grid()
+            self.grid.draw(backend.SurfaceBackend(self.boardLayer), (0, 0))
+            return
+        self.boardLayer.fill(self.COMBO_UI_COLOR)
+        for i in range(self.tileCount):
+            self.draw_tile(self.boardLayer, i, 0, 0)
+        self.dirtyTiles.clear()
+
+    # Copy the cached background and board back over a rect of the screen
+    def restore_rect(self, rect):
+        self.screen.blit(self.backgroundLayer, rect, rect)
+        boardPart = rect.clip(self.boardRect)
+        if boardPart.width > 0 and boardPart.height > 0:
+            self.screen.blit(self.boardLayer, boardPart, boardPart.move(-self.boardRect.x, -self.boardRect.y))
+
+    def draw_dynamic(self):
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter_ns()
+
+        rects = []
+        if self.rules.showCombo:
+            rects.extend(self.draw_combo())
+            if profiler is not None:
+                start = profiler.lap(profiler.COMBO, start)
+
+        rects.extend(self.draw_effects())
+        if profiler is not None:
+            start = profiler.lap(profiler.EFFECTS, start)
+
+        if self.race is not None:
+            rects.extend(self.draw_opponent())
+
+        rects.extend(self.display_information())
+        if profiler is not None:
+            profiler.lap(profiler.HUD, start)
+        return rects
+
+    # Draw the whole frame, returns None since everything has to be presented
+    def render_full(self):
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter_ns()
+
+        self.draw_background()
+        if profiler is not None:
+            start = profiler.lap(profiler.BACKGROUND, start)
+
+        self.draw_tiles()
+        if profiler is not None:
+            profiler.lap(profiler.TILES, start)
+
+        self.draw_dynamic()
+        self.redrawnArea += self.screen.get_width() * self.screen.get_height()
+        return None
+
+    # Draw only what changed, returns the rects that have to be presented
+    def render_dirty(self):
+        if self.fullRedraw:
+            self.build_layers()
+            self.screen.blit(self.backgroundLayer, (0, 0))
+            self.screen.blit(self.boardLayer, self.boardRect)
+            self.lastDynamicRects = self.draw_dynamic()
+            self.redrawnArea += self.screen.get_width() * self.screen.get_height()
+            self.fullRedraw = False
+            return None
+
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter_ns()
+
+        # erase what was drawn on top of the static layers last frame
+        rects = self.lastDynamicRects
+        for rect in rects:
+            self.restore_rect(rect)
+        if profiler is not None:
+            start = profiler.lap(profiler.BACKGROUND, start)
+
+        # redraw changed tiles into the cached board and copy them to the screen
+        for tileIdx in self.dirtyTiles:
+            if self.grid is not None:
+                tileRect = self.grid.draw_tile(self.boardLayer, tileIdx, self.is_black(tileIdx))
             else:
-                self.timer += dt
-
-            # clamp combo value to max value if playing frenzy
-            if self.mode is FRENZY:
-                self.combo = self.COMBO_THRESHOLD if self.combo > self.COMBO_THRESHOLD else self.combo
-
-            if (self.timer <= 0 or
-                (self.mode is PATTERN and self.patternsCleared >= PATTERN_AMOUNT)):
-                self.running = False
-
-        # If we didn't complete all patterns when playing PATTERN, then dont save result
-        if self.mode is PATTERN and self.patternsCleared < PATTERN_AMOUNT:
-            saveScore = False
+                tileRect = self.draw_tile(self.boardLayer, tileIdx, 0, 0)
+            rects.append(self.screen.blit(self.boardLayer, tileRect.move(self.boardRect.topleft), tileRect))
+        self.dirtyTiles.clear()
+        if profiler is not None:
+            profiler.lap(profiler.TILES, start)
+
+        self.lastDynamicRects = self.draw_dynamic()
+        rects.extend(self.lastDynamicRects)
+
+        for rect in rects:
+            self.redrawnArea += rect.width * rect.height
+        return rects
+
+    # Click whatever tile is at pos (logical coordinates), returns the tile or -1
+    def tap(self, pos, eventTime):
+        tileClicked = self.get_tile_from_pos(pos)
+        if tileClicked != -1:
+            self.taps += 1
+            self.clickTime = eventTime
+            self.click(tileClicked)
+            if self.latency is not None:
+                self.latency.record_click(eventTime, time.perf_counter())
+        return tileClicked
+
+    def handle_event(self, event):
+        # If user exits then exit
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            # SDL also sends touches as mouse clicks, in touch mode the finger events are used instead
+            if event.button == 1 and not (self.touchInput and getattr(event, 'touch', False)): # left click
+                self.tap(self.backend.to_logical(event.pos), time.perf_counter())
+        elif event.type == pygame.FINGERDOWN:
+            # every finger taps once when it goes down, however it moves after that
+            finger = (event.touch_id, event.finger_id)
+            if self.touchInput and finger not in self.fingers:
+                eventTime = time.perf_counter()
+                width, height = self.backend.logicalSize
+                self.fingers[finger] = self.tap((event.x * width, event.y * height), eventTime)
+        elif event.type == pygame.FINGERUP:
+            self.fingers.pop((event.touch_id, event.finger_id), None)
+        elif event.type in scheduler.EXPOSE_EVENTS:
+            self.fullRedraw = True
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_F3 and self.profiler is not None:
+                self.profiler.toggle_overlay()
+                self.fullRedraw = True
+
+    # Handle input as soon as it arrives until the next frame is due, so a
+    # click is resolved against the board as it is when the click happens
+    def wait_for_frame(self, deadline):
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter_ns()
 
-        return {
-            'score': self.score if self.mode is not PATTERN else self.timer,
-            'mode': self.mode,
-            'save_score': saveScore
-        }
+        while self.running:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            event = pygame.event.wait(max(1, int(remaining * 1000)))
+            if profiler is not None:
+                start = profiler.lap(profiler.SLEEP, start)
+            if event.type != pygame.NOEVENT:
+                self.handle_event(event)
+                if profiler is not None:
+                    start = profiler.lap(profiler.EVENTS, start)
+
+        for event in pygame.event.get():
+            self.handle_event(event)
+        if profiler is not None:
+            profiler.lap(profiler.EVENTS, start)
+
+    # Draw the whole frame through the texture backend. The background and
+    # the two tile looks are surfaces made once, so after the first frame
+    # nothing is uploaded besides new text
+    def render_textured(self):
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter_ns()
+
+        if self.backgroundLayer is None:
+            self.backgroundLayer = pygame.Surface(self.backend.logicalSize)
+            self.draw_background(self.backgroundLayer)
+            self.tileSurfaces = []
+            for color in (WHITE_TILE_COLOR, BLACK_TILE_COLOR):
+                tile = pygame.Surface((int(self.tileWidth), int(self.tileHeight)))
+                tile.fill(color)
+                pygame.draw.rect(tile, color=TILE_BORDER_COLOR, rect=tile.get_rect(), width=TILE_BORDER)
+                self.tileSurfaces.append(tile)
+        self.backend.blit(self.backgroundLayer, (0, 0))
+        if profiler is not None:
+            start = profiler.lap(profiler.BACKGROUND, start)
+
+        if self.grid is not None:
+            self.update_grid()
+            self.grid.draw(self.backend, self.boardRect.topleft)
+        else:
+            white, black = self.tileSurfaces
+            for i in range(self.tileCount):
+                self.backend.blit(black if self.is_black(i) else white, (GAME_START_POS_X + self.tileWidth * (i % self.size), GAME_START_POS_Y + self.tileHeight * (i // self.size)))
+            self.dirtyTiles.clear()
+        if profiler is not None:
+            profiler.lap(profiler.TILES, start)
+
+        self.draw_dynamic()
+        self.redrawnArea += self.backend.logicalSize[0] * self.backend.logicalSize[1]
+        return None
+
+    def render(self):
+        if self.backend.textured:
+            rects = self.render_textured()
+        else:
+            rects = self.render_dirty() if self.dirtyRendering else self.render_full()
+
+        profiler = self.profiler
+        if profiler is not None:
+            if profiler.showOverlay:
+                overlayRect = profiler.draw_overlay(self.backend)
+                if self.dirtyRendering:
+                    self.lastDynamicRects.append(overlayRect)
+                if rects is not None:
+                    rects.append(overlayRect)
+            start = time.perf_counter_ns()
+
+        self.backend.present(rects)
+
+        if profiler is not None:
+            profiler.lap(profiler.PRESENT, start)
+        if self.latency is not None:
+            self.latency.record_present(time.perf_counter())
+
+    # Set up a new game, the menu's game scene then calls update and render
+    # every frame until the game stops running and finish after that
+    def begin(self, mode=ENDURANCE):
+        # init values and random black tiles, with a fresh seed so the game
+        # can be replayed, or the race's seed so both players get the same tiles
+        seed = int.from_bytes(os.urandom(8), 'little') if self.race is None else self.race.match[1]
+        self.reset(mode, seed)
+        self.effects.clear()
+        if self.recorder is not None:
+            self.recorder.start(mode, seed, self.size)
+        self.fullRedraw = True
+        self.redrawnArea = 0
+        self.fingers.clear()
+        self.taps = 0
+        if self.latency is not None:
+            self.latency.reset()
+        if self.audio is not None:
+            self.audio.reset()
+        if self.profiler is not None:
+            self.profiler.reset()
+
+        self.lastTime = time.perf_counter()
+        self.accumulator = 0
+        self.alpha = 0
+        self.droppedTicks = 0
+        if self.race is not None:
+            self.raceTick = 0
+            self.opponentBoard = None
+            self.race.begin(self)
+
+    # Run the rules in fixed ticks for the time that passed since the last
+    # update, after MAX_TICKS_PER_FRAME the rest of a stall is dropped so the
+    # game slows down instead of spiralling
+    def update(self):
+        if self.profiler is not None:
+            start = time.perf_counter_ns()
+
+        tickTime = self.tickTime
+        now = time.perf_counter()
+        accumulator = self.accumulator + now - self.lastTime
+        self.lastTime = now
+
+        ticks = 0
+        while accumulator >= tickTime and self.running:
+            if ticks == MAX_TICKS_PER_FRAME:
+                dropped = int(accumulator / tickTime)
+                self.droppedTicks += dropped
+                accumulator -= dropped * tickTime
+                break
+            self.advance(tickTime)
+            accumulator -= tickTime
+            ticks += 1
+        self.accumulator = accumulator
+        self.alpha = accumulator / tickTime
+        if self.race is not None:
+            self.sync_race()
+
+        if self.profiler is not None:
+            self.profiler.lap(self.profiler.LOGIC, start)
+            self.profiler.end_frame()
+        return self.running
+
+    def finish(self):
+        if self.race is not None:
+            self.race.finish(self, self.raceTick)
+        if self.audio is not None:
+            self.audio.play('game_over')
+        if self.latency is not None:
+            print(self.latency.report())
+            if self.audio is not None:
+                print(self.audio.report())
+        if self.profiler is not None:
+            self.profiler.dump_csv(PROFILE_CSV_PATH.format(int(time.time())))
+        if self.recorder is not None:
+            os.makedirs(REPLAY_DIR, exist_ok=True)
+            self.replayPath = os.path.join(REPLAY_DIR, "{}_{}.dtr".format(int(time.time() * 1000), self.mode))
+            self.recorder.save(self, self.replayPath)
+
+        return self.result()
+
+    # Play a whole game in its own loop, returns the result
+    def start_game(self, mode=ENDURANCE):
+        self.begin(mode)
+        frameTime = 1 / REFRESH_RATE if REFRESH_RATE else 0
+        nextFrame = time.perf_counter()
+        while self.running:
+            self.render()
+            # don't try to catch up with a burst of frames after a stall
+            nextFrame = max(nextFrame + frameTime, time.perf_counter())
+            self.wait_for_frame(nextFrame)
+            self.update()
+        return self.finish()
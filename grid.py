@@ -0,0 +1,70 @@
+import numpy as np
+import pygame
+
+from settings import *
+
+# Board renderer for large grids. The board is kept as a size x size surface
+# with one pixel per tile, which the backend scales up to the play area in
+# one operation, and the tile borders come from an overlay that is drawn
+# once. Tile edges sit on whole pixels (column x covers tile x * size // width)
+# so they line up with Game.get_tile_from_pos.
+class GridRenderer:
+
+    OVERLAY_KEY = (255, 0, 255)
+
+    def __init__(self, size, width=GAME_WIDTH, height=GAME_HEIGHT) -> None:
+        self.size = size
+        self.width = width
+        self.height = height
+        self.cells = pygame.Surface((size, size))
+        self.cells.fill(WHITE_TILE_COLOR)
+        self.changed = True # cells changed since they were last drawn
+        self.colors = np.array((WHITE_TILE_COLOR, BLACK_TILE_COLOR), dtype=np.uint8)
+
+        self.overlay = pygame.Surface((width, height))
+        self.overlay.fill(self.OVERLAY_KEY)
+        self.overlay.set_colorkey(self.OVERLAY_KEY)
+        for i in range(size):
+            # first and last pixel column/row of tile i, with a border on both sides like draw_tile
+            x0, x1 = self.edge(i, width), self.edge(i + 1, width) - 1
+            y0, y1 = self.edge(i, height), self.edge(i + 1, height) - 1
+            self.overlay.fill(TILE_BORDER_COLOR, (x0, 0, TILE_BORDER, height))
+            self.overlay.fill(TILE_BORDER_COLOR, (x1 - TILE_BORDER + 1, 0, TILE_BORDER, height))
+            self.overlay.fill(TILE_BORDER_COLOR, (0, y0, width, TILE_BORDER))
+            self.overlay.fill(TILE_BORDER_COLOR, (0, y1 - TILE_BORDER + 1, width, TILE_BORDER))
+
+    # First pixel of tile i along an axis of the given length
+    def edge(self, i, length):
+        return (i * length + self.size - 1) // self.size
+
+    def tile_rect(self, tileIdx):
+        x, y = tileIdx % self.size, tileIdx // self.size
+        x0, y0 = self.edge(x, self.width), self.edge(y, self.height)
+        return pygame.Rect(x0, y0, self.edge(x + 1, self.width) - x0, self.edge(y + 1, self.height) - y0)
+
+    def set_tile(self, tileIdx, black):
+        self.cells.set_at((tileIdx % self.size, tileIdx // self.size), BLACK_TILE_COLOR if black else WHITE_TILE_COLOR)
+        self.changed = True
+
+    # Redraw one tile of a board that was already drawn to surface at (0, 0)
+    def draw_tile(self, surface, tileIdx, black):
+        self.set_tile(tileIdx, black)
+        rect = self.tile_rect(tileIdx)
+        surface.fill(BLACK_TILE_COLOR if black else WHITE_TILE_COLOR, rect)
+        surface.blit(self.overlay, rect, rect)
+        return rect
+
+    # Rebuild every cell from the board bitmask
+    def load(self, board):
+        tileCount = self.size * self.size
+        bits = np.unpackbits(np.frombuffer(board.to_bytes((tileCount + 7) // 8, 'little'), dtype=np.uint8), bitorder='little')
+        # surfarray is indexed [x, y]
+        pygame.surfarray.blit_array(self.cells, self.colors[bits[:tileCount].reshape(self.size, self.size).T])
+        self.changed = True
+
+    # Draw the board with its top left corner at pos through a rendering backend
+    def draw(self, backend, pos):
+        rect = backend.blit_scaled(self.cells, (pos, (self.width, self.height)), self.changed)
+        self.changed = False
+        backend.blit(self.overlay, rect.topleft)
+        return rect
@@ -0,0 +1,53 @@
+# Click latency instrumentation. pygame doesn't expose SDL's event
+# timestamps, so an event's arrival time is when the game loop received it.
+# Times are time.perf_counter() seconds.
+
+def percentile(sortedValues, p):
+    if not sortedValues:
+        return 0.0
+    idx = min(len(sortedValues) - 1, int(round(p / 100 * (len(sortedValues) - 1))))
+    return sortedValues[idx]
+
+class LatencyStats:
+
+    PERCENTILES = (50, 95, 99, 100)
+
+    def __init__(self) -> None:
+        self.clickDelays = []   # event arrival -> click_tile done
+        self.presentDelays = [] # event arrival -> next present
+        self.pending = []       # arrival times of clicks that haven't been presented yet
+
+    def reset(self):
+        self.clickDelays.clear()
+        self.presentDelays.clear()
+        self.pending.clear()
+
+    def record_click(self, eventTime, clickTime):
+        self.clickDelays.append(clickTime - eventTime)
+        self.pending.append(eventTime)
+
+    def record_present(self, presentTime):
+        if not self.pending:
+            return
+        for eventTime in self.pending:
+            self.presentDelays.append(presentTime - eventTime)
+        self.pending.clear()
+
+    # {'click': {50: ms, 95: ms, ...}, 'present': {...}, 'samples': n}
+    def summary(self):
+        clickDelays = sorted(self.clickDelays)
+        presentDelays = sorted(self.presentDelays)
+        return {
+            'click': {p: percentile(clickDelays, p) * 1000 for p in self.PERCENTILES},
+            'present': {p: percentile(presentDelays, p) * 1000 for p in self.PERCENTILES},
+            'samples': len(clickDelays),
+        }
+
+    def report(self):
+        summary = self.summary()
+        lines = ["click latency over {} clicks (ms)".format(summary['samples'])]
+        for name, label in (('click', "event -> click_tile"), ('present', "event -> present")):
+            lines.append("  {:<20} ".format(label) + "  ".join(
+                "p{} {:.2f}".format(p, value) if p < 100 else "max {:.2f}".format(value)
+                for p, value in summary[name].items()))
+        return "\n".join(lines)
@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import bisect
+import json
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import modes
+from settings import *
+
+# Shared leaderboard over TCP. Requests and replies are one JSON object per
+# line:
+#   {"op": "submit", "scores": [{"id", "mode", "score", "time", "player"}, ...]}
+#       -> {"ok": true, "accepted": n}
+#   {"op": "top", "mode": m, "n": k} -> {"ok": true, "scores": [[player, score], ...]}
+#
+# The server keeps the best LEADERBOARD_TOP_K scores of every mode in memory
+# and writes accepted scores to SQLite in batches behind the replies. Score
+# ids make submissions idempotent, so the client can retry a batch whose
+# reply got lost.
+#
+#   py ./leaderboard.py serve [--host 127.0.0.1] [--port 7878] [--db leaderboard.db]
+#
+# The server ranks the modes registered when it starts, plugins included.
+
+# Lower is better for modes like pattern (time to clear), higher for the rest
+def rank_key(mode, score):
+    return score if modes.get(mode).lowerIsBetter else -score
+
+class LeaderboardServer:
+
+    FLUSH_INTERVAL = 1.0 # seconds between writes of accepted scores
+    FLUSH_SIZE = 256 # or as soon as this many are waiting
+
+    def __init__(self, path=LEADERBOARD_DB_PATH, topK=LEADERBOARD_TOP_K) -> None:
+        self.topK = topK
+        self.port = None
+        # used from whichever thread runs serve(), one at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS leaderboard (
+                id TEXT PRIMARY KEY,
+                mode INTEGER NOT NULL,
+                score NUMERIC NOT NULL,
+                player TEXT NOT NULL,
+                time REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS leaderboard_mode_score ON leaderboard (mode, score);
+        """)
+        self.pending = [] # accepted but not written yet
+
+        # per mode, sorted best first: (rank key, time, id, player, score)
+        self.top = {}
+        for mode in modes.registry:
+            order = "ASC" if modes.get(mode).lowerIsBetter else "DESC"
+            rows = self.connection.execute(
+                "SELECT id, player, score, time FROM leaderboard WHERE mode = ? ORDER BY score {}, time LIMIT ?".format(order),
+                (mode, topK)).fetchall()
+            self.top[mode] = [(rank_key(mode, score), timestamp, scoreId, player, score) for scoreId, player, score, timestamp in rows]
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def submit(self, scores):
+        accepted = 0
+        for entry in scores:
+            try:
+                scoreId = str(entry['id'])
+                mode = int(entry['mode'])
+                score = entry['score']
+                timestamp = float(entry.get('time', time.time()))
+                player = str(entry.get('player', ''))[:32]
+            except (KeyError, TypeError, ValueError):
+                continue
+            if mode not in self.top or isinstance(score, bool) or not isinstance(score, (int, float)):
+                continue
+
+            self.pending.append((scoreId, mode, score, player, timestamp))
+            accepted += 1
+
+            top = self.top[mode]
+            if any(item[2] == scoreId for item in top):
+                continue # a retried batch
+            bisect.insort(top, (rank_key(mode, score), timestamp, scoreId, player, score))
+            del top[self.topK:]
+
+        if len(self.pending) >= self.FLUSH_SIZE:
+            self.flush()
+        return accepted
+
+    def top_scores(self, mode, n):
+        return [[player, score] for key, timestamp, scoreId, player, score in self.top[mode][:max(n, 0)]]
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO leaderboard (id, mode, score, player, time) VALUES (?, ?, ?, ?, ?)", self.pending)
+        self.pending.clear()
+
+    def handle_request(self, request):
+        op = request.get('op')
+        if op == 'submit':
+            return {'ok': True, 'accepted': self.submit(request.get('scores', []))}
+        if op == 'top':
+            mode = request.get('mode')
+            if mode not in self.top:
+                return {'ok': False, 'error': "unknown mode"}
+            return {'ok': True, 'scores': self.top_scores(mode, min(int(request.get('n', 10)), self.topK))}
+        return {'ok': False, 'error': "unknown op"}
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.handle_request(json.loads(line))
+                except (ValueError, TypeError, AttributeError) as error:
+                    reply = {'ok': False, 'error': str(error)}
+                writer.write(json.dumps(reply, separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            self.flush()
+
+    async def serve(self, host=LEADERBOARD_HOST, port=LEADERBOARD_PORT, ready=None):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        self.port = server.sockets[0].getsockname()[1] # the bound port when port is 0
+        flusher = asyncio.create_task(self.flush_loop())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            flusher.cancel()
+            self.flush()
+
+class LeaderboardError(Exception):
+    pass
+
+# Client used by the menu. Runs its own event loop on a daemon thread so
+# nothing it does blocks the game: submit() puts the score in a persistent
+# queue (SQLite) and returns, a sender task sends the queue in batches over
+# one reused connection and retries with backoff while the server can't be
+# reached. The last fetched top scores are cached for drawing, onUpdate is
+# called from the client thread whenever they change.
+class LeaderboardClient:
+
+    BATCH_SIZE = 50
+    FETCH_WAIT_POLLS = 50 # a fetch waits up to this many 10 ms polls for queued scores to go out
+    TIMEOUT = 5
+    RETRY_MIN = 0.5
+    RETRY_MAX = 30
+
+    def __init__(self, host=LEADERBOARD_HOST, port=LEADERBOARD_PORT, queuePath=LEADERBOARD_QUEUE_PATH, player=None, onUpdate=None) -> None:
+        self.host = host
+        self.port = port
+        self.queuePath = queuePath
+        self.player = player or PLAYER_NAME or socket.gethostname()
+        self.onUpdate = onUpdate
+        self.cache = {} # mode -> [[player, score], ...] from the last fetch
+        self.connected = False # whether the last request reached the server
+        self.sent = 0
+
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+        self.wake = asyncio.Event()
+
+        # only used from the client thread once that is running
+        self.queue = sqlite3.connect(queuePath, check_same_thread=False)
+        self.queue.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id TEXT PRIMARY KEY,
+                mode INTEGER NOT NULL,
+                score NUMERIC NOT NULL,
+                player TEXT NOT NULL,
+                time REAL NOT NULL
+            )""")
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="leaderboard", daemon=True)
+        self.thread.start()
+        self.sender = asyncio.run_coroutine_threadsafe(self.send_loop(), self.loop)
+
+    def submit(self, mode, score):
+        entry = (uuid.uuid4().hex, mode, score, self.player, time.time())
+        self.loop.call_soon_threadsafe(self.enqueue, entry)
+
+    def refresh(self, mode, n=10):
+        asyncio.run_coroutine_threadsafe(self.fetch_top(mode, n), self.loop)
+
+    def top(self, mode):
+        return self.cache.get(mode, [])
+
+    def pending(self):
+        return asyncio.run_coroutine_threadsafe(self.count_pending(), self.loop).result(self.TIMEOUT)
+
+    # Stop the client thread, anything unsent stays queued for next time
+    def close(self):
+        if not self.thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(self.TIMEOUT)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(self.TIMEOUT)
+
+    async def shutdown(self):
+        # the sender and any fetch still running, so none is left pending when the loop stops
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.disconnect()
+        self.queue.close()
+
+    async def count_pending(self):
+        return self.queue.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+
+    def enqueue(self, entry):
+        with self.queue:
+            self.queue.execute("INSERT OR IGNORE INTO queue (id, mode, score, player, time) VALUES (?, ?, ?, ?, ?)", entry)
+        self.wake.set()
+
+    def disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    # One request on the shared connection, connecting first if needed
+    async def request(self, message):
+        async with self.lock:
+            try:
+                if self.writer is None:
+                    self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.TIMEOUT)
+                self.writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+                await self.writer.drain()
+                line = await asyncio.wait_for(self.reader.readline(), self.TIMEOUT)
+                if not line:
+                    raise ConnectionResetError("leaderboard server closed the connection")
+                reply = json.loads(line)
+            except (OSError, asyncio.TimeoutError, ValueError):
+                self.disconnect()
+                self.set_connected(False)
+                raise
+        self.set_connected(True)
+        if not reply.get('ok'):
+            raise LeaderboardError(reply.get('error'))
+        return reply
+
+    def set_connected(self, connected):
+        if connected != self.connected:
+            self.connected = connected
+            if self.onUpdate is not None:
+                self.onUpdate()
+
+    async def send_loop(self):
+        delay = self.RETRY_MIN
+        while True:
+            rows = self.queue.execute("SELECT id, mode, score, player, time FROM queue ORDER BY rowid LIMIT ?", (self.BATCH_SIZE,)).fetchall()
+            if not rows:
+                self.wake.clear()
+                await self.wake.wait()
+                continue
+
+            scores = [{'id': scoreId, 'mode': mode, 'score': score, 'player': player, 'time': timestamp} for scoreId, mode, score, player, timestamp in rows]
+            try:
+                await self.request({'op': 'submit', 'scores': scores})
+            except (OSError, asyncio.TimeoutError, ValueError):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RETRY_MAX)
+                continue
+            except LeaderboardError:
+                pass # rejected by the server, retrying won't help
+            delay = self.RETRY_MIN
+
+            with self.queue:
+                self.queue.executemany("DELETE FROM queue WHERE id = ?", [(row[0],) for row in rows])
+            self.sent += len(rows)
+
+    async def fetch_top(self, mode, n):
+        # wait for queued scores to go out first so the player's own score shows up
+        for i in range(self.FETCH_WAIT_POLLS):
+            if not self.connected or await self.count_pending() == 0:
+                break
+            await asyncio.sleep(0.01)
+        try:
+            reply = await self.request({'op': 'top', 'mode': mode, 'n': n})
+        except (OSError, asyncio.TimeoutError, ValueError, LeaderboardError):
+            return
+        self.cache[mode] = reply['scores']
+        if self.onUpdate is not None:
+            self.onUpdate()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Don't Tap leaderboard server")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve')
+    serve.add_argument('--host', default=LEADERBOARD_HOST)
+    serve.add_argument('--port', type=int, default=LEADERBOARD_PORT)
+    serve.add_argument('--db', default=LEADERBOARD_DB_PATH)
+    args = parser.parse_args()
+
+    modes.load_plugins()
+    server = LeaderboardServer(args.db)
+    print("leaderboard listening on {}:{}".format(args.host, args.port))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -1,20 +1,106 @@
-import os.path
 import time
-import math
+startTime = time.perf_counter()
+
+import sys
 
 import pygame
-import random as rnd
 
+import backend
 import menu as m
+import modes
+import touch
 from settings import *
 
+# --profile-startup prints how long each startup step took until the first
+# frame of the main menu was presented
+def profile_first_present(screen, marks):
+    present = screen.present
+
+    def present_first(rects=None):
+        present(rects)
+        if marks[-1][0] != "first frame":
+            marks.append(("first frame", time.perf_counter()))
+            last = startTime
+            for name, at in marks:
+                print("{:<12} {:8.1f} ms".format(name, (at - last) * 1000))
+                last = at
+            print("{:<12} {:8.1f} ms".format("total", (last - startTime) * 1000))
+    screen.present = present_first
+
 if __name__ == '__main__':
-    pygame.init()
+    marks = [("imports", time.perf_counter())]
+
+    # only the subsystems the game uses, pygame.init() would also bring up
+    # joysticks
+    pygame.display.init()
     pygame.font.init()
+    marks.append(("init", time.perf_counter()))
 
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    # extra game modes, they get a menu button each
+    modes.load_plugins()
+    marks.append(("plugins", time.perf_counter()))
 
-    menu = m.Menu(screen)
+    # --renderer=texture to draw through SDL's GPU renderer, --window=WxH to
+    # scale the game to another window size, --size=N for an N x N board,
+    # --leaderboard[=host:port] to share scores through a leaderboard server,
+    # --mute to play without sound, --capture[=y4m|png] to record a video of
+    # everything shown (--capture-scale=N to shrink it N times), --touch to
+    # play with multi-touch on a touchscreen, --race[=host:port] to race
+    # every game against another player through a race server
+    renderer = RENDER_BACKEND
+    windowSize = WINDOW_SIZE
+    size = SIZE
+    client = None
+    raceClient = None
+    captureFormat = None
+    captureScale = CAPTURE_SCALE
+    for arg in sys.argv[1:]:
+        if arg.startswith('--renderer='):
+            renderer = arg.split('=', 1)[1]
+        elif arg.startswith('--window='):
+            windowSize = tuple(int(value) for value in arg.split('=', 1)[1].split('x'))
+        elif arg.startswith('--size='):
+            size = int(arg.split('=', 1)[1])
+        elif arg == '--leaderboard' or arg.startswith('--leaderboard='):
+            host, port = LEADERBOARD_HOST, LEADERBOARD_PORT
+            if '=' in arg:
+                host, port = arg.split('=', 1)[1].rsplit(':', 1)
+            # asyncio and the score queue only load for games that use them
+            import leaderboard
+            client = leaderboard.LeaderboardClient(host, int(port))
+        elif arg == '--race' or arg.startswith('--race='):
+            host, port = RACE_HOST, RACE_PORT
+            if '=' in arg:
+                host, port = arg.split('=', 1)[1].rsplit(':', 1)
+            import race
+            raceClient = race.RaceClient(host, int(port))
+        elif arg == '--capture' or arg.startswith('--capture='):
+            captureFormat = arg.split('=', 1)[1] if '=' in arg else CAPTURE_FORMAT
+        elif arg.startswith('--capture-scale='):
+            captureScale = int(arg.split('=', 1)[1])
+
+    screen = backend.create_backend(renderer, windowSize)
+    marks.append(("window", time.perf_counter()))
+    if captureFormat is not None:
+        import capture
+        screen.capture = capture.FrameCapture(screen, fmt=captureFormat, scale=captureScale)
+    sound = None
+    if '--mute' not in sys.argv:
+        import audio
+        sound = audio.Audio()
+    marks.append(("audio", time.perf_counter()))
+    if '--profile-startup' in sys.argv:
+        profile_first_present(screen, marks)
+
+    touchInput = TOUCH_INPUT or '--touch' in sys.argv
+    menu = m.Menu(screen, '--measure-cpu' in sys.argv, '--measure-latency' in sys.argv, '--profile' in sys.argv, '--record' in sys.argv, size=size, leaderboard=client, audio=sound, touchInput=touchInput, race=raceClient)
+    # only queue the events something handles
+    touch.restrict_events(touchInput, (m.LEADERBOARD_UPDATED, m.RACE_UPDATED))
+    marks.append(("menu", time.perf_counter()))
     menu.main_menu()
 
-    pygame.quit()
\ No newline at end of file
+    if screen.capture is not None:
+        screen.capture.close()
+        print(screen.capture.report())
+
+    pygame.quit()
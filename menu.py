@@ -1,307 +1,348 @@
 import pygame
-import os
 import math
+import time
 
+import backend
 import ui
 import game as g
+import modes
+import plot
+import scheduler
+import stats
 from settings import *
 
+# posted by the leaderboard client thread when it has new data to show
+LEADERBOARD_UPDATED = pygame.event.custom_type()
+# posted by the race client thread when the race result is in
+RACE_UPDATED = pygame.event.custom_type()
 
 class Menu:
-    def __init__(self, screen) -> None:
-        self.screen = screen
-        self.game = g.Game(self.screen)
+
+    TITLE_FPS = 30
+    TITLE_BOUNCE_SPEED = 1.5 # radians per second
+
+    # screen is a rendering backend or a surface to draw on
+    def __init__(self, screen, measureCpu=False, measureLatency=False, profileFrames=False, recordReplays=False, statsPath=STATS_DB_PATH, size=SIZE, leaderboard=None, audio=None, touchInput=TOUCH_INPUT, race=None) -> None:
+        self.backend = backend.as_backend(screen)
+        self.scheduler = scheduler.Scheduler(measureCpu, self.backend.present)
+        self.game = g.Game(self.backend, measureLatency=measureLatency, profileFrames=profileFrames, recordReplays=recordReplays, size=size, audio=audio, touchInput=touchInput, race=race)
         self.statsMode = ENDURANCE
-        self.headerText = pygame.font.SysFont('Monocraft', 100)
-        self.header2Text = pygame.font.SysFont('Monocraft', 65)
+        self.statsPath = statsPath
+        self.lazyStore = None # score store and plot are opened on first use
+        self.lazyPlot = None
+        self.leaderboard = leaderboard # optional leaderboard.LeaderboardClient
+        if leaderboard is not None:
+            leaderboard.onUpdate = lambda: pygame.event.post(pygame.event.Event(LEADERBOARD_UPDATED))
+        self.race = race # optional race.RaceClient, every game is then raced against someone
+        if race is not None:
+            race.onUpdate = lambda: pygame.event.post(pygame.event.Event(RACE_UPDATED))
+
+        # every screen is made once and reused
+        self.mainMenuScene = MainMenuScene(self)
+        self.gameScene = GameScene(self)
+        self.gameOverScene = GameOverScene(self)
+        self.statsScene = StatsScene(self)
+        self.raceScene = RaceScene(self)
+
+    @property
+    def scoreStore(self):
+        if self.lazyStore is None:
+            self.lazyStore = stats.ScoreStore(self.statsPath)
+        return self.lazyStore
+
+    @property
+    def statsPlot(self):
+        if self.lazyPlot is None:
+            self.lazyPlot = plot.StatsPlot(self.scoreStore)
+        return self.lazyPlot
 
     def draw_background(self):
-        self.screen.fill(BACKGROUND_COLOR)
-        pygame.draw.rect(self.screen, color=(0,0,0), rect=(GAME_START_POS_X, 0, GAME_WIDTH, SCREEN_HEIGHT))
+        self.backend.clear(BACKGROUND_COLOR)
+        self.backend.fill_rect((0,0,0), (GAME_START_POS_X, 0, GAME_WIDTH, SCREEN_HEIGHT))
 
     def button_clicked(self, buttons, pos):
-        posX, posY = pos
-        
-        for button in buttons:
-            if posX > button.x and posX < button.x + button.width and posY > button.y and posY < button.y + button.height:
-                return button
-        return -1
+        return buttons.hit_test(pos)
+
+    # Shared event handling for menu screens, runs the clicked button's action
+    def handle_buttons(self, event, buttons):
+        if event.type == pygame.QUIT:
+            self.quit_clicked()
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button == 1: # left click
+                button_clicked = self.button_clicked(buttons, self.backend.to_logical(event.pos))
+                if button_clicked != -1:
+                    return button_clicked.click()
+        return None
     
+    # Raced games wait for an opponent first
     def start_game(self, mode):
-        gameStats = self.game.start_game(mode)
-        self.game_over_screen(gameStats)
+        self.scheduler.push(self.gameScene if self.race is None else self.raceScene, mode)
 
     def quit_clicked(self):
-        exit()
+        if self.leaderboard is not None:
+            self.leaderboard.close()
+        if self.race is not None:
+            self.race.close()
+        self.scheduler.quit()
 
     def replay_clicked(self, mode):
-        self.start_game(mode)
-        return True
+        self.scheduler.switch(self.gameScene if self.race is None else self.raceScene, mode)
 
     def back_to_menu_clicked(self):
-        return True
+        self.scheduler.pop()
 
     def read_stats(self, mode, sort=True):
-        scores = []
-        
-        filePath = str(mode) + SAVE_PATH
-        if not os.path.isfile(filePath):
-            return scores
-        
-        with open(filePath, 'r') as file:
-            for line in file:
-                stats = line.split(' ')
-                if mode is PATTERN:
-                    scores.append(float("{:.2f}".format(float(stats[0].strip('\n')))))
-                else:
-                    print(stats[0])
-                    scores.append(int(stats[0].strip('\n')))
-        
-        # Sort in descending order if mode is pattern
-        reverse = True
-        if mode is PATTERN:
-            reverse = False
-        
-        if sort:
-            scores.sort(reverse=reverse)
+        # Sorted best first if sort, otherwise in the order they were played
+        scores = self.scoreStore.top(mode, None) if sort else self.scoreStore.history(mode)
+
+        if modes.get(mode).lowerIsBetter:
+            scores = [float("{:.2f}".format(score)) for score in scores]
         return scores
     
     def change_stats_display_gamemode(self, mode):
-        self.statsMode = mode
-        return False
+        if mode is not self.statsMode:
+            self.statsMode = mode
+            self.scheduler.invalidate()
     
-    def draw_plot(self, scores):
-        entries = len(scores)
-
-        HEIGHT = 250
-        WIDTH = 500
-        x0 = GAME_START_POS_X + GAME_WIDTH / 2 - WIDTH / 2
+    def draw_plot(self, mode):
+        x0 = GAME_START_POS_X + GAME_WIDTH / 2 - self.statsPlot.WIDTH / 2
         y0 = GAME_START_POS_Y + GAME_HEIGHT / 2 
-
-        # draw axises
-        if self.statsMode is ENDURANCE:
-            title = "Endurance stats"
-        elif self.statsMode is PATTERN:
-            title = "Pattern stats"
+        self.statsPlot.draw(self.backend, mode, x0, y0)
+
+    # Shared top scores next to the board, from the client's cache
+    def draw_leaderboard(self, mode):
+        x = GAME_START_POS_X + GAME_WIDTH + 100
+        y = GAME_START_POS_Y
+        topScores = self.leaderboard.top(mode)
+        if topScores:
+            title = "Global top"
         else:
-            title = "Frenzy stats"
-        text = self.header2Text.render(title, False, INFO_TEXT_COLOR)
-        self.screen.blit(text, (GAME_START_POS_X + GAME_WIDTH / 2 - text.get_width() / 2, y0 - TEXT_MARGIN - HEIGHT - text.get_height()))
-        pygame.draw.line(self.screen, (255, 0, 0), (x0, y0), (x0, y0 - HEIGHT), 2)  # Vertical axis
-        pygame.draw.line(self.screen, (255, 0, 0), (x0, y0), (x0 + WIDTH, y0), 2)  # Horizontal axis
+            title = "Leaderboard offline" if not self.leaderboard.connected else "No global scores"
+        titleText = ui.textCache.render(title, INFO_TEXT_COLOR, INFO_TEXT_SIZE)
+        self.backend.blit(titleText, (x, y))
+
+        scoreYMargin = 35
+        rules = modes.get(mode)
+        for i, (player, score) in enumerate(topScores):
+            scoreText = ui.textCache.render("{}. {} {}".format(i + 1, rules.format_score(score), player), INFO_TEXT_COLOR, 25)
+            self.backend.blit(scoreText, (x, y + titleText.get_height() + 20 + scoreYMargin * i))
+
+    # Run the game from the main menu until it is quit
+    def main_menu(self):
+        self.scheduler.push(self.mainMenuScene)
+        self.scheduler.run()
 
-        # if enough scores saved then display stats
-        if entries > 2:
-            data_points = []
-            for i, score in enumerate(scores):
-                data_points.append((int(i * (WIDTH / (entries - 1))), score))
+class MainMenuScene(scheduler.Scene):
 
+    name = "main menu"
+    fps = Menu.TITLE_FPS
 
-            dataMin = min(scores)
-            dataMax = max(scores)
-            scalar = (HEIGHT) / (dataMax - dataMin)
+    def __init__(self, menu) -> None:
+        super().__init__(menu.scheduler)
+        self.menu = menu
+        self.startTime = time.perf_counter()
 
-            statsFont = pygame.font.SysFont('Monocraft', 25)
-            verticalMaxText = statsFont.render(str(dataMax), False, INFO_TEXT_COLOR)
-            verticalMinText = statsFont.render(str(dataMin), False, INFO_TEXT_COLOR)
+        # buttons
+        # one button per registered mode
+        self.buttons = ui.WidgetTree(menu.backend, self.layout)
+        buttons = [(mode.name, (217, 201, 111), lambda mode=mode.id: menu.start_game(mode)) for mode in modes.all_modes()]
+        for text, color, action in buttons + [("Stats", (217, 201, 111), lambda: self.scheduler.push(menu.statsScene)),
+                                              ("Quit", (217, 110, 106), menu.quit_clicked)]:
+            self.buttons.add(ui.Button(menu.backend, 0, 0, 0, 0, text, (255, 255, 255), color, action))
+
+    def layout(self, size):
+        buttonsWidth = GAME_WIDTH / 2
+        return ui.column(len(self.buttons), GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, GAME_START_POS_Y + 250, buttonsWidth, 70, 20)
 
-            self.screen.blit(verticalMaxText, (x0 - verticalMaxText.get_width() - TEXT_MARGIN, y0 - HEIGHT))
-            self.screen.blit(verticalMinText, (x0 - verticalMinText.get_width() - TEXT_MARGIN, y0 - verticalMinText.get_height()))
+    def handle_event(self, event):
+        self.menu.handle_buttons(event, self.buttons)
 
+    def draw(self):
+        menu = self.menu
+        # draw background
+        menu.draw_background()
 
-            horizontalSegments = 8
-            horizontalJump = int(entries / horizontalSegments)
-            for i in range(horizontalSegments):
-                x = i + 1 + (horizontalJump * i)
-                text = statsFont.render(str(x), False, INFO_TEXT_COLOR)
-                self.screen.blit(text, (x0 + (i * (WIDTH / (horizontalSegments - 1)) - text.get_width() / 2), y0 + TEXT_MARGIN))
+        # draw menu ui
+        titleText = ui.textCache.render("Don't Tap", (255, 255, 255), 100)
 
+        titleYBounce = math.sin((time.perf_counter() - self.startTime) * Menu.TITLE_BOUNCE_SPEED)
+        titleYBounceScale = 25
+        menu.backend.blit(titleText, (GAME_START_POS_X + GAME_WIDTH / 2 - titleText.get_width() / 2, GAME_START_POS_Y + 50 + titleYBounce * titleYBounceScale))
 
-            for i, point in enumerate(data_points):
-                x1, y1 = x0, y0
-                x1 += point[0]
-                y1 -= point[1] * scalar
+        # Draw buttons
+        self.buttons.draw()
 
-                x2 = x0 + data_points[i + 1][0] if i < entries - 1 else x1
-                y2 = y0 - data_points[i + 1][1] * scalar if i < entries - 1 else y1
-                pygame.draw.line(self.screen, (255, 255, 0), (x1, y1), (x2, y2), 2)
-        else: # otherwise display error message
-            pass
+# Runs the menu's Game one frame per loop and goes to the game over screen
+# when it ends
+class GameScene(scheduler.Scene):
 
-    def game_over_screen(self, gameStats):
-        exitStatus = False
-        mode = gameStats['mode']
-        buttons = []
+    name = "game"
+    fps = REFRESH_RATE or math.inf # uncapped runs a frame every loop
+
+    def __init__(self, menu) -> None:
+        super().__init__(menu.scheduler)
+        self.menu = menu
+        self.game = menu.game
+
+    def enter(self, mode):
+        self.game.begin(mode)
+
+    def handle_event(self, event):
+        self.game.handle_event(event)
+
+    def update(self):
+        if not self.game.update():
+            self.scheduler.switch(self.menu.gameOverScene, self.game.finish())
+
+    # Game.render presents the frame itself, with only the changed areas
+    def render(self):
+        self.game.render()
+
+    def wait(self, deadline):
+        self.game.wait_for_frame(deadline / 1000)
+
+class GameOverScene(scheduler.Scene):
+
+    name = "game over"
+
+    def __init__(self, menu) -> None:
+        super().__init__(menu.scheduler)
+        self.menu = menu
+        self.mode = ENDURANCE
+        self.topScores = []
+        self.titleText = None
 
         # Create menu buttons
-        buttonsStartY = GAME_START_POS_Y + GAME_HEIGHT - 200
-        buttonsYMargin = 20
+        self.buttons = ui.WidgetTree(menu.backend, self.layout)
+        self.buttons.add(ui.Button(menu.backend, 0, 0, 0, 0, "Replay", (255, 255, 255), (0, 125, 255), lambda: menu.replay_clicked(self.mode)))
+        self.buttons.add(ui.Button(menu.backend, 0, 0, 0, 0, "Back to menu", (255, 255, 255), (217, 110, 106), menu.back_to_menu_clicked))
+
+    def layout(self, size):
         buttonsWidth = GAME_WIDTH / 2
-        buttonsHeight = 70
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Replay", (255, 255, 255), (0, 125, 255), lambda: self.replay_clicked(mode)))
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Back to menu", (255, 255, 255), (217, 110, 106), self.back_to_menu_clicked))
+        return ui.column(len(self.buttons), GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, GAME_START_POS_Y + GAME_HEIGHT - 200, buttonsWidth, 70, 20)
+
+    def enter(self, gameStats):
+        menu = self.menu
+        mode = gameStats['mode']
+        self.mode = mode
 
         # Save score 
         if gameStats['save_score']: 
-            with open(str(mode) + SAVE_PATH, 'a') as file:
-                file.write(str(gameStats['score']) + "\n")
+            menu.scoreStore.add(mode, gameStats['score'])
+            if menu.leaderboard is not None:
+                menu.leaderboard.submit(mode, gameStats['score'])
+        if menu.leaderboard is not None:
+            menu.leaderboard.refresh(mode)
 
         # Get highscores
-        topScores = self.read_stats(mode)[:10]
-
-        # Draw ui
-        self.draw_background()
-        
-        # Draw title text
-        if mode is PATTERN:
-            text = "You scored: " + str("{:.2f}".format(float(gameStats['score'])))
+        rules = modes.get(mode)
+        self.topScores = [rules.format_score(score) for score in menu.scoreStore.top(mode, 10)]
+
+        # Title text
+        text = "You scored: " + rules.format_score(gameStats['score'])
+        self.titleText = ui.textCache.render(text, INFO_TEXT_COLOR, 65)
+
+    def handle_event(self, event):
+        if event.type == LEADERBOARD_UPDATED or event.type == RACE_UPDATED:
+            self.scheduler.invalidate()
         else:
-            text = "You score:  " + str(gameStats['score'])
-        titleText = self.header2Text.render(text, False, INFO_TEXT_COLOR)
-        self.screen.blit(titleText, (GAME_START_POS_X + GAME_WIDTH / 2 - titleText.get_width() / 2, GAME_START_POS_Y))
+            self.menu.handle_buttons(event, self.buttons)
+
+    def draw(self):
+        menu = self.menu
+        titleText = self.titleText
+        menu.draw_background()
+        menu.backend.blit(titleText, (GAME_START_POS_X + GAME_WIDTH / 2 - titleText.get_width() / 2, GAME_START_POS_Y))
 
         # Display top scores
-        if len(topScores) > 0:
-            scoreFont = pygame.font.SysFont('Monocraft', 25)
+        if len(self.topScores) > 0:
             scoreStartY = GAME_START_POS_Y + titleText.get_height() + 100
             scoreYMargin = 35
-            for i, score in enumerate(topScores):
-                print(str(i + 1) + ". " + str(score))
-                scoreText = scoreFont.render(str(i + 1) + ". " + str(score), False, INFO_TEXT_COLOR)
-                self.screen.blit(scoreText, (GAME_START_POS_X + GAME_WIDTH / 2 - scoreText.get_width() / 2, scoreStartY + scoreYMargin * i))
+            for i, score in enumerate(self.topScores):
+                scoreText = ui.textCache.render(str(i + 1) + ". " + str(score), INFO_TEXT_COLOR, 25)
+                menu.backend.blit(scoreText, (GAME_START_POS_X + GAME_WIDTH / 2 - scoreText.get_width() / 2, scoreStartY + scoreYMargin * i))
+
+        if menu.leaderboard is not None:
+            menu.draw_leaderboard(self.mode)
+
+        if menu.race is not None:
+            raceText = ui.textCache.render(RaceScene.RESULTS[menu.race.result], INFO_TEXT_COLOR, INFO_TEXT_SIZE)
+            menu.backend.blit(raceText, (GAME_START_POS_X + GAME_WIDTH / 2 - raceText.get_width() / 2, GAME_START_POS_Y + titleText.get_height() + 25))
 
         # Draw buttons
-        for button in buttons:
-            button.draw()
-        
-        # Render ui
-        pygame.display.flip()
-
-        # Menu loop
-        while True:
-            # 
-            if exitStatus:
-                break
-
-            # Handle user events
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    break
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1: # left click
-                        mousePos = event.pos
-                        button_clicked = self.button_clicked(buttons, mousePos)
-                        if button_clicked != -1:
-                            exitStatus = button_clicked.action()
-
-    def stat_page(self):
-        exitStatus = False
-        buttons = []
+        self.buttons.draw()
 
-        # buttons
-        buttonsStartY = GAME_START_POS_Y + GAME_HEIGHT / 2 + 200
-        buttonsYMargin = 20
-        buttonsWidth = GAME_WIDTH / 3
-        buttonsHeight = 50
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Endurance", (255, 255, 255), (217, 201, 111), lambda: self.change_stats_display_gamemode(ENDURANCE)))
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Pattern", (255, 255, 255), (217, 201, 111), lambda: self.change_stats_display_gamemode(PATTERN)))
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Frenzy", (255, 255, 255), (217, 201, 111), lambda: self.change_stats_display_gamemode(FRENZY)))
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Back to menu", (255, 255, 255), (217, 110, 106), self.back_to_menu_clicked))
+# Waits for the race server to find an opponent, then starts the game
+class RaceScene(scheduler.Scene):
 
-        # draw background
-        self.draw_background()
+    name = "race lobby"
 
-        # draw menu ui
-        # Draw buttons
-        for button in buttons:
-            button.draw()
+    # indexed by race.NO_RESULT, WON, LOST, DRAW
+    RESULTS = ("Waiting for your opponent to finish", "You won the race", "You lost the race", "The race is a draw")
 
-        # Retrieve stats
-        scores = self.read_stats(ENDURANCE, False)
+    def __init__(self, menu) -> None:
+        super().__init__(menu.scheduler)
+        self.menu = menu
+        self.mode = ENDURANCE
 
-        # Draw graph
-        self.draw_plot(scores)
-
-        lastMode = self.statsMode
-        # menu loop
-        while True:
-            print(self.statsMode)
-            if exitStatus:
-                break
-
-            if lastMode is not self.statsMode:
-                # Redraw
-                # draw background
-                self.draw_background()
-
-                # draw menu ui
-                # Draw buttons
-                for button in buttons:
-                    button.draw()
-                self.draw_plot(self.read_stats(self.statsMode, False))
-                print("hej")
-                lastMode = self.statsMode
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    break
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1: # left click
-                        mousePos = event.pos
-                        button_clicked = self.button_clicked(buttons, mousePos)
-                        if button_clicked != -1:
-                            exitStatus = button_clicked.action()
-            
-            # Render
-            pygame.display.flip()
+        self.buttons = ui.WidgetTree(menu.backend, self.layout)
+        self.buttons.add(ui.Button(menu.backend, 0, 0, 0, 0, "Cancel", (255, 255, 255), (217, 110, 106), self.cancel_clicked))
 
+    def layout(self, size):
+        buttonsWidth = GAME_WIDTH / 2
+        return ui.column(len(self.buttons), GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, GAME_START_POS_Y + GAME_HEIGHT - 200, buttonsWidth, 70, 20)
 
-    def main_menu(self):
+    def enter(self, mode):
+        self.mode = mode
+        self.menu.race.join(mode, self.menu.game.size)
+
+    def cancel_clicked(self):
+        self.menu.race.leave()
+        self.scheduler.pop()
 
-        buttons = []
+    def handle_event(self, event):
+        if event.type == RACE_UPDATED:
+            self.scheduler.invalidate()
+        else:
+            self.menu.handle_buttons(event, self.buttons)
+
+    def update(self):
+        if self.menu.race.match is not None:
+            self.scheduler.switch(self.menu.gameScene, self.mode)
+
+    def draw(self):
+        menu = self.menu
+        menu.draw_background()
+        text = ui.textCache.render("Waiting for an opponent", INFO_TEXT_COLOR, 65)
+        menu.backend.blit(text, (GAME_START_POS_X + GAME_WIDTH / 2 - text.get_width() / 2, GAME_START_POS_Y + 250))
+        self.buttons.draw()
+
+class StatsScene(scheduler.Scene):
+
+    name = "stats"
+
+    def __init__(self, menu) -> None:
+        super().__init__(menu.scheduler)
+        self.menu = menu
 
         # buttons
-        buttonsStartY = GAME_START_POS_Y + 250
-        buttonsYMargin = 20
-        buttonsWidth = GAME_WIDTH / 2
-        buttonsHeight = 70
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - (GAME_WIDTH / 4), buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Endurance", (255, 255, 255), (217, 201, 111), lambda: self.start_game(ENDURANCE)))
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - (GAME_WIDTH / 4), buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Pattern", (255, 255, 255), (217, 201, 111), lambda: self.start_game(PATTERN)))
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - (GAME_WIDTH / 4), buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Frenzy", (255, 255, 255), (217, 201, 111), lambda: self.start_game(FRENZY)))
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - (GAME_WIDTH / 4), buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Stats", (255, 255, 255), (217, 201, 111), self.stat_page))
-        buttons.append(ui.Button(self.screen, GAME_START_POS_X + GAME_WIDTH / 2 - (GAME_WIDTH / 4), buttonsStartY + (buttonsHeight + buttonsYMargin) * len(buttons), buttonsWidth, buttonsHeight, "Quit", (255, 255, 255), (217, 110, 106), self.quit_clicked))
-
-        titleBounceIteration = 0
-
-        # menu loop
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    break
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1: # left click
-                        mousePos = event.pos
-                        button_clicked = self.button_clicked(buttons, mousePos)
-                        if button_clicked != -1:
-                            button_clicked.action()
-
-            # draw background
-            self.draw_background()
-
-            # draw menu ui
-            titleText = self.headerText.render("Don't Tap", False, (255, 255, 255))
-            
-            titleYBounce = math.sin(titleBounceIteration)
-            titleYBounceScale = 25
-            self.screen.blit(titleText, (GAME_START_POS_X + GAME_WIDTH / 2 - titleText.get_width() / 2, GAME_START_POS_Y + 50 + titleYBounce * titleYBounceScale))
-
-            # Draw buttons
-            for button in buttons:
-                button.draw()
-
-            # Render
-            pygame.display.flip()
-
-            titleBounceIteration += 0.01
-            titleBounceIteration = titleBounceIteration % 90
+        self.buttons = ui.WidgetTree(menu.backend, self.layout)
+        buttons = [(mode.name, (217, 201, 111), lambda mode=mode.id: menu.change_stats_display_gamemode(mode)) for mode in modes.all_modes()]
+        for text, color, action in buttons + [("Back to menu", (217, 110, 106), menu.back_to_menu_clicked)]:
+            self.buttons.add(ui.Button(menu.backend, 0, 0, 0, 0, text, (255, 255, 255), color, action))
 
+    def layout(self, size):
+        buttonsWidth = GAME_WIDTH / 3
+        return ui.column(len(self.buttons), GAME_START_POS_X + GAME_WIDTH / 2 - buttonsWidth / 2, GAME_START_POS_Y + GAME_HEIGHT / 2 + 200, buttonsWidth, 50, 20)
+
+    def handle_event(self, event):
+        self.menu.handle_buttons(event, self.buttons)
+
+    def draw(self):
+        self.menu.draw_background()
+
+        # Draw buttons
+        self.buttons.draw()
+
+        # Draw graph
+        self.menu.draw_plot(self.menu.statsMode)
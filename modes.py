@@ -0,0 +1,194 @@
+import glob
+import importlib.util
+import os
+
+from settings import *
+
+# Game modes. A mode object holds everything that differs between modes:
+# how tiles respawn, how a click scores, which way the timer runs, when the
+# game ends and what the HUD shows. GameCore looks its mode up once per
+# reset() and keeps the mode's handlers as attributes, so clicks and ticks
+# call straight into them without checking which mode is being played.
+#
+# Modes are registered under the id stored in stats, replays and the
+# leaderboard. More modes can be added by dropping a module that calls
+# register() into PLUGIN_DIR.
+
+# What a click on a white tile returns instead of the score gained
+MISS = -1 # the miss ended the game
+PENALTY = -2 # the miss cost something but the game goes on
+
+COMBO_THRESHOLD = 500
+COMBO_GAIN = 45
+COMBO_LOSS_PER_FRAME = 2.5 # per advance(), which Game runs at TICK_RATE
+
+class GameMode:
+
+    id = -1
+    name = ""
+    startTimer = 0
+    startTiles = BLACK_TILES # black tiles init_tiles spawns
+    timerUp = False # the timer counts the time taken instead of down to 0
+    lowerIsBetter = False # scores rank lowest first
+    showScore = True
+    showCombo = True
+
+    # A click on a white tile, returns MISS when it ends the game or
+    # PENALTY when it doesn't
+    def miss(self, core, tileIdx):
+        core.running = False
+        return MISS
+
+    # Spawn after tileIdx was turned white, a new black tile elsewhere
+    # unless the whole board is a bonus being cleared
+    def respawn(self, core, tileIdx):
+        if not core.bonusActive:
+            core.make_random_tile_black(tileIdx)
+        elif core.blackTiles == 0:
+            core.bonusActive = False
+            core.init_tiles()
+
+    # Score gained by a click on a black tile, after respawn
+    def score_click(self, core):
+        core.score += 1
+        core.combo += COMBO_GAIN
+        return 1
+
+    # The once-per-tick rules, returns whether the game is still running
+    def advance(self, core, dt):
+        if core.combo > 0:
+            core.combo -= COMBO_LOSS_PER_FRAME
+        core.timer -= dt
+        if core.timer <= 0:
+            core.running = False
+        return core.running
+
+    def final_score(self, core):
+        return core.score
+
+    def save_score(self, core):
+        return True
+
+    # Level of the tap sound for a click that scored scoreGain
+    def tap_level(self, scoreGain):
+        return 0
+
+    def format_score(self, score):
+        return str(int(score))
+
+class Endurance(GameMode):
+
+    id = ENDURANCE
+    name = "Endurance"
+    startTimer = ENDURANCE_START_TIMER
+
+    def score_click(self, core):
+        core.score += 1
+        core.combo += COMBO_GAIN
+        if core.score % ENDURANCE_TIME_GAIN_THRESHOLD == 0:
+            core.endurance_add_time()
+        return 1
+
+    def advance(self, core, dt):
+        # if combo exceeds threshold spawn bonus
+        if core.combo >= COMBO_THRESHOLD:
+            core.endurance_spawn_bonus()
+        if core.combo > 0:
+            core.combo -= COMBO_LOSS_PER_FRAME
+        core.timer -= dt
+        if core.timer <= 0:
+            core.running = False
+        return core.running
+
+class Pattern(GameMode):
+
+    id = PATTERN
+    name = "Pattern"
+    startTimer = PATTERN_START_TIMER
+    startTiles = PATTERN_SIZE
+    timerUp = True
+    lowerIsBetter = True
+    showScore = False
+    showCombo = False
+
+    # spawn a new pattern once the last one is cleared
+    def respawn(self, core, tileIdx):
+        if core.blackTiles == 0:
+            core.init_tiles()
+            core.patternsCleared += 1
+
+    def score_click(self, core):
+        return 0
+
+    def advance(self, core, dt):
+        core.timer += dt
+        if core.patternsCleared >= PATTERN_AMOUNT:
+            core.running = False
+        return core.running
+
+    def final_score(self, core):
+        return core.timer
+
+    # If we didn't complete all patterns, then dont save result
+    def save_score(self, core):
+        return core.patternsCleared >= PATTERN_AMOUNT
+
+    def format_score(self, score):
+        return "{:.2f}".format(score)
+
+class Frenzy(GameMode):
+
+    id = FRENZY
+    name = "Frenzy"
+    startTimer = FRENZY_START_TIMER
+
+    # the score multiplier grows with the combo
+    def score_click(self, core):
+        scoreGain = int((core.combo * FRENZY_SCORE_STEPS) / COMBO_THRESHOLD) + 1
+        core.score += scoreGain
+        core.combo += COMBO_GAIN
+        return scoreGain
+
+    def advance(self, core, dt):
+        if core.combo > 0:
+            core.combo -= COMBO_LOSS_PER_FRAME
+        core.timer -= dt
+        # clamp combo value to max value
+        if core.combo > COMBO_THRESHOLD:
+            core.combo = COMBO_THRESHOLD
+        if core.timer <= 0:
+            core.running = False
+        return core.running
+
+    def tap_level(self, scoreGain):
+        return scoreGain - 1
+
+registry = {} # id -> mode, in the order they were registered
+
+def register(mode):
+    if not 0 <= mode.id < 256:
+        raise ValueError("mode ids have to fit in a byte")
+    if mode.id in registry and type(registry[mode.id]) is not type(mode):
+        raise ValueError("mode id {} is already used by {}".format(mode.id, registry[mode.id].name))
+    registry[mode.id] = mode
+    return mode
+
+def get(modeId):
+    mode = registry.get(modeId)
+    if mode is None:
+        raise ValueError("unknown game mode {}".format(modeId))
+    return mode
+
+def all_modes():
+    return list(registry.values())
+
+for mode in (Endurance(), Pattern(), Frenzy()):
+    register(mode)
+
+# Import every module in directory, each registers its own modes
+def load_plugins(directory=PLUGIN_DIR):
+    for path in sorted(glob.glob(os.path.join(directory, '*.py'))):
+        name = "plugin_" + os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
@@ -0,0 +1,225 @@
+import numpy as np
+import pygame
+
+import modes
+import ui
+from settings import *
+
+# Score history of one mode kept in memory for the plot. Scores are added
+# one at a time as games end, along with their running sums, and reduced to
+# at most width buckets holding the min and max of their entries (with the
+# game numbers they came from), so drawing never goes back to the database
+# or over every score. A bucket covers a power of two entries, when there
+# are more than width of them neighbours are merged pairwise.
+class PlotHistory:
+
+    def __init__(self, scores, width) -> None:
+        self.width = width
+        self.count = len(scores)
+        capacity = max(self.count * 2, 1024)
+        self.scores = np.zeros(capacity)
+        self.scores[:self.count] = scores
+        self.sums = np.zeros(capacity + 1) # sums[i] is the sum of the first i scores
+        np.cumsum(self.scores[:self.count], out=self.sums[1:self.count + 1])
+
+        self.bucketSize = 1
+        while (self.count + self.bucketSize - 1) // self.bucketSize > width:
+            self.bucketSize *= 2
+        self.mins = []
+        self.minIdx = []
+        self.maxs = []
+        self.maxIdx = []
+        if self.count:
+            values = self.scores[:self.count]
+            edges = np.arange(0, self.count, self.bucketSize)
+            self.mins = np.minimum.reduceat(values, edges).tolist()
+            self.maxs = np.maximum.reduceat(values, edges).tolist()
+            full = self.count // self.bucketSize * self.bucketSize
+            blocks = values[:full].reshape(-1, self.bucketSize)
+            self.minIdx = (np.argmin(blocks, axis=1) + edges[:len(blocks)]).tolist()
+            self.maxIdx = (np.argmax(blocks, axis=1) + edges[:len(blocks)]).tolist()
+            if full < self.count:
+                rest = values[full:]
+                self.minIdx.append(full + int(np.argmin(rest)))
+                self.maxIdx.append(full + int(np.argmax(rest)))
+
+    def add(self, score):
+        index = self.count
+        if index == len(self.scores):
+            self.scores = np.concatenate((self.scores, np.zeros(len(self.scores))))
+            self.sums = np.concatenate((self.sums, np.zeros(len(self.scores) - len(self.sums) + 1)))
+        self.scores[index] = score
+        self.sums[index + 1] = self.sums[index] + score
+        self.count += 1
+
+        if index % self.bucketSize == 0:
+            self.mins.append(score)
+            self.minIdx.append(index)
+            self.maxs.append(score)
+            self.maxIdx.append(index)
+            if len(self.mins) > self.width:
+                self.merge()
+        else:
+            if score < self.mins[-1]:
+                self.mins[-1] = score
+                self.minIdx[-1] = index
+            if score > self.maxs[-1]:
+                self.maxs[-1] = score
+                self.maxIdx[-1] = index
+
+    # Halve the number of buckets by merging neighbours
+    def merge(self):
+        mins, minIdx, maxs, maxIdx = [], [], [], []
+        for i in range(0, len(self.mins), 2):
+            j = min(i + 1, len(self.mins) - 1)
+            low = i if self.mins[i] <= self.mins[j] else j
+            high = i if self.maxs[i] >= self.maxs[j] else j
+            mins.append(self.mins[low])
+            minIdx.append(self.minIdx[low])
+            maxs.append(self.maxs[high])
+            maxIdx.append(self.maxIdx[high])
+        self.mins, self.minIdx, self.maxs, self.maxIdx = mins, minIdx, maxs, maxIdx
+        self.bucketSize *= 2
+
+    def values(self):
+        return self.scores[:self.count]
+
+    def min(self):
+        return min(self.mins)
+
+    def max(self):
+        return max(self.maxs)
+
+    # Game numbers and scores to draw: every score when there are few
+    # enough, else each bucket's min and max in the order they were played
+    def points(self):
+        if self.count <= self.width * 2:
+            return np.arange(self.count), self.values()
+        xs = []
+        ys = []
+        for low, lowIdx, high, highIdx in zip(self.mins, self.minIdx, self.maxs, self.maxIdx):
+            if lowIdx <= highIdx:
+                xs += (lowIdx, highIdx)
+                ys += (low, high)
+            else:
+                xs += (highIdx, lowIdx)
+                ys += (high, low)
+        return np.array(xs), np.array(ys)
+
+    # Average of the window scores ending at each game number in ends
+    def rolling_average(self, ends, window):
+        return (self.sums[ends + 1] - self.sums[ends + 1 - window]) / window
+
+# Stats graph for one mode, rendered once into a surface and reused until
+# the number of stored scores for that mode changes
+class StatsPlot:
+
+    WIDTH = 500
+    HEIGHT = 250
+    LABEL_WIDTH = 150
+    LABEL_SIZE = 25
+    TITLE_SIZE = 65
+    HORIZONTAL_SEGMENTS = 8
+    ROLLING_WINDOW = 50
+    PERCENTILES = (50, 90)
+
+    AXIS_COLOR = (255, 0, 0)
+    LINE_COLOR = (255, 255, 0)
+    AVERAGE_COLOR = (0, 200, 255)
+    PERCENTILE_COLOR = (110, 110, 110)
+
+    def __init__(self, scoreStore, rollingAverage=True, percentiles=True) -> None:
+        self.scoreStore = scoreStore
+        self.rollingAverage = rollingAverage
+        self.percentiles = percentiles
+        self.cache = {} # mode -> (entries, surface)
+        self.histories = {} # mode -> PlotHistory, loaded on the first draw
+        scoreStore.listeners.append(self.score_added)
+
+        self.titleHeight = ui.textCache.get_font(self.TITLE_SIZE).get_height()
+        self.labelHeight = ui.textCache.get_font(self.LABEL_SIZE).get_height()
+
+        # origin of the axes inside the plot surface
+        self.x0 = self.LABEL_WIDTH
+        self.y0 = self.titleHeight + TEXT_MARGIN + self.HEIGHT
+        self.size = (self.LABEL_WIDTH * 2 + self.WIDTH, self.y0 + TEXT_MARGIN + self.labelHeight)
+
+    def score_added(self, mode, score):
+        history = self.histories.get(mode)
+        if history is not None:
+            history.add(score)
+
+    # Forget the loaded histories and plots, the next draw reads the database again
+    def clear(self):
+        self.histories.clear()
+        self.cache.clear()
+
+    def get_surface(self, mode):
+        history = self.histories.get(mode)
+        if history is None:
+            history = PlotHistory(np.asarray(self.scoreStore.history(mode), dtype=np.float64), self.WIDTH)
+            self.histories[mode] = history
+        cached = self.cache.get(mode)
+        if cached is not None and cached[0] == history.count:
+            return cached[1]
+
+        surface = self.render(mode, history)
+        self.cache[mode] = (history.count, surface)
+        return surface
+
+    # Blit the plot so its axes origin lands on (x0, y0), screen can be a
+    # surface or a rendering backend
+    def draw(self, screen, mode, x0, y0):
+        return screen.blit(self.get_surface(mode), (x0 - self.x0, y0 - self.y0))
+
+    def render(self, mode, history):
+        surface = pygame.Surface(self.size, pygame.SRCALPHA)
+        x0, y0 = self.x0, self.y0
+        entries = history.count
+
+        # draw axises
+        text = ui.textCache.render(modes.get(mode).name + " stats", INFO_TEXT_COLOR, self.TITLE_SIZE)
+        surface.blit(text, (x0 + self.WIDTH / 2 - text.get_width() / 2, 0))
+        pygame.draw.line(surface, self.AXIS_COLOR, (x0, y0), (x0, y0 - self.HEIGHT), 2)  # Vertical axis
+        pygame.draw.line(surface, self.AXIS_COLOR, (x0, y0), (x0 + self.WIDTH, y0), 2)  # Horizontal axis
+
+        # if enough scores saved then display stats
+        if entries <= 2:
+            return surface
+
+        dataMin = history.min()
+        dataMax = history.max()
+        scalar = self.HEIGHT / (dataMax - dataMin) if dataMax > dataMin else 0
+
+        def to_points(xs, ys):
+            return np.column_stack((x0 + xs, y0 - (ys - dataMin) * scalar)).tolist()
+
+        for value in (dataMax, dataMin):
+            label = ui.textCache.render(self.format_score(mode, value), INFO_TEXT_COLOR, self.LABEL_SIZE)
+            labelY = y0 - self.HEIGHT if value == dataMax else y0 - label.get_height()
+            surface.blit(label, (x0 - label.get_width() - TEXT_MARGIN, labelY))
+
+        # game numbers along the horizontal axis
+        segments = self.HORIZONTAL_SEGMENTS
+        for i in range(segments):
+            label = ui.textCache.render(str(1 + round(i * (entries - 1) / (segments - 1))), INFO_TEXT_COLOR, self.LABEL_SIZE)
+            surface.blit(label, (x0 + i * (self.WIDTH / (segments - 1)) - label.get_width() / 2, y0 + TEXT_MARGIN))
+
+        if self.percentiles:
+            for value in np.percentile(history.values(), self.PERCENTILES):
+                y = y0 - (value - dataMin) * scalar
+                pygame.draw.line(surface, self.PERCENTILE_COLOR, (x0, y), (x0 + self.WIDTH, y), 1)
+
+        xScale = (self.WIDTH - 1) / (entries - 1)
+        games, ys = history.points()
+        pygame.draw.lines(surface, self.LINE_COLOR, False, to_points(games * xScale, ys), 2)
+
+        window = min(self.ROLLING_WINDOW, entries)
+        if self.rollingAverage and entries > window:
+            ends = np.linspace(window - 1, entries - 1, min(self.WIDTH, entries - window + 1)).astype(np.int64)
+            pygame.draw.lines(surface, self.AVERAGE_COLOR, False, to_points(ends * xScale, history.rolling_average(ends, window)), 2)
+
+        return surface
+
+    def format_score(self, mode, value):
+        return modes.get(mode).format_score(value)
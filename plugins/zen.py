@@ -0,0 +1,43 @@
+import modes
+from settings import *
+
+# Zen: tap ZEN_TILES black tiles as fast as possible. Tapping a white tile
+# doesn't end the game, it costs ZEN_MISS_PENALTY seconds instead.
+
+ZEN_TILES = 50
+ZEN_MISS_PENALTY = 1
+
+class Zen(modes.GameMode):
+
+    id = 3
+    name = "Zen"
+    startTimer = 0
+    timerUp = True
+    lowerIsBetter = True
+    showCombo = False
+
+    def miss(self, core, tileIdx):
+        core.timer += ZEN_MISS_PENALTY
+        return modes.PENALTY
+
+    def score_click(self, core):
+        core.score += 1
+        return 1
+
+    def advance(self, core, dt):
+        core.timer += dt
+        if core.score >= ZEN_TILES:
+            core.running = False
+        return core.running
+
+    def final_score(self, core):
+        return core.timer
+
+    # A game left before every tile was tapped has no time to save
+    def save_score(self, core):
+        return core.score >= ZEN_TILES
+
+    def format_score(self, score):
+        return "{:.2f}".format(score)
+
+modes.register(Zen())
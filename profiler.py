@@ -0,0 +1,125 @@
+import csv
+import time
+from array import array
+
+import pygame
+
+import latency
+import ui
+from settings import *
+
+# Per-phase frame timings kept in a fixed-size ring buffer. Game only calls
+# into this when profiling is enabled, so a disabled profiler costs one
+# "is not None" check per phase.
+class FrameProfiler:
+
+    PHASES = ('events', 'logic', 'background', 'tiles', 'combo', 'effects', 'hud', 'present', 'sleep')
+    EVENTS, LOGIC, BACKGROUND, TILES, COMBO, EFFECTS, HUD, PRESENT, SLEEP = range(len(PHASES))
+
+    OVERLAY_TEXT_SIZE = 20
+    OVERLAY_TEXT_COLOR = (0, 255, 0)
+    OVERLAY_BACKGROUND_COLOR = (0, 0, 0)
+    OVERLAY_UPDATE_FRAMES = 30
+    DROPPED_FRAME_FACTOR = 1.5 # frames longer than this many frame budgets count as dropped
+
+    def __init__(self, capacity=PROFILER_FRAMES, frameBudget=1 / (REFRESH_RATE or TICK_RATE)) -> None:
+        self.capacity = capacity
+        self.frameBudgetNs = int(frameBudget * 1e9)
+        self.samples = array('q', bytes(8 * capacity * len(self.PHASES)))
+        self.frameTimes = array('q', bytes(8 * capacity))
+        self.current = [0] * len(self.PHASES)
+        self.showOverlay = False
+        self.overlaySurface = None
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.droppedFrames = 0
+        self.frameStart = time.perf_counter_ns()
+        for i in range(len(self.current)):
+            self.current[i] = 0
+
+    # Add the time since start to phase and return now, so calls can be chained
+    def lap(self, phase, start):
+        now = time.perf_counter_ns()
+        self.current[phase] += now - start
+        return now
+
+    def end_frame(self):
+        now = time.perf_counter_ns()
+        frameTime = now - self.frameStart
+        self.frameStart = now
+
+        row = self.frames % self.capacity
+        self.frameTimes[row] = frameTime
+        offset = row * len(self.PHASES)
+        current = self.current
+        for i in range(len(current)):
+            self.samples[offset + i] = current[i]
+            current[i] = 0
+
+        if frameTime > self.frameBudgetNs * self.DROPPED_FRAME_FACTOR:
+            self.droppedFrames += 1
+        self.frames += 1
+
+        if self.showOverlay and self.frames % self.OVERLAY_UPDATE_FRAMES == 0:
+            self.overlaySurface = None
+
+    def toggle_overlay(self):
+        self.showOverlay = not self.showOverlay
+        self.overlaySurface = None
+
+    # Rows stored in the ring buffer, oldest first
+    def rows(self):
+        stored = min(self.frames, self.capacity)
+        first = self.frames - stored
+        for frame in range(first, self.frames):
+            row = frame % self.capacity
+            offset = row * len(self.PHASES)
+            yield frame, self.frameTimes[row], self.samples[offset:offset + len(self.PHASES)]
+
+    # Frame time percentiles in ms over the frames in the ring buffer
+    def frame_percentiles(self, percentiles=(50, 95, 99, 100)):
+        stored = min(self.frames, self.capacity)
+        frameTimes = sorted(self.frameTimes[:stored])
+        return {p: latency.percentile(frameTimes, p) / 1e6 for p in percentiles}
+
+    def phase_means(self):
+        stored = min(self.frames, self.capacity)
+        means = [0.0] * len(self.PHASES)
+        if stored == 0:
+            return means
+        for row in range(stored):
+            offset = row * len(self.PHASES)
+            for i in range(len(self.PHASES)):
+                means[i] += self.samples[offset + i]
+        return [total / stored / 1e6 for total in means]
+
+    def build_overlay(self):
+        font = ui.textCache.get_font(self.OVERLAY_TEXT_SIZE)
+        frame = self.frame_percentiles()
+        lines = ["frame ms  p50 {:.2f}  p95 {:.2f}  p99 {:.2f}  max {:.2f}".format(frame[50], frame[95], frame[99], frame[100]),
+                 "dropped {} / {}".format(self.droppedFrames, self.frames)]
+        for name, mean in zip(self.PHASES, self.phase_means()):
+            lines.append("{:<11}{:7.3f} ms".format(name, mean))
+
+        rendered = [font.render(line, False, self.OVERLAY_TEXT_COLOR) for line in lines]
+        width = max(text.get_width() for text in rendered) + TEXT_MARGIN
+        lineHeight = font.get_height()
+        surface = pygame.Surface((width, lineHeight * len(rendered) + TEXT_MARGIN))
+        surface.fill(self.OVERLAY_BACKGROUND_COLOR)
+        for i, text in enumerate(rendered):
+            surface.blit(text, (TEXT_MARGIN / 2, TEXT_MARGIN / 2 + i * lineHeight))
+        return surface
+
+    def draw_overlay(self, screen):
+        if self.overlaySurface is None:
+            self.overlaySurface = self.build_overlay()
+        return screen.blit(self.overlaySurface, (0, 0))
+
+    def dump_csv(self, path):
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(('frame', 'frame_ns') + tuple(phase + '_ns' for phase in self.PHASES))
+            for frame, frameTime, phases in self.rows():
+                writer.writerow((frame, frameTime) + tuple(phases))
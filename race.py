@@ -0,0 +1,877 @@
+import argparse
+import asyncio
+import collections
+import os
+import queue
+import random
+import struct
+import sys
+import threading
+import time
+
+import core
+import modes
+from settings import *
+
+# Head-to-head race over UDP. Two players who join with the same mode and
+# board size are matched and play on mirrored boards, started from the same
+# seed so they see the same spawn sequence. The server is authoritative: it
+# runs a GameCore per player and feeds it the player's clicks at the tick
+# they happened, scores come from there and never from the clients.
+#
+# Clients only send clicks. An input packet carries the number of ticks the
+# player's game has run and every click the server hasn't confirmed yet, so
+# a lost packet is covered by the next one instead of being resent. The
+# local Game applies clicks straight away (prediction) and the confirmed
+# states coming back are checked against what it predicted for that tick.
+# A wrong prediction is rolled back to the confirmed tick, spawn sequence
+# included, and the ticks and clicks since are replayed on top of it.
+#
+# The server sends each player a snapshot of both boards RACE_SYNC_RATE
+# times a second, as a delta from the last snapshot that player
+# acknowledged: the tiles that flipped and the changes in score, combo
+# (hundredths) and timer (ms), all as varints. With nothing acknowledged
+# yet the delta is from an empty board.
+#
+#   JOIN     type, join id (u32), mode, size
+#   START    type, join id (u32), match id (u32), seed (u64), mode, size, player
+#   INPUT    type, match, ack, tick, click count, clicks newest first as (tick gap, tile)
+#   SNAPSHOT type, match, seq, seq - base seq (0 = from empty), result, own delta, opponent delta
+#   LEAVE    type, match
+#
+#   py ./race.py serve [--host 127.0.0.1] [--port 7879]
+#   py ./race.py sim [--latency 0.05] [--jitter 0.02] [--loss 0.1] [--mode 2] [--rate 10]
+
+JOIN, START, INPUT, SNAPSHOT, LEAVE = range(1, 6)
+JOIN_FORMAT = struct.Struct('<BIBB')
+START_FORMAT = struct.Struct('<BIIQBBB')
+
+NO_RESULT, WON, LOST, DRAW = range(4)
+
+UDP_OVERHEAD = 28 # IPv4 and UDP header bytes per packet
+SNAPSHOT_HISTORY = 64 # snapshots kept as delta bases
+
+# State of a board as sent over the network:
+# (tick, board, score, combo in hundredths, timer in ms, patterns cleared, running)
+EMPTY_STATE = (0, 0, 0, 0, 0, 0, True)
+
+def board_state(game, tick):
+    return (tick, game.board, game.score, round(game.combo * 100), round(game.timer * 1000), game.patternsCleared, game.running)
+
+def put_uint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+def put_int(out, value):
+    put_uint(out, value << 1 if value >= 0 else (~value << 1) | 1)
+
+def get_uint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+        if shift > 70:
+            raise ValueError("varint too long")
+
+def get_int(data, pos):
+    value, pos = get_uint(data, pos)
+    return (value >> 1) ^ -(value & 1), pos
+
+# Bit i of the mask is set when field i of the state changed. The board is
+# sent as the flipped tiles (gaps between ascending indices), or as raw xor
+# bytes when that is shorter, the running flag only as its mask bit
+def encode_delta(out, base, state):
+    mask = 0
+    for i in range(7):
+        if state[i] != base[i]:
+            mask |= 1 << i
+    out.append(mask)
+    if mask & 1:
+        put_int(out, state[0] - base[0])
+    if mask & 2:
+        flips = base[1] ^ state[1]
+        length = (flips.bit_length() + 7) // 8
+        count = bin(flips).count('1')
+        if count < length:
+            put_uint(out, count * 2)
+            previous = -1
+            while flips:
+                low = flips & -flips
+                tile = low.bit_length() - 1
+                put_uint(out, tile - previous - 1)
+                previous = tile
+                flips ^= low
+        else:
+            put_uint(out, length * 2 + 1)
+            out += flips.to_bytes(length, 'little')
+    for i in (2, 3, 4, 5):
+        if mask & (1 << i):
+            put_int(out, state[i] - base[i])
+
+def decode_delta(data, pos, base):
+    mask = data[pos]
+    pos += 1
+    state = list(base)
+    if mask & 1:
+        change, pos = get_int(data, pos)
+        state[0] += change
+    if mask & 2:
+        header, pos = get_uint(data, pos)
+        if header & 1:
+            length = header >> 1
+            if pos + length > len(data):
+                raise ValueError("truncated board")
+            state[1] ^= int.from_bytes(data[pos:pos + length], 'little')
+            pos += length
+        else:
+            tile = -1
+            for i in range(header >> 1):
+                gap, pos = get_uint(data, pos)
+                tile += gap + 1
+                state[1] ^= 1 << tile
+    for i in (2, 3, 4, 5):
+        if mask & (1 << i):
+            change, pos = get_int(data, pos)
+            state[i] += change
+    if mask & 64:
+        state[6] = not state[6]
+    return tuple(state), pos
+
+# Simulated network for testing on localhost: every packet sent through it is
+# dropped with probability loss or delivered after latency plus up to jitter
+# seconds, so packets can also arrive out of order
+class Conditions:
+
+    def __init__(self, latency=0, jitter=0, loss=0, seed=None) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rnd = random.Random(seed)
+        self.dropped = 0
+
+    def send(self, transport, data, addr=None):
+        if self.loss and self.rnd.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = self.latency + self.rnd.random() * self.jitter
+        if delay <= 0:
+            transport.sendto(data, addr)
+        else:
+            asyncio.get_running_loop().call_later(delay, self.deliver, transport, data, addr)
+
+    def deliver(self, transport, data, addr):
+        if not transport.is_closing():
+            transport.sendto(data, addr)
+
+class Endpoint(asyncio.DatagramProtocol):
+
+    def __init__(self, handler) -> None:
+        self.handler = handler
+
+    def datagram_received(self, data, addr):
+        self.handler(data, addr)
+
+    def error_received(self, error):
+        pass # ICMP errors from a peer that went away, the timeouts deal with it
+
+class RacePlayer:
+
+    def __init__(self, addr, joinId, index, mode, seed, size) -> None:
+        self.addr = addr
+        self.joinId = joinId
+        self.index = index
+        self.core = core.GameCore(mode, seed, size)
+        self.tick = 0 # ticks run, every click before this tick is applied
+        self.started = False # an input for the match arrived, so START got through
+        self.left = False # gets no more snapshots
+        self.forfeited = False # quit or fell too far behind while playing
+        self.seq = 0
+        self.acked = 0 # newest snapshot the client has
+        self.snapshots = {} # seq -> (own, opponent) states sent
+        self.resultSeq = 0 # first snapshot that carried the result
+
+    def state(self):
+        return board_state(self.core, self.tick)
+
+    # Run the game up to tick, applying the clicks made before it. clicks
+    # are (tick, tile) in order and may repeat clicks already applied
+    def apply(self, tick, clicks):
+        game = self.core
+        for clickTick, tileIdx in clicks:
+            if clickTick < self.tick:
+                continue
+            if clickTick >= tick:
+                break
+            while self.tick < clickTick and game.running:
+                game.advance(core.TICK_TIME)
+                self.tick += 1
+            game.click(tileIdx)
+        while self.tick < tick and game.running:
+            game.advance(core.TICK_TIME)
+            self.tick += 1
+        # a game that ended during a tick is reported at the tick after it,
+        # like the client does, however far ahead the client had run by then
+        if not game.running:
+            self.tick += 1
+
+    def forfeit(self):
+        self.core.running = False
+        self.left = True
+        self.forfeited = True
+
+class RaceMatch:
+
+    def __init__(self, matchId, mode, size, seed, entrants) -> None:
+        self.id = matchId
+        self.mode = mode
+        self.size = size
+        self.seed = seed
+        self.players = [RacePlayer(addr, joinId, index, mode, seed, size) for index, (addr, joinId) in enumerate(entrants)]
+        self.startTime = time.perf_counter()
+        self.results = None # result of each player once both are done
+        self.decidedTime = None
+
+    def start_packet(self, player):
+        return START_FORMAT.pack(START, player.joinId, self.id, self.seed, self.mode, self.size, player.index)
+
+    # Set the results once neither game is running
+    def decide(self):
+        first, second = self.players
+        if self.results is not None or first.core.running or second.core.running:
+            return
+        if first.forfeited or second.forfeited:
+            better = second.forfeited - first.forfeited
+        else:
+            rules = modes.get(self.mode)
+            scores = []
+            for player in self.players:
+                # not finishing (pattern) counts as losing
+                if not rules.save_score(player.core):
+                    scores.append(None)
+                else:
+                    score = rules.final_score(player.core)
+                    scores.append(-score if rules.lowerIsBetter else score)
+            if scores[0] is None or scores[1] is None:
+                better = (scores[1] is None) - (scores[0] is None)
+            else:
+                better = (scores[0] > scores[1]) - (scores[0] < scores[1])
+        self.results = [WON, LOST] if better > 0 else [LOST, WON] if better < 0 else [DRAW, DRAW]
+        self.decidedTime = time.perf_counter()
+
+# Authoritative match server. Matches players, runs their games from the
+# clicks they send and sends both boards back every 1 / RACE_SYNC_RATE
+class RaceServer:
+
+    def __init__(self, conditions=None) -> None:
+        self.conditions = conditions
+        self.transport = None
+        self.port = None
+        self.waiting = {} # (mode, size) -> (addr, join id) of a player without an opponent
+        self.players = {} # addr -> (match, player)
+        self.matches = {}
+        self.nextMatchId = 1
+        self.bytesSent = 0
+        self.bytesReceived = 0
+
+    def send(self, data, addr):
+        self.bytesSent += len(data)
+        if self.conditions is not None:
+            self.conditions.send(self.transport, data, addr)
+        else:
+            self.transport.sendto(data, addr)
+
+    def datagram_received(self, data, addr):
+        self.bytesReceived += len(data)
+        try:
+            if data[0] == INPUT:
+                self.handle_input(data, addr)
+            elif data[0] == JOIN:
+                packetType, joinId, mode, size = JOIN_FORMAT.unpack(data)
+                self.handle_join(addr, joinId, mode, size)
+            elif data[0] == LEAVE:
+                matchId, pos = get_uint(data, 1)
+                self.leave(addr, matchId)
+        except (IndexError, ValueError, struct.error):
+            pass # not one of ours
+
+    def handle_join(self, addr, joinId, mode, size):
+        entry = self.players.get(addr)
+        if entry is not None:
+            match, player = entry
+            if player.joinId == joinId:
+                # the START got lost or this is a late copy of the JOIN
+                self.send(match.start_packet(player), addr)
+                return
+            self.leave(addr, match.id)
+        if mode not in modes.registry or not 2 <= size <= 255:
+            return
+
+        key = (mode, size)
+        waiting = self.waiting.get(key)
+        if waiting is None or waiting[0] == addr:
+            self.waiting[key] = (addr, joinId)
+            return
+        del self.waiting[key]
+
+        match = RaceMatch(self.nextMatchId, mode, size, int.from_bytes(os.urandom(8), 'little'), (waiting, (addr, joinId)))
+        self.nextMatchId = self.nextMatchId % 0xffffffff + 1
+        self.matches[match.id] = match
+        for player in match.players:
+            self.players[player.addr] = (match, player)
+            self.send(match.start_packet(player), player.addr)
+
+    def leave(self, addr, matchId):
+        for key, (waitingAddr, joinId) in list(self.waiting.items()):
+            if waitingAddr == addr:
+                del self.waiting[key]
+        entry = self.players.get(addr)
+        if entry is None or entry[0].id != matchId:
+            return
+        match, player = entry
+        del self.players[addr]
+        if player.core.running:
+            player.forfeit()
+        player.left = True
+        match.decide()
+
+    def handle_input(self, data, addr):
+        entry = self.players.get(addr)
+        matchId, pos = get_uint(data, 1)
+        if entry is None or entry[0].id != matchId:
+            return
+        match, player = entry
+        ack, pos = get_uint(data, pos)
+        tick, pos = get_uint(data, pos)
+        count, pos = get_uint(data, pos)
+        clicks = []
+        clickTick = tick
+        for i in range(count):
+            gap, pos = get_uint(data, pos)
+            tileIdx, pos = get_uint(data, pos)
+            clickTick -= gap
+            if tileIdx >= player.core.tileCount or clickTick < 0:
+                return
+            clicks.append((clickTick, tileIdx))
+        clicks.reverse()
+
+        player.started = True
+        if ack in player.snapshots and ack > player.acked:
+            player.acked = ack
+            for seq in [seq for seq in player.snapshots if seq < ack]:
+                del player.snapshots[seq]
+        if tick > player.tick and player.core.running:
+            player.apply(tick, clicks)
+            match.decide()
+
+    def snapshot_packet(self, match, player):
+        player.seq += 1
+        seq = player.seq
+        own = player.state()
+        opponent = match.players[1 - player.index].state()
+        base = player.snapshots.get(player.acked)
+        result = NO_RESULT if match.results is None else match.results[player.index]
+        if result != NO_RESULT and player.resultSeq == 0:
+            player.resultSeq = seq
+
+        out = bytearray((SNAPSHOT,))
+        put_uint(out, match.id)
+        put_uint(out, seq)
+        put_uint(out, seq - player.acked if base is not None else 0)
+        out.append(result)
+        encode_delta(out, base[0] if base is not None else EMPTY_STATE, own)
+        encode_delta(out, base[1] if base is not None else EMPTY_STATE, opponent)
+
+        player.snapshots[seq] = (own, opponent)
+        if len(player.snapshots) > SNAPSHOT_HISTORY:
+            del player.snapshots[min(player.snapshots)]
+        return bytes(out)
+
+    # Forfeit players that fell too far behind, send everyone their
+    # snapshot and drop matches that are over
+    def sync(self):
+        now = time.perf_counter()
+        for match in list(self.matches.values()):
+            if match.results is None:
+                wallTick = (now - match.startTime) * TICK_RATE
+                for player in match.players:
+                    if player.core.running and wallTick - player.tick > RACE_TIMEOUT * TICK_RATE:
+                        player.forfeit()
+                match.decide()
+
+            active = False
+            for player in match.players:
+                if player.left:
+                    continue
+                if not player.started:
+                    self.send(match.start_packet(player), player.addr)
+                    active = True
+                elif player.resultSeq == 0 or player.acked < player.resultSeq:
+                    self.send(self.snapshot_packet(match, player), player.addr)
+                    active = True
+            if not active or (match.decidedTime is not None and now - match.decidedTime > RACE_TIMEOUT):
+                self.close_match(match)
+
+    def close_match(self, match):
+        del self.matches[match.id]
+        for player in match.players:
+            if self.players.get(player.addr, (None,))[0] is match:
+                del self.players[player.addr]
+
+    async def serve(self, host=RACE_HOST, port=RACE_PORT, ready=None):
+        loop = asyncio.get_running_loop()
+        self.transport, protocol = await loop.create_datagram_endpoint(lambda: Endpoint(self.datagram_received), local_addr=(host, port))
+        self.port = self.transport.get_extra_info('sockname')[1]
+        if ready is not None:
+            ready.set()
+        try:
+            while True:
+                await asyncio.sleep(1 / RACE_SYNC_RATE)
+                self.sync()
+        finally:
+            self.transport.close()
+
+# Client used by Game. Runs its own event loop on a daemon thread like the
+# leaderboard client: join() starts looking for an opponent and match is set
+# once one is found. The game thread reports its ticks and clicks and picks
+# up confirmed states with poll(), onUpdate is called from the client thread
+# when the race result arrives.
+class RaceClient:
+
+    JOIN_INTERVAL = 0.5
+    PREDICTION_HISTORY = RACE_TIMEOUT * TICK_RATE * 2
+    KEYFRAME_INTERVAL = TICK_RATE # ticks between saved core states
+
+    def __init__(self, host=RACE_HOST, port=RACE_PORT, conditions=None, onUpdate=None) -> None:
+        self.addr = (host, port)
+        self.conditions = conditions
+        self.onUpdate = onUpdate
+        self.match = None # (match id, seed, mode, size, player) once matched
+        self.joining = None # (join id, mode, size) while looking for an opponent
+        self.lastJoin = 0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.packetsSent = 0
+        self.packetsReceived = 0
+
+        # written by the game thread, read by the client thread under lock
+        self.lock = threading.Lock()
+        self.clicks = collections.deque() # (tick, tile) not confirmed by the server yet
+        self.tick = 0 # ticks the game has run, one more once it is over
+        self.done = False
+
+        # client thread only
+        self.states = {} # seq -> (own, opponent) received, bases for the server's deltas
+        self.acked = 0
+
+        # read by the game thread
+        self.confirmed = queue.SimpleQueue() # (match id, own state) the server ran
+        self.opponent = EMPTY_STATE
+        self.result = NO_RESULT
+
+        # game thread only: [tick, state, clicks at the tick] for every tick
+        # the server hasn't confirmed yet, and (tick, core state) every
+        # KEYFRAME_INTERVAL ticks from the last one before them. A full core
+        # state is too big to keep for every tick on large boards, so a wrong
+        # prediction is rolled back by going to the keyframe before the
+        # confirmed tick, replaying the clicks up to it and then every tick
+        # and click since on top of what the server sent
+        self.history = collections.deque()
+        self.keyframes = collections.deque()
+        self.replayCore = None
+        self.corrections = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="race", daemon=True)
+        self.thread.start()
+        self.transport = asyncio.run_coroutine_threadsafe(self.open(), self.loop).result()
+        self.sender = asyncio.run_coroutine_threadsafe(self.send_loop(), self.loop)
+
+    async def open(self):
+        transport, protocol = await self.loop.create_datagram_endpoint(lambda: Endpoint(self.datagram_received), remote_addr=self.addr)
+        return transport
+
+    def close(self):
+        if not self.thread.is_alive():
+            return
+        self.leave()
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(RACE_TIMEOUT)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(RACE_TIMEOUT)
+
+    async def shutdown(self):
+        self.sender.cancel()
+        self.transport.close()
+
+    def send(self, data):
+        self.bytesSent += len(data)
+        self.packetsSent += 1
+        if self.conditions is not None:
+            self.conditions.send(self.transport, data)
+        else:
+            self.transport.sendto(data)
+
+    # Called from the game thread
+
+    # Look for an opponent, match is None until one is found
+    def join(self, mode, size=SIZE):
+        previous = self.match
+        self.match = None
+        self.joining = (int.from_bytes(os.urandom(4), 'little'), mode, size)
+        self.loop.call_soon_threadsafe(self.start_join, previous)
+
+    def leave(self):
+        previous = self.match
+        self.match = None
+        self.joining = None
+        self.loop.call_soon_threadsafe(self.stop_match, previous)
+
+    # The matched game begins
+    def begin(self, game):
+        self.history.clear()
+        self.history.append([0, board_state(game, 0), []])
+        self.keyframes.clear()
+        self.keyframes.append((0, game.save_state()))
+        self.replayCore = core.GameCore(game.mode, size=game.size)
+        self.corrections = 0
+
+    def record_click(self, tick, tileIdx):
+        with self.lock:
+            self.clicks.append((tick, tileIdx))
+        self.history[-1][2].append(tileIdx)
+
+    # The game ran tick
+    def record_tick(self, game, tick):
+        with self.lock:
+            self.tick = tick
+        self.history.append([tick, board_state(game, tick), []])
+        keyframes = self.keyframes
+        if tick - keyframes[-1][0] >= self.KEYFRAME_INTERVAL:
+            keyframes.append((tick, game.save_state()))
+        if len(self.history) > self.PREDICTION_HISTORY and len(keyframes) > 1:
+            keyframes.popleft()
+            self.trim()
+
+    # Forget the ticks before the first keyframe
+    def trim(self):
+        history = self.history
+        start = self.keyframes[0][0]
+        while history[0][0] < start:
+            history.popleft()
+
+    # The game ended during tick, so every click up to it is final. The
+    # server runs the game to tick + 1 and reports it ended there
+    def finish(self, game, tick):
+        self.history.append([tick + 1, board_state(game, tick + 1), []])
+        with self.lock:
+            self.tick = tick + 1
+            self.done = True
+
+    # Check the confirmed states against the predictions for their tick.
+    # Returns (tick, state) the game should be at now when a prediction was
+    # wrong, or None. Once the game is finished it stays finished.
+    def poll(self):
+        corrected = None
+        match = self.match
+        while True:
+            try:
+                matchId, own = self.confirmed.get_nowait()
+            except queue.Empty:
+                return corrected
+            if match is None or matchId != match[0] or self.done:
+                continue
+            history = self.history
+            if not history or not history[0][0] <= own[0] <= history[-1][0]:
+                continue
+            # ticks are consecutive, so the prediction for own's tick is found by offset
+            if history[own[0] - history[0][0]][1] != own:
+                self.corrections += 1
+                corrected = self.rollback(own)
+            # the server won't go back before own's tick again
+            keyframes = self.keyframes
+            while len(keyframes) > 1 and keyframes[1][0] <= own[0]:
+                keyframes.popleft()
+            self.trim()
+
+    # Go back to the core state at the confirmed tick, take over what the
+    # server has for it and replay every tick and click since. When the game
+    # ends in the replay the ticks after that never happened, the returned
+    # tick is the one it ended during
+    def rollback(self, own):
+        replay = self.replayCore
+        entries = list(self.history)
+        first = entries[0][0]
+        confirmed = own[0] - first
+
+        # the predicted state at the confirmed tick, from the last keyframe before it
+        keyTick, saved = next(keyframe for keyframe in reversed(self.keyframes) if keyframe[0] <= own[0])
+        replay.load_state(saved)
+        for tick, state, clicks in entries[keyTick - first:confirmed]:
+            for tileIdx in clicks:
+                replay.click(tileIdx)
+            replay.advance(core.TICK_TIME)
+
+        tick, board, score, combo, timer, patternsCleared, running = own
+        flips = replay.board ^ board
+        while flips:
+            low = flips & -flips
+            tileIdx = low.bit_length() - 1
+            if board & low:
+                replay.make_tile_black(tileIdx)
+            else:
+                replay.make_tile_white(tileIdx)
+            flips ^= low
+        # combo and timer are rounded on the wire, keep the exact value when it rounds the same
+        if round(replay.combo * 100) != combo:
+            replay.combo = combo / 100
+        if round(replay.timer * 1000) != timer:
+            replay.timer = timer / 1000
+        replay.score = score
+        replay.patternsCleared = patternsCleared
+        replay.running = running
+
+        # the predictions before the confirmed tick stand, everything from it is replayed
+        history = collections.deque(entries[:confirmed])
+        keyframes = collections.deque(keyframe for keyframe in self.keyframes if keyframe[0] < own[0])
+        for i, (tick, state, clicks) in enumerate(entries[confirmed:]):
+            if i > 0:
+                replay.advance(core.TICK_TIME)
+            history.append([tick, board_state(replay, tick), clicks])
+            if i == 0 or tick - keyframes[-1][0] >= self.KEYFRAME_INTERVAL:
+                keyframes.append((tick, replay.save_state()))
+            for tileIdx in clicks:
+                replay.click(tileIdx)
+            if not replay.running:
+                break
+        self.history = history
+        self.keyframes = keyframes
+        return tick, replay.save_state()
+
+    # Client thread
+
+    def start_join(self, previous):
+        self.stop_match(previous)
+        self.lastJoin = 0
+        if self.joining is not None:
+            self.send_join()
+
+    # Leave the previous match and forget everything about it
+    def stop_match(self, previous):
+        if previous is not None:
+            out = bytearray((LEAVE,))
+            put_uint(out, previous[0])
+            self.send(bytes(out))
+        with self.lock:
+            self.clicks.clear()
+            self.tick = 0
+            self.done = False
+        self.states.clear()
+        self.acked = 0
+        self.opponent = EMPTY_STATE
+        self.result = NO_RESULT
+
+    def send_join(self):
+        joinId, mode, size = self.joining
+        self.lastJoin = time.perf_counter()
+        self.send(JOIN_FORMAT.pack(JOIN, joinId, mode, size))
+
+    def send_input(self):
+        with self.lock:
+            tick = self.tick
+            clicks = list(self.clicks)
+        out = bytearray((INPUT,))
+        put_uint(out, self.match[0])
+        put_uint(out, self.acked)
+        put_uint(out, tick)
+        put_uint(out, len(clicks))
+        previous = tick
+        for clickTick, tileIdx in reversed(clicks):
+            put_uint(out, previous - clickTick)
+            put_uint(out, tileIdx)
+            previous = clickTick
+        self.send(bytes(out))
+
+    async def send_loop(self):
+        while True:
+            await asyncio.sleep(1 / RACE_SYNC_RATE)
+            if self.match is not None:
+                # once the result is in, only answer snapshots so the server knows
+                if self.result == NO_RESULT or not self.done:
+                    self.send_input()
+            elif self.joining is not None and time.perf_counter() - self.lastJoin >= self.JOIN_INTERVAL:
+                self.send_join()
+
+    def datagram_received(self, data, addr):
+        self.bytesReceived += len(data)
+        self.packetsReceived += 1
+        try:
+            if data[0] == SNAPSHOT:
+                self.handle_snapshot(data)
+            elif data[0] == START:
+                packetType, joinId, matchId, seed, mode, size, index = START_FORMAT.unpack(data)
+                if self.joining is not None and self.joining[0] == joinId:
+                    self.joining = None
+                    self.match = (matchId, seed, mode, size, index)
+                    if self.onUpdate is not None:
+                        self.onUpdate()
+        except (IndexError, ValueError, struct.error):
+            pass
+
+    def handle_snapshot(self, data):
+        matchId, pos = get_uint(data, 1)
+        if self.match is None or self.match[0] != matchId:
+            return
+        seq, pos = get_uint(data, pos)
+        gap, pos = get_uint(data, pos)
+        if seq <= self.acked:
+            return # late or repeated
+        if gap == 0:
+            base = (EMPTY_STATE, EMPTY_STATE)
+        else:
+            base = self.states.get(seq - gap)
+            if base is None:
+                return # its base was dropped here, a later snapshot will do
+        result = data[pos]
+        own, pos = decode_delta(data, pos + 1, base[0])
+        opponent, pos = decode_delta(data, pos, base[1])
+
+        self.states[seq] = (own, opponent)
+        for old in [old for old in self.states if old <= seq - SNAPSHOT_HISTORY]:
+            del self.states[old]
+        self.acked = seq
+        with self.lock:
+            clicks = self.clicks
+            while clicks and clicks[0][0] < own[0]:
+                clicks.popleft()
+        self.confirmed.put((matchId, own))
+        self.opponent = opponent
+        if result != self.result:
+            self.result = result
+            if self.onUpdate is not None:
+                self.onUpdate()
+        if self.result != NO_RESULT and self.done:
+            self.send_input()
+
+    def bandwidth(self, seconds):
+        payload = (self.bytesSent + self.bytesReceived) / seconds
+        headers = (self.packetsSent + self.packetsReceived) * UDP_OVERHEAD / seconds
+        return payload, payload + headers
+
+def run_server(server, host, port):
+    ready = threading.Event()
+    thread = threading.Thread(target=asyncio.run, args=(server.serve(host, port, ready),), name="race server", daemon=True)
+    thread.start()
+    ready.wait()
+    return thread
+
+# Two bots race each other through a local server over a simulated network
+# and every board is checked against the server's at the end
+def sim(latency, jitter, loss, mode, rate, seconds, seed=1):
+    import pygame
+    import game as g
+
+    pygame.display.init()
+    pygame.font.init()
+
+    server = RaceServer(Conditions(latency, jitter, loss, seed))
+    run_server(server, '127.0.0.1', 0)
+    clients = [RaceClient('127.0.0.1', server.port, Conditions(latency, jitter, loss, seed + 1 + i)) for i in range(2)]
+    for client in clients:
+        client.join(mode)
+    deadline = time.perf_counter() + RACE_TIMEOUT
+    while any(client.match is None for client in clients):
+        if time.perf_counter() > deadline:
+            print("no match")
+            return False
+        time.sleep(0.01)
+
+    games = [g.Game(pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)), mode, race=client) for client in clients]
+    rnd = random.Random(seed)
+    start = time.perf_counter()
+    for game in games:
+        game.begin(mode)
+    nextTap = [start, start]
+    while any(game.running for game in games):
+        now = time.perf_counter()
+        for i, game in enumerate(games):
+            if not game.running:
+                continue
+            if now - start > seconds:
+                # a white tile ends endless runs
+                game.click(game.tileOrder[game.blackTiles] if game.blackTiles < game.tileCount else 0)
+            elif now >= nextTap[i] and game.blackTiles:
+                game.click(game.tileOrder[rnd.randrange(game.blackTiles)])
+                nextTap[i] = now + rnd.expovariate(rate)
+            game.update()
+            if not game.running:
+                game.finish()
+        time.sleep(0.002)
+    played = time.perf_counter() - start
+
+    deadline = time.perf_counter() + RACE_TIMEOUT * 2
+    while any(client.result == NO_RESULT for client in clients) and time.perf_counter() < deadline:
+        for game in games:
+            game.sync_race()
+        time.sleep(0.01)
+    time.sleep(0.5) # last snapshots with the final boards
+    for game in games:
+        game.sync_race()
+    elapsed = time.perf_counter() - start
+
+    ok = True
+    names = {NO_RESULT: "no result", WON: "won", LOST: "lost", DRAW: "draw"}
+    for i, (game, client) in enumerate(zip(games, clients)):
+        other = games[1 - i]
+        # finished games are reported at the tick after the last one run
+        final = board_state(game, game.raceTick + 1)
+        opponent = board_state(other, other.raceTick + 1)
+        confirmed = client.states[client.acked][0] if client.acked else None
+        payload, total = client.bandwidth(elapsed)
+        print("player {}: score {} in {} ticks, {}, {} corrections, {:.0f} B/s payload, {:.0f} B/s with UDP headers".format(
+            i + 1, game.score, game.raceTick, names[client.result], client.corrections, payload, total))
+        if confirmed != final:
+            print("  server has {} for this board, the game ended with {}".format(confirmed, final))
+            ok = False
+        if client.opponent != opponent:
+            print("  opponent shown as {}, it ended with {}".format(client.opponent, opponent))
+            ok = False
+        ok = ok and client.result != NO_RESULT and client.corrections == 0 and payload < 1024
+    print("played {:.1f} s, {:.0f}% loss, {:.0f}-{:.0f} ms latency, {} + {} packets dropped".format(
+        played, loss * 100, latency * 1000, (latency + jitter) * 1000, server.conditions.dropped, sum(client.conditions.dropped for client in clients)))
+    for client in clients:
+        client.close()
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Don't Tap race server")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve')
+    serve.add_argument('--host', default=RACE_HOST)
+    serve.add_argument('--port', type=int, default=RACE_PORT)
+    command = commands.add_parser('sim', help="race two bots over a simulated network")
+    command.add_argument('--latency', type=float, default=0.05, help="seconds each way")
+    command.add_argument('--jitter', type=float, default=0.02)
+    command.add_argument('--loss', type=float, default=0.1)
+    command.add_argument('--mode', type=int, default=FRENZY)
+    command.add_argument('--rate', type=float, default=10, help="taps per second")
+    command.add_argument('--seconds', type=float, default=60, help="a player misses on purpose after this long")
+    args = parser.parse_args()
+
+    modes.load_plugins()
+    if args.command == 'serve':
+        server = RaceServer()
+        print("race server listening on {}:{}".format(args.host, args.port))
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        # headless
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        ok = sim(args.latency, args.jitter, args.loss, args.mode, args.rate, args.seconds)
+        sys.exit(0 if ok else 1)
@@ -0,0 +1,176 @@
+import glob
+import json
+import struct
+import sys
+import time
+import zlib
+
+import core
+import modes
+from settings import *
+
+# Replay files record everything GameCore needs to re-run a game: the RNG
+# seed, mode, rule settings and an event log of clicks and frame deltas.
+#
+# Layout (zlib compressed):
+#   header   MAGIC, version u8, mode u8, size u16, seed u64, settings length u16, settings JSON
+#   events   varints, (tileIdx << 1) | 1 followed by ms since the last frame for a click,
+#            (dt in microseconds << 1) for a frame
+#   trailer  final score i32, timer f64, patternsCleared u16
+#
+#   py ./replay.py verify replays/*.dtr
+
+MAGIC = b'DTRP'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHQH')
+TRAILER = struct.Struct('<idH')
+
+def rule_settings():
+    return {
+        'SIZE': SIZE,
+        'BLACK_TILES': BLACK_TILES,
+        'ENDURANCE_START_TIMER': ENDURANCE_START_TIMER,
+        'EUNDRANCE_TIME_GAIN': EUNDRANCE_TIME_GAIN,
+        'ENDURANCE_TIME_GAIN_THRESHOLD': ENDURANCE_TIME_GAIN_THRESHOLD,
+        'PATTERN_START_TIMER': PATTERN_START_TIMER,
+        'PATTERN_SIZE': PATTERN_SIZE,
+        'PATTERN_AMOUNT': PATTERN_AMOUNT,
+        'FRENZY_START_TIMER': FRENZY_START_TIMER,
+        'FRENZY_SCORE_STEPS': FRENZY_SCORE_STEPS,
+        'COMBO_THRESHOLD': core.GameCore.COMBO_THRESHOLD,
+        'COMBO_GAIN': core.GameCore.COMBO_GAIN,
+        'COMBO_LOSS_PER_FRAME': core.GameCore.COMBO_LOSS_PER_FRAME,
+    }
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+class ReplayError(Exception):
+    pass
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError("truncated varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+class Recorder:
+
+    def __init__(self) -> None:
+        self.events = bytearray()
+        self.mode = ENDURANCE
+        self.size = SIZE
+        self.seed = 0
+        self.frameStart = time.perf_counter()
+
+    def start(self, mode, seed, size=SIZE):
+        self.events.clear()
+        self.mode = mode
+        self.seed = seed
+        self.size = size
+        self.frameStart = time.perf_counter()
+
+    def record_click(self, tileIdx):
+        write_varint(self.events, (tileIdx << 1) | 1)
+        write_varint(self.events, int((time.perf_counter() - self.frameStart) * 1000))
+
+    # Returns dt quantized the way it is stored, the game has to advance by
+    # exactly this value for the replay to match
+    def record_frame(self, dt):
+        dtUs = max(0, int(round(dt * 1e6)))
+        write_varint(self.events, dtUs << 1)
+        self.frameStart = time.perf_counter()
+        return dtUs / 1e6
+
+    def finish(self, game):
+        settings = json.dumps(rule_settings(), separators=(',', ':')).encode()
+        data = bytearray(HEADER.pack(MAGIC, VERSION, self.mode, self.size, self.seed, len(settings)))
+        data += settings
+        data += self.events
+        data += TRAILER.pack(game.score, game.timer, game.patternsCleared)
+        return zlib.compress(bytes(data), 9)
+
+    def save(self, game, path):
+        with open(path, 'wb') as file:
+            file.write(self.finish(game))
+
+# Decode a replay into (header dict, event bytes, expected final state)
+def decode(blob):
+    data = zlib.decompress(blob)
+    magic, version, mode, size, seed, settingsLength = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ReplayError("not a version {} replay".format(VERSION))
+
+    settingsEnd = HEADER.size + settingsLength
+    header = {
+        'mode': mode,
+        'size': size,
+        'seed': seed,
+        'settings': json.loads(data[HEADER.size:settingsEnd]),
+    }
+    score, timer, patternsCleared = TRAILER.unpack_from(data, len(data) - TRAILER.size)
+    expected = {'score': score, 'timer': timer, 'patternsCleared': patternsCleared}
+    return header, memoryview(data)[settingsEnd:len(data) - TRAILER.size], expected
+
+# Re-run a replay without rendering and return the GameCore it ends with
+def run(blob):
+    header, events, expected = decode(blob)
+    if header['settings'] != rule_settings():
+        raise ReplayError("replay was recorded with different game settings")
+
+    game = core.GameCore(header['mode'], header['seed'], header['size'])
+    click = game.click
+    advance = game.advance
+
+    pos = 0
+    end = len(events)
+    while pos < end:
+        value, pos = read_varint(events, pos)
+        if value & 1:
+            if value >> 1 >= game.tileCount:
+                raise ReplayError("click outside the board")
+            click(value >> 1)
+            clickTime, pos = read_varint(events, pos)
+        else:
+            advance((value >> 1) / 1e6)
+    return game, expected
+
+# Returns (matches, expected, actual) for a recorded game
+def verify(blob):
+    game, expected = run(blob)
+    actual = {'score': game.score, 'timer': game.timer, 'patternsCleared': game.patternsCleared}
+    return actual == expected, expected, actual
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'verify':
+        print("usage: py ./replay.py verify FILE...")
+        sys.exit(2)
+
+    modes.load_plugins()
+    paths = [path for pattern in sys.argv[2:] for path in glob.glob(pattern)]
+    start = time.perf_counter()
+    failed = 0
+    for path in paths:
+        with open(path, 'rb') as file:
+            blob = file.read()
+        try:
+            matches, expected, actual = verify(blob)
+        except (ReplayError, zlib.error, struct.error, ValueError) as error:
+            matches, expected, actual = False, None, str(error)
+        if not matches:
+            failed += 1
+            print("MISMATCH {}: expected {} got {}".format(path, expected, actual))
+
+    elapsed = time.perf_counter() - start
+    print("verified {} replays in {:.2f}s, {} mismatched".format(len(paths), elapsed, failed))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,154 @@
+import time
+
+import pygame
+
+from settings import *
+
+# Event driven main loop over a stack of scenes. Only the scene on top runs:
+# the loop blocks on pygame.event.wait until there is input or the scene's
+# next frame is due, and only redraws and presents after something
+# invalidated the screen. Scenes move between each other with push, pop and
+# switch instead of calling into each other, so the stack never grows past
+# the screens that are actually open.
+#
+# Times are taken from time.perf_counter since pygame's clock only runs
+# once the timer subsystem is initialized.
+def ticks():
+    return time.perf_counter() * 1000
+
+# The window was uncovered or restored and has to be drawn again, VIDEOEXPOSE
+# is what older SDL versions send
+EXPOSE_EVENTS = (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE)
+
+# A screen run by the Scheduler. Scene objects are made once and reused,
+# enter gets the arguments of the transition that opened it.
+class Scene:
+
+    name = "scene"
+    fps = 0 # frame rate of any animation on the screen (0 for a static one)
+
+    def __init__(self, scheduler) -> None:
+        self.scheduler = scheduler
+
+    def enter(self, *args):
+        pass
+
+    def exit(self):
+        pass
+
+    def handle_event(self, event):
+        pass
+
+    # Called once per loop before drawing
+    def update(self):
+        pass
+
+    def draw(self):
+        pass
+
+    # Draw and present the screen
+    def render(self):
+        self.draw()
+        self.scheduler.present()
+
+    # Handle events as they arrive until deadline (ms, None to wait for
+    # input) or until the screen needs to be drawn again
+    def wait(self, deadline):
+        scheduler = self.scheduler
+        while scheduler.current is self and not scheduler.dirty:
+            if deadline is None:
+                timeout = scheduler.IDLE_WAIT_MS
+            else:
+                timeout = deadline - ticks()
+                if timeout <= 0:
+                    break
+            event = pygame.event.wait(max(1, int(timeout)))
+            if event.type == pygame.NOEVENT:
+                break
+            if event.type in EXPOSE_EVENTS:
+                scheduler.invalidate()
+            self.handle_event(event)
+
+class Scheduler:
+
+    IDLE_WAIT_MS = 1000
+
+    def __init__(self, measureCpu=False, present=None) -> None:
+        self.measureCpu = measureCpu
+        self.present = pygame.display.flip if present is None else present
+        self.scenes = []
+        self.current = None # scene on top of the stack
+        self.dirty = True
+        self.nextFrame = 0
+        self.cpuUsage = {} # screen name -> CPU seconds per wall second, last measured
+
+    def invalidate(self):
+        self.dirty = True
+
+    def push(self, scene, *args):
+        self.scenes.append(scene)
+        self.activate(*args)
+
+    def pop(self):
+        self.scenes.pop().exit()
+        # the screen below is shown again as it was
+        self.activate(resume=True)
+
+    # Replace the top scene
+    def switch(self, scene, *args):
+        self.scenes.pop().exit()
+        self.scenes.append(scene)
+        self.activate(*args)
+
+    # Close every scene, run() returns after this
+    def quit(self):
+        while self.scenes:
+            self.scenes.pop().exit()
+        self.current = None
+
+    def activate(self, *args, resume=False):
+        self.current = self.scenes[-1] if self.scenes else None
+        self.dirty = True
+        self.nextFrame = ticks()
+        if self.current is not None and not resume:
+            self.current.enter(*args)
+
+    # One pass of the main loop for the scene on top
+    def step(self):
+        scene = self.current
+        if scene.fps and ticks() >= self.nextFrame:
+            self.dirty = True
+            self.nextFrame = max(self.nextFrame + 1000 / scene.fps, ticks())
+
+        scene.update()
+        if scene is not self.current:
+            return
+
+        if self.dirty:
+            self.dirty = False
+            scene.render()
+        scene.wait(self.nextFrame if scene.fps else None)
+
+    # Run scenes until the stack is empty
+    def run(self):
+        cpuStart = time.process_time()
+        wallStart = time.perf_counter()
+        name = None
+
+        while self.current is not None:
+            if self.current.name != name:
+                name = self.current.name
+                cpuStart = time.process_time()
+                wallStart = time.perf_counter()
+            self.step()
+
+            if self.measureCpu:
+                wallTime = time.perf_counter() - wallStart
+                if wallTime >= 1:
+                    self.report_cpu(name, time.process_time() - cpuStart, wallTime)
+                    cpuStart = time.process_time()
+                    wallStart = time.perf_counter()
+
+    def report_cpu(self, name, cpuTime, wallTime):
+        self.cpuUsage[name] = cpuTime / wallTime
+        print("{}: {:.1f} ms CPU per second".format(name, self.cpuUsage[name] * 1000))
@@ -10,9 +10,12 @@ PATTERN_AMOUNT = 15
 FRENZY_START_TIMER = 30
 FRENZY_SCORE_STEPS = 5
 
-# Sceen 
+# Sceen (logical resolution, the window is scaled to it)
 SCREEN_WIDTH = 2560
 SCREEN_HEIGHT = 1440
+WINDOW_SIZE = None # None opens the window at the logical resolution
+RENDER_BACKEND = 'surface' # 'surface' (software blits) or 'texture' (SDL renderer)
+TEXTURE_CACHE_SIZE = 512
 BACKGROUND_COLOR = (38, 38, 38)
 
 # Game window
@@ -25,11 +28,16 @@ GAME_START_POS_Y = (SCREEN_HEIGHT - GAME_HEIGHT) / 2
 TILE_WIDTH = GAME_WIDTH / SIZE
 TILE_HEIGHT = GAME_HEIGHT / SIZE
 TILE_BORDER = 1
+LARGE_GRID_SIZE = 16 # boards this size and up are drawn by the grid renderer
 WHITE_TILE_COLOR = (255, 255, 255)
 BLACK_TILE_COLOR = (0, 0, 0)
 TILE_BORDER_COLOR = (97, 97, 97)
 
 # Text settings
+FONT_NAME = 'Monocraft'
+FONT_INDEX_PATH = 'font_index.json' # cached index of the system fonts
+TEXT_CACHE_SIZE = 256
+
 INFO_TEXT_SIZE = 50
 INFO_TEXT_COLOR = (255, 255, 255)
 
@@ -38,13 +46,58 @@ NUMERICAL_TEXT_COLOR = (0, 0, 255)
 
 TEXT_MARGIN = 25
 
-# 
-REFRESH_RATE = 60
+# Most floating text effects alive at once
+EFFECTS_CAPACITY = 4096
+
+# Game rules run at a fixed TICK_RATE whatever the frame rate is
+TICK_RATE = 60 # logic ticks per second, gameplay is tuned to this
+REFRESH_RATE = 60 # frames drawn per second, 0 for uncapped
+MAX_TICKS_PER_FRAME = 5 # after a stall at most this many ticks run before the next frame, the rest is dropped
+
+# Only redraw and present the parts of the screen that changed during a game
+DIRTY_RECT_RENDERING = True
+
+# Play with FINGERDOWN touch events instead of the mouse (main.py --touch)
+TOUCH_INPUT = False
+
+# Frame profiler (F3 toggles the overlay when enabled)
+PROFILER_FRAMES = 3600
+PROFILE_CSV_PATH = 'frame_profile_{}.csv'
 
 # Save file
-SAVE_PATH = 'stats.txt'
+SAVE_PATH = 'stats.txt' # legacy per-mode text files, imported into the database once
+STATS_DB_PATH = 'stats.db'
+REPLAY_DIR = 'replays'
+
+# Leaderboard (main.py --leaderboard[=host:port])
+LEADERBOARD_HOST = '127.0.0.1'
+LEADERBOARD_PORT = 7878
+LEADERBOARD_TOP_K = 100 # scores per mode the server keeps in memory
+LEADERBOARD_DB_PATH = 'leaderboard.db' # server side store
+LEADERBOARD_QUEUE_PATH = 'leaderboard_queue.db' # scores waiting to be sent
+PLAYER_NAME = None # defaults to the host name
+
+# Head-to-head race (main.py --race[=host:port] against a race.py server)
+RACE_HOST = '127.0.0.1'
+RACE_PORT = 7879
+RACE_SYNC_RATE = 10 # packets per second each way
+RACE_TIMEOUT = 5 # seconds a player can fall behind or go quiet before forfeiting
+RACE_BOARD_SIZE = 400 # the opponent's board, drawn next to your own
+
+# Audio (main.py --mute turns it off)
+AUDIO_FREQUENCY = 44100
+AUDIO_BUFFER = 256 # samples per mixer buffer, about 6 ms at 44.1 kHz
+AUDIO_CHANNELS = 16 # voices for taps, the oldest is cut off when all are playing
+SOUND_DIR = 'sounds' # <name>.wav here replaces the built-in sound
+
+# Video capture (main.py --capture[=y4m|png])
+CAPTURE_DIR = 'captures'
+CAPTURE_FORMAT = 'y4m'
+CAPTURE_SCALE = 1 # integer downscale factor
+CAPTURE_BUFFERS = 8 # frames waiting to be encoded before new ones are dropped
 
-# MODES
+# MODES (built in, more are registered by the modules in PLUGIN_DIR, see modes.py)
+PLUGIN_DIR = 'plugins'
 ENDURANCE = 0
 PATTERN = 1
 FRENZY = 2
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pygame
+
+import backend
+import menu as m
+from settings import *
+
+# Headless soak of the screen flow: plays replays back to back through the
+# real menu scenes (main menu -> game -> game over -> replay -> ...) by
+# posting clicks, and checks that the scene stack and memory stay flat.
+# Every game is lost on its first click so a replay costs a few frames.
+#
+#   py ./soak.py [--replays 10000] [--mode 0] [--max-growth 1048576]
+
+def rss():
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+def click(pos):
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(int(pos[0]), int(pos[1])), button=1))
+
+def click_button(button):
+    # the screen may not have been drawn yet
+    button.tree.arrange()
+    click(button.rect.center)
+
+def click_white_tile(game):
+    tileIdx = game.tileOrder[game.blackTiles] if game.blackTiles < game.tileCount else 0
+    click((GAME_START_POS_X + (tileIdx % game.size + 0.5) * game.tileWidth, GAME_START_POS_Y + (tileIdx // game.size + 0.5) * game.tileHeight))
+
+# Step the scheduler until scene is on top, -1 if it takes too long
+def run_until(scheduler, scene, maxSteps=1000):
+    for i in range(maxSteps):
+        if scheduler.current is scene:
+            return i
+        scheduler.step()
+    return -1
+
+def soak(replays, mode, maxGrowth, reportEvery=1000):
+    pygame.display.init()
+    pygame.font.init()
+    screen = backend.create_backend('surface', WINDOW_SIZE)
+
+    with tempfile.TemporaryDirectory() as directory:
+        menu = m.Menu(screen, statsPath=os.path.join(directory, 'stats.db'))
+        scheduler = menu.scheduler
+        scheduler.push(menu.mainMenuScene)
+        scheduler.step()
+        click_button(menu.mainMenuScene.buttons[mode])
+
+        tracemalloc.start()
+        baseline = None
+        maxDepth = 0
+        start = time.perf_counter()
+        for replay in range(1, replays + 1):
+            if run_until(scheduler, menu.gameScene) == -1:
+                print("replay {}: game didn't start".format(replay))
+                return False
+            click_white_tile(menu.game)
+            if run_until(scheduler, menu.gameOverScene) == -1:
+                print("replay {}: game didn't end".format(replay))
+                return False
+            maxDepth = max(maxDepth, len(scheduler.scenes))
+            click_button(menu.gameOverScene.buttons[0])
+
+            # measure once everything made on first use exists
+            if replay == min(100, replays):
+                baseline = tracemalloc.get_traced_memory()[0]
+            if replay % reportEvery == 0 or replay == replays:
+                current = tracemalloc.get_traced_memory()[0]
+                print("{:>7} replays  {:>6.0f}/s  scenes {}  python {:>8.1f} KiB  rss {:>8.1f} MiB".format(
+                    replay, replay / (time.perf_counter() - start), len(scheduler.scenes), current / 1024, rss() / 2 ** 20))
+
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        menu.scoreStore.close()
+
+    print("max scene stack depth {}, python memory growth {:.1f} KiB".format(maxDepth, growth / 1024))
+    return maxDepth <= 2 and growth <= maxGrowth
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Don't Tap screen flow soak test")
+    parser.add_argument('--replays', type=int, default=10000)
+    parser.add_argument('--mode', type=int, default=ENDURANCE, choices=(ENDURANCE, PATTERN, FRENZY))
+    parser.add_argument('--max-growth', type=int, default=1 << 20, help="bytes of python memory allowed to grow after warm up")
+    args = parser.parse_args()
+
+    ok = soak(args.replays, args.mode, args.max_growth)
+    pygame.quit()
+    sys.exit(0 if ok else 1)
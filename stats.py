@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import time
+
+import modes
+from settings import *
+
+# Score history for every mode in one SQLite file. Scores are indexed on
+# (mode, score) for top-N and personal best lookups and on (mode, seq) for
+# range queries over the play history.
+class ScoreStore:
+
+    # Legacy text files are looked for next to the database unless legacyDir is given
+    def __init__(self, path=STATS_DB_PATH, legacyDir=None) -> None:
+        self.path = path
+        self.skippedLines = 0 # malformed lines left out of the legacy import
+        self.listeners = [] # called with (mode, score) for every score added
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS scores (
+                id INTEGER PRIMARY KEY,
+                mode INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                score NUMERIC NOT NULL,
+                time REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS scores_mode_score ON scores (mode, score);
+            CREATE UNIQUE INDEX IF NOT EXISTS scores_mode_seq ON scores (mode, seq);
+            CREATE TABLE IF NOT EXISTS imports (path TEXT PRIMARY KEY);
+        """)
+        self.import_legacy_files((os.path.dirname(path) or '.') if legacyDir is None else legacyDir)
+
+    def close(self):
+        self.connection.close()
+
+    # Lower is better for pattern (time to clear), higher for everything else
+    def order(self, mode):
+        return "ASC" if modes.get(mode).lowerIsBetter else "DESC"
+
+    def add(self, mode, score, timestamp=None):
+        with self.connection:
+            self.insert(mode, score, timestamp)
+        for listener in self.listeners:
+            listener(mode, score)
+
+    def insert(self, mode, score, timestamp=None):
+        seq = self.count(mode)
+        self.connection.execute(
+            "INSERT INTO scores (mode, seq, score, time) VALUES (?, ?, ?, ?)",
+            (mode, seq, score, time.time() if timestamp is None else timestamp))
+
+    def count(self, mode):
+        row = self.connection.execute("SELECT MAX(seq) FROM scores WHERE mode = ?", (mode,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def top(self, mode, n=10):
+        rows = self.connection.execute(
+            "SELECT score FROM scores WHERE mode = ? ORDER BY score " + self.order(mode) + " LIMIT ?",
+            (mode, -1 if n is None else n))
+        return [row[0] for row in rows]
+
+    def personal_best(self, mode):
+        best = self.top(mode, 1)
+        return best[0] if best else None
+
+    # Scores in the order they were played, from game number start up to stop
+    def history(self, mode, start=0, stop=None):
+        rows = self.connection.execute(
+            "SELECT score FROM scores WHERE mode = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (mode, start, self.count(mode) if stop is None else stop))
+        return [row[0] for row in rows]
+
+    # One-time import of the old per-mode "<mode>stats.txt" files
+    def import_legacy_files(self, directory):
+        for mode in (ENDURANCE, PATTERN, FRENZY):
+            filePath = os.path.join(directory, str(mode) + SAVE_PATH)
+            if not os.path.isfile(filePath):
+                continue
+
+            key = os.path.abspath(filePath)
+            if self.connection.execute("SELECT 1 FROM imports WHERE path = ?", (key,)).fetchone():
+                continue
+
+            timestamp = os.path.getmtime(filePath)
+            with self.connection:
+                with open(filePath, 'r') as file:
+                    for line in file:
+                        value = line.split(' ')[0].strip()
+                        if not value:
+                            continue
+                        try:
+                            score = float(value) if mode is PATTERN else int(value)
+                        except ValueError:
+                            self.skippedLines += 1
+                            continue
+                        self.insert(mode, score, timestamp)
+                self.connection.execute("INSERT INTO imports (path) VALUES (?)", (key,))
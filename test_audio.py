@@ -0,0 +1,67 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import time
+import unittest
+
+import pygame
+
+import audio
+
+# Tap channel pooling and the tap delay report, on SDL's dummy audio driver.
+#
+#   py -m unittest test_audio
+
+CHANNELS = 2
+
+class TapChannels(unittest.TestCase):
+
+    def setUp(self):
+        self.audio = audio.Audio(channels=CHANNELS)
+        if not self.audio.enabled:
+            self.skipTest("no audio device")
+
+    def tearDown(self):
+        pygame.mixer.quit()
+
+    def test_busy_channels_steal_the_oldest_tap(self):
+        for i in range(CHANNELS):
+            self.audio.play_tap()
+        self.assertEqual(self.audio.steals, 0)
+        self.assertTrue(all(channel.get_busy() for channel in self.audio.tapChannels))
+
+        first = self.audio.tapStarts.index(min(self.audio.tapStarts))
+        self.audio.play_tap()
+        self.assertEqual(self.audio.steals, 1)
+        # the stolen channel is now the newest tap
+        self.assertEqual(self.audio.tapStarts[first], max(self.audio.tapStarts))
+
+        # events have their own channels and never steal a tap
+        self.audio.play('bonus')
+        self.assertEqual(self.audio.steals, 1)
+
+    def test_delays_are_recorded_only_with_an_event_time(self):
+        self.audio.play_tap()
+        self.assertEqual(len(self.audio.tapDelays), 0)
+
+        for level in range(3):
+            self.audio.play_tap(level, time.perf_counter())
+        self.assertEqual(len(self.audio.tapDelays), 3)
+        self.assertTrue(all(delay >= 0 for delay in self.audio.tapDelays))
+        report = self.audio.report()
+        self.assertIn("over 3 taps", report)
+        self.assertIn("2 voices stolen", report)
+
+        self.audio.reset()
+        self.assertEqual(len(self.audio.tapDelays), 0)
+        self.assertEqual(self.audio.steals, 0)
+
+    def test_delays_are_bounded(self):
+        for i in range(self.audio.DELAY_SAMPLES + 10):
+            self.audio.play_tap(0, time.perf_counter())
+        self.assertEqual(len(self.audio.tapDelays), self.audio.DELAY_SAMPLES)
+        self.assertIn("over {} taps".format(self.audio.DELAY_SAMPLES), self.audio.report())
+
+if __name__ == '__main__':
+    unittest.main()
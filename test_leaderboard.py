@@ -0,0 +1,121 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import leaderboard
+from settings import *
+from testutil import WAIT, ServerThread, free_port, wait_until
+
+# Round trips between LeaderboardClient and LeaderboardServer over loopback.
+#
+#   py -m unittest test_leaderboard
+
+# Retries quickly so a server coming back up is noticed within the test
+class FastClient(leaderboard.LeaderboardClient):
+
+    RETRY_MIN = 0.05
+    RETRY_MAX = 0.2
+
+# A LeaderboardServer that records every submit batch
+class LeaderboardThread(ServerThread):
+
+    def __init__(self, path, port=0) -> None:
+        server = leaderboard.LeaderboardServer(path)
+        self.batches = []
+        handle_request = server.handle_request
+
+        def record(request):
+            if request.get('op') == 'submit':
+                self.batches.append([entry['id'] for entry in request['scores']])
+            return handle_request(request)
+        server.handle_request = record
+        super().__init__(server, port)
+
+    def stop(self):
+        super().stop()
+        self.server.close()
+
+class LeaderboardRoundTrip(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.servers = []
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        for server in self.servers:
+            server.stop()
+        self.directory.cleanup()
+
+    def start_server(self, port=0):
+        server = LeaderboardThread(os.path.join(self.directory.name, 'leaderboard.db'), port)
+        self.servers.append(server)
+        return server
+
+    def start_client(self, port):
+        client = FastClient('127.0.0.1', port, os.path.join(self.directory.name, 'queue.db'), player="test")
+        self.clients.append(client)
+        return client
+
+    # Ids written to the server's database, read on the server's thread
+    def stored_ids(self, server):
+        def stored(leaderboardServer):
+            leaderboardServer.flush()
+            return {row[0] for row in leaderboardServer.connection.execute("SELECT id FROM leaderboard")}
+        return server.call(stored)
+
+    def test_scores_are_sent_in_batches(self):
+        server = self.start_server()
+        client = self.start_client(server.port)
+        count = 2 * client.BATCH_SIZE + 20
+        for score in range(count):
+            client.submit(ENDURANCE, score)
+
+        self.assertTrue(wait_until(lambda: client.sent == count))
+        self.assertEqual(client.pending(), 0)
+        self.assertTrue(all(len(batch) <= client.BATCH_SIZE for batch in server.batches))
+        self.assertEqual(sum(len(batch) for batch in server.batches), count)
+        self.assertEqual(len(self.stored_ids(server)), count)
+
+        client.refresh(ENDURANCE, 3)
+        self.assertTrue(wait_until(lambda: client.top(ENDURANCE)))
+        self.assertEqual(client.top(ENDURANCE), [["test", count - 1], ["test", count - 2], ["test", count - 3]])
+
+    def test_retried_score_is_stored_once(self):
+        server = self.start_server()
+        client = self.start_client(server.port)
+        entry = {'id': "retried", 'mode': ENDURANCE, 'score': 42, 'player': "test", 'time': 1.0}
+        # the same batch again, as sent when the first reply got lost
+        for i in range(2):
+            reply = asyncio.run_coroutine_threadsafe(client.request({'op': 'submit', 'scores': [entry]}), client.loop).result(WAIT)
+            self.assertEqual(reply, {'ok': True, 'accepted': 1})
+
+        self.assertEqual(server.server.top_scores(ENDURANCE, 10), [["test", 42]])
+        self.assertEqual(self.stored_ids(server), {"retried"})
+
+    def test_scores_queue_while_the_server_is_down(self):
+        port = free_port()
+        client = self.start_client(port)
+        count = client.BATCH_SIZE + 20
+        for score in range(count):
+            client.submit(FRENZY, score)
+        self.assertTrue(wait_until(lambda: client.pending() == count))
+        self.assertFalse(client.connected)
+        self.assertEqual(client.sent, 0)
+
+        # the queue outlives the client
+        client.close()
+        client = self.start_client(port)
+        self.assertEqual(client.pending(), count)
+
+        server = self.start_server(port)
+        self.assertTrue(wait_until(lambda: client.pending() == 0))
+        self.assertTrue(client.connected)
+        self.assertEqual([len(batch) for batch in server.batches], [client.BATCH_SIZE, 20])
+        self.assertEqual(len(self.stored_ids(server)), count)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import random
+import socket
+import time
+import unittest
+
+import pygame
+
+import core
+import game as g
+import race
+from settings import *
+from testutil import ServerThread, free_port, wait_until
+
+# Races between two bots through a RaceServer over loopback, with packets
+# dropped and delayed by race.Conditions. Every game ends on a miss, the
+# checks are that both sides agree on every final board and score.
+#
+#   py -m unittest test_race
+
+TAP_RATE = 8 # bot taps per second
+
+def setUpModule():
+    pygame.display.init()
+    pygame.font.init()
+
+# Wait for condition while the games take over what the server confirmed
+def wait_synced(condition, games):
+    def sync():
+        for game in games:
+            game.sync_race()
+    return wait_until(condition, sync)
+
+class RaceOverLoopback(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        for server in self.servers:
+            server.stop()
+
+    def start(self, mode, latency=0.03, jitter=0.02, loss=0.2, seed=1):
+        server = ServerThread(race.RaceServer(race.Conditions(latency, jitter, loss, seed)))
+        self.servers.append(server)
+        clients = [race.RaceClient('127.0.0.1', server.port, race.Conditions(latency, jitter, loss, seed + 1 + i)) for i in range(2)]
+        self.clients.extend(clients)
+        for client in clients:
+            client.join(mode)
+        self.assertTrue(wait_until(lambda: all(client.match is not None for client in clients)))
+        games = [g.Game(pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)), mode, race=client) for client in clients]
+        for game in games:
+            game.begin(mode)
+        return server, clients, games
+
+    # Both bots tap black tiles until their time in missAt is up, then tap a
+    # white tile. onTick(seconds) runs on the game thread every frame
+    def play(self, games, missAt, seed=1, onTick=None):
+        rnd = random.Random(seed)
+        start = time.perf_counter()
+        nextTap = [start, start]
+        while any(game.running for game in games):
+            now = time.perf_counter()
+            if onTick is not None:
+                onTick(now - start)
+            for i, game in enumerate(games):
+                if not game.running:
+                    continue
+                if now - start > missAt[i]:
+                    game.click(game.tileOrder[game.blackTiles])
+                elif now >= nextTap[i] and game.blackTiles:
+                    game.click(game.tileOrder[rnd.randrange(game.blackTiles)])
+                    nextTap[i] = now + rnd.expovariate(TAP_RATE)
+                game.update()
+                if not game.running:
+                    game.finish()
+            time.sleep(0.002)
+
+    # Final boards as the games ended them, the server and each client agree
+    def check_finished(self, server, clients, games):
+        self.assertTrue(wait_synced(lambda: all(client.result != race.NO_RESULT for client in clients), games))
+        finals = [race.board_state(game, game.raceTick + 1) for game in games]
+        self.assertTrue(wait_synced(lambda: all(client.acked and client.states[client.acked] == (finals[i], finals[1 - i])
+                                               for i, client in enumerate(clients)), games))
+        for game in games:
+            game.sync_race()
+            self.assertFalse(game.running)
+
+        results = sorted(client.result for client in clients)
+        self.assertIn(results, ([race.DRAW, race.DRAW], [race.WON, race.LOST]))
+        return finals
+
+    def test_games_ending_on_a_miss_agree_with_the_server(self):
+        for mode in (ENDURANCE, PATTERN, FRENZY):
+            with self.subTest(mode=mode):
+                server, clients, games = self.start(mode, seed=mode + 1)
+                self.play(games, (1.5, 2.5), seed=mode + 1)
+                self.check_finished(server, clients, games)
+                for client in clients:
+                    self.assertEqual(client.corrections, 0)
+                    self.assertTrue(client.conditions.dropped > 0)
+
+    def test_score_decides_the_winner(self):
+        server, clients, games = self.start(FRENZY, seed=7)
+        # the first player stops tapping early and scores less
+        self.play(games, (0.5, 2.0), seed=7)
+        self.check_finished(server, clients, games)
+        first, second = (game.score for game in games)
+        self.assertLess(first, second)
+        self.assertEqual([client.result for client in clients], [race.LOST, race.WON])
+
+    def test_wrong_prediction_is_rolled_back_and_replayed(self):
+        # nothing lost or reordered, so the one snapshot after the change
+        # arrives and the client takes it over at the tick it was made
+        server, clients, games = self.start(FRENZY, jitter=0, loss=0, seed=3)
+        changed = []
+
+        # on the server, a white tile turns black and the score jumps, so
+        # the first player's spawns and score differ from there on
+        def change(raceServer):
+            match, player = next(entry for entry in raceServer.players.values() if entry[1].index == 0)
+            game = player.core
+            game.make_tile_black(game.tileOrder[game.blackTiles])
+            game.score += 100
+            changed.append(player.tick)
+
+        sync = server.server.sync
+        def sync_with_change():
+            if not changed and server.server.matches:
+                match = next(iter(server.server.matches.values()))
+                if match.players[0].tick > TICK_RATE:
+                    change(server.server)
+            sync()
+        server.server.sync = sync_with_change
+
+        self.play(games, (2.5, 2.5), seed=3)
+        finals = self.check_finished(server, clients, games)
+        self.assertEqual(len(changed), 1)
+        # whichever client joined first is the first player
+        self.assertEqual([client.corrections for client in clients], [int(client.match[4] == 0) for client in clients])
+        scores = server.call(lambda raceServer: [player.core.score for match in raceServer.matches.values() for player in match.players])
+        self.assertEqual([final[2] for client, final in sorted(zip(clients, finals), key=lambda entry: entry[0].match[4])], scores)
+
+    def test_unconfirmed_ticks_keep_few_core_states(self):
+        client = race.RaceClient('127.0.0.1', free_port(socket.SOCK_DGRAM))
+        self.clients.append(client)
+        game = core.GameCore(ENDURANCE, seed=1, size=128)
+        client.begin(game)
+        # nothing is ever confirmed, as with a server that went quiet
+        for tick in range(1, 2 * client.PREDICTION_HISTORY):
+            client.record_click(tick - 1, game.tileOrder[0])
+            game.click(game.tileOrder[0])
+            game.advance(core.TICK_TIME)
+            client.record_tick(game, tick)
+        self.assertLessEqual(len(client.history), client.PREDICTION_HISTORY)
+        self.assertLessEqual(len(client.keyframes), client.PREDICTION_HISTORY // client.KEYFRAME_INTERVAL + 1)
+        self.assertEqual(client.keyframes[0][0], client.history[0][0])
+
+    def test_joining_again_forgets_the_last_match(self):
+        server = ServerThread(race.RaceServer(race.Conditions()))
+        self.servers.append(server)
+        clients = [race.RaceClient('127.0.0.1', server.port) for i in range(2)]
+        self.clients.extend(clients)
+        for client in clients:
+            client.join(ENDURANCE)
+        self.assertTrue(wait_until(lambda: all(client.match is not None for client in clients)))
+        first = clients[0].match
+
+        # a rematch never starts from the last match's seed
+        for client in clients:
+            client.join(ENDURANCE)
+            self.assertIsNone(client.match)
+        self.assertTrue(wait_until(lambda: all(client.match is not None for client in clients)))
+        self.assertNotEqual(clients[0].match[0], first[0])
+        self.assertEqual(clients[0].match[1], clients[1].match[1])
+
+        clients[0].leave()
+        self.assertIsNone(clients[0].match)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import asyncio
+import concurrent.futures
+import socket
+import threading
+import time
+
+# Helpers shared by the tests that run a server over loopback.
+
+WAIT = 10 # seconds a test waits for the network to settle
+
+# A server with an async serve(host, port, ready) running on its own loop thread
+class ServerThread:
+
+    def __init__(self, server, port=0) -> None:
+        self.server = server
+        ready = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.serving = asyncio.run_coroutine_threadsafe(server.serve('127.0.0.1', port, ready), self.loop)
+        ready.wait(WAIT)
+        self.port = server.port
+
+    # Run fn(server) on the server's thread and return what it returns
+    def call(self, fn):
+        async def run():
+            return fn(self.server)
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result(WAIT)
+
+    def stop(self):
+        self.serving.cancel()
+        concurrent.futures.wait([self.serving], WAIT)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(WAIT)
+
+# A port nothing listens on, for clients that have to find the server down
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(type=kind) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+# Check condition until it holds or WAIT runs out, calling step in between
+def wait_until(condition, step=None):
+    deadline = time.monotonic() + WAIT
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        if step is not None:
+            step()
+        time.sleep(0.01)
+    return True
@@ -0,0 +1,140 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import pygame
+
+from settings import *
+
+# Touch input and the event queue.
+#
+# restrict_events limits SDL's queue to the events the game handles, so
+# mouse motion, text input and the many window events are dropped by SDL
+# instead of being queued and drained every frame. Finger events are only
+# let through in touch mode.
+#
+# TapGenerator posts finger taps on black tiles from a background thread at
+# a fixed rate, several fingers at once, to check that taps aren't lost
+# under sustained input:
+#
+#   py ./touch.py stress [--rate 40] [--seconds 20] [--burst 2]
+
+EVENTS = (pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE)
+TOUCH_EVENTS = (pygame.FINGERDOWN, pygame.FINGERUP)
+
+def restrict_events(touch=TOUCH_INPUT, extra=()):
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(EVENTS + (TOUCH_EVENTS if touch else ()) + tuple(extra))
+
+class TapGenerator(threading.Thread):
+
+    def __init__(self, game, rate, seconds, burst=2) -> None:
+        super().__init__(name="taps", daemon=True)
+        self.game = game
+        self.rate = rate # taps per second
+        self.seconds = seconds
+        self.burst = burst # fingers going down at the same moment
+        self.fingerCount = burst * 2 # a burst's fingers lift while the next burst is down
+        self.posted = 0
+        self.tiles = [] # tile of every posted tap, in order
+        self.stalls = 0 # times a tap had to wait for a free black tile
+        self.done = False # the closing QUIT was posted
+
+    def finger_event(self, type, finger, tileIdx):
+        game = self.game
+        x = GAME_START_POS_X + (tileIdx % game.size + 0.5) * game.tileWidth
+        y = GAME_START_POS_Y + (tileIdx // game.size + 0.5) * game.tileHeight
+        width, height = game.backend.logicalSize
+        return pygame.event.Event(type, touch_id=0, finger_id=finger, x=x / width, y=y / height, dx=0.0, dy=0.0, pressure=1.0)
+
+    # Black tiles that no tap still in the queue is aimed at
+    def free_black_tiles(self):
+        game = self.game
+        pending = set(self.tiles[game.taps:])
+        return [tileIdx for tileIdx in game.tileOrder[:game.blackTiles] if tileIdx not in pending]
+
+    def run(self):
+        game = self.game
+        interval = self.burst / self.rate
+        down = {} # finger -> tile
+        finger = 0
+        start = time.perf_counter()
+        nextBurst = start
+        while time.perf_counter() - start < self.seconds and game.running:
+            time.sleep(max(0, nextBurst - time.perf_counter()))
+            nextBurst += interval
+
+            # taps due by now, more than a burst when it had to wait before
+            due = int((time.perf_counter() - start) * self.rate) - self.posted
+            while due > 0 and game.running:
+                tiles = self.free_black_tiles()
+                if not tiles:
+                    self.stalls += 1
+                    time.sleep(0.001)
+                    continue
+                for tileIdx in tiles[:due]:
+                    if finger in down:
+                        pygame.event.post(self.finger_event(pygame.FINGERUP, finger, down.pop(finger)))
+                    self.tiles.append(tileIdx)
+                    pygame.event.post(self.finger_event(pygame.FINGERDOWN, finger, tileIdx))
+                    self.posted += 1
+                    down[finger] = tileIdx
+                    finger = (finger + 1) % self.fingerCount
+                    due -= 1
+
+        for finger, tileIdx in down.items():
+            pygame.event.post(self.finger_event(pygame.FINGERUP, finger, tileIdx))
+        self.done = True
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+def stress(rate, seconds, burst, mode=ENDURANCE):
+    import backend
+    import game as g
+
+    pygame.display.init()
+    pygame.font.init()
+    screen = backend.create_backend('surface', WINDOW_SIZE)
+    restrict_events(touch=True)
+
+    game = g.Game(screen, mode, measureLatency=True, touchInput=True)
+    game.begin(mode)
+    generator = TapGenerator(game, rate, seconds, burst)
+    generator.start()
+
+    start = time.perf_counter()
+    nextFrame = start
+    frameTime = 1 / REFRESH_RATE if REFRESH_RATE else 0
+    while game.running:
+        game.render()
+        nextFrame = max(nextFrame + frameTime, time.perf_counter())
+        game.wait_for_frame(nextFrame)
+        game.update()
+    elapsed = time.perf_counter() - start
+    generator.join()
+    result = game.finish()
+
+    dropped = generator.posted - game.taps
+    print("{} taps posted in {:.1f} s ({:.1f} per second, bursts of {}), {} reached the board, {} dropped".format(
+        generator.posted, elapsed, generator.posted / elapsed, burst, game.taps, dropped))
+    print("score {}, waited {} times for a free black tile".format(result['score'], generator.stalls))
+    if not generator.done:
+        print("the game ended before the generator finished")
+    return dropped == 0 and generator.done
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Don't Tap touch input stress test")
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('stress')
+    command.add_argument('--rate', type=float, default=40, help="taps per second")
+    command.add_argument('--seconds', type=float, default=20)
+    command.add_argument('--burst', type=int, default=2, help="fingers tapping at the same moment")
+    command.add_argument('--mode', type=int, default=ENDURANCE, choices=(ENDURANCE, FRENZY))
+    args = parser.parse_args()
+
+    # headless
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    ok = stress(args.rate, args.seconds, args.burst, args.mode)
+    pygame.quit()
+    sys.exit(0 if ok else 1)
@@ -1,44 +1,262 @@
 import pygame
 
-class TempText:
+import fonts
+from collections import OrderedDict
 
-    TEXT_FLOAT_SPEED = 5
+from settings import *
 
-    def __init__(self, screen, x, y, text, textColor, font, transparency, float, decayRate) -> None:
-        self.screen = screen
-        self.x = x
-        self.y = y
-        self.text = text
-        self.textColor = textColor
-        self.font = font
-        self.transparency = transparency
-        self.float = float
-        self.decayRate = decayRate
+# Pre-rendered glyphs for numeric readouts, so changing numbers are composed
+# by blitting glyphs instead of rendering a new text surface every frame
+class DigitAtlas:
 
-    def draw(self):
-        text = self.font.render(self.text, False, self.textColor)
-        text.set_alpha(self.transparency)
-        self.screen.blit(text, (self.x - text.get_width() / 2, self.y - text.get_height() / 2))
+    GLYPHS = "0123456789.-+"
 
-    def update(self):
-        self.transparency -= self.decayRate
+    def __init__(self, font, color) -> None:
+        self.glyphs = {}
+        self.widths = {}
+        for glyph in self.GLYPHS:
+            self.glyphs[glyph] = font.render(glyph, False, color)
+            self.widths[glyph] = self.glyphs[glyph].get_width()
+        self.height = font.get_height()
 
-class Button:
-    BUTTON_FONT_SIZE = 35
+    def get_width(self, text):
+        widths = self.widths
+        return sum(widths[glyph] for glyph in text)
+
+    # screen can be a surface or a rendering backend
+    def draw(self, screen, text, pos):
+        x, y = pos
+        glyphs = self.glyphs
+        widths = self.widths
+        for glyph in text:
+            screen.blit(glyphs[glyph], (x, y))
+            x += widths[glyph]
+        return pygame.Rect(pos[0], y, x - pos[0], self.height)
+
+# Shared cache for fonts and rendered text, keyed on (font, size, text, color)
+class TextCache:
+
+    def __init__(self, maxSize=TEXT_CACHE_SIZE) -> None:
+        self.maxSize = maxSize
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.atlases = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_font(self, size, name=FONT_NAME):
+        font = self.fonts.get((name, size))
+        if font is None:
+            font = pygame.font.Font(fonts.find_font(name), size)
+            self.fonts[(name, size)] = font
+        return font
+
+    def render(self, text, color, size, name=FONT_NAME):
+        key = (name, size, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = self.get_font(size, name).render(text, False, color)
+        self.surfaces[key] = surface
+
+        # evict least recently used surface
+        if len(self.surfaces) > self.maxSize:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def get_atlas(self, color, size, name=FONT_NAME):
+        key = (name, size, color)
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            atlas = DigitAtlas(self.get_font(size, name), color)
+            self.atlases[key] = atlas
+        return atlas
 
-    def __init__(self, screen, x, y, width, height, text, textColor, color, action) -> None:
-        self.screen = screen
+    def clear(self):
+        self.surfaces.clear()
+        self.atlases.clear()
+        self.hits = 0
+        self.misses = 0
+
+textCache = TextCache()
+
+# Retained-mode widgets. A widget composes its look into its own surface
+# once and only composes it again after its text, colors or size changed,
+# so drawing it is a single blit.
+class Widget:
+
+    def __init__(self, backend, x, y, width, height) -> None:
+        self.backend = backend
         self.x = x
         self.y = y
         self.width = width
         self.height = height
-        self.text = text
-        self.textColor = textColor
-        self.color = color
+        self.visible = True
+        self.surface = None # composed look, None when it has to be made again
+        self.tree = None # WidgetTree the widget is in
+
+    @property
+    def rect(self):
+        return pygame.Rect(int(self.x), int(self.y), round(self.width), round(self.height))
+
+    def invalidate(self):
+        self.surface = None
+
+    def set_rect(self, x, y, width, height):
+        if (width, height) != (self.width, self.height):
+            self.invalidate()
+        self.x, self.y, self.width, self.height = x, y, width, height
+        if self.tree is not None:
+            self.tree.moved()
+
+    def compose(self):
+        return pygame.Surface((round(self.width), round(self.height)))
+
+    def get_surface(self):
+        if self.surface is None:
+            self.surface = self.compose()
+        return self.surface
+
+    def draw(self):
+        return self.backend.blit(self.get_surface(), (self.x, self.y))
+
+    def click(self):
+        return None
+
+class Button(Widget):
+    BUTTON_FONT_SIZE = 35
+
+    def __init__(self, backend, x, y, width, height, text, textColor, color, action) -> None:
+        super().__init__(backend, x, y, width, height)
+        self._text = text
+        self._textColor = textColor
+        self._color = color
         self.action = action
-    
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        if text != self._text:
+            self._text = text
+            self.invalidate()
+
+    @property
+    def textColor(self):
+        return self._textColor
+
+    @textColor.setter
+    def textColor(self, textColor):
+        if textColor != self._textColor:
+            self._textColor = textColor
+            self.invalidate()
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        if color != self._color:
+            self._color = color
+            self.invalidate()
+
+    def compose(self):
+        surface = super().compose()
+        surface.fill(self._color)
+        buttonText = textCache.render(self._text, self._textColor, self.BUTTON_FONT_SIZE)
+        surface.blit(buttonText, (surface.get_width() / 2 - buttonText.get_width() / 2, surface.get_height() / 2 - buttonText.get_height() / 2))
+        return surface
+
+    def click(self):
+        return self.action()
+
+# Rects for count widgets stacked top to bottom
+def column(count, x, y, width, height, margin):
+    return [(x, y + (height + margin) * i, width, height) for i in range(count)]
+
+# The widgets of a screen, drawn in the order they were added. Their
+# positions come from layout(size) (a list of (x, y, width, height) per
+# widget), run once per logical resolution and cached. Hit-testing goes
+# through a grid of CELL_SIZE buckets so a click only looks at the widgets
+# under it.
+class WidgetTree:
+
+    CELL_SIZE = 64
+
+    def __init__(self, backend, layout=None) -> None:
+        self.backend = backend
+        self.widgets = []
+        self.layout = layout
+        self.layouts = {} # logical size -> rects from layout
+        self.laidOutFor = None
+        self.cells = None # (cellX, cellY) -> widgets in that cell, bottom first
+
+    def __len__(self):
+        return len(self.widgets)
+
+    def __getitem__(self, idx):
+        return self.widgets[idx]
+
+    def __iter__(self):
+        return iter(self.widgets)
+
+    def add(self, widget):
+        widget.tree = self
+        self.widgets.append(widget)
+        self.layouts.clear()
+        self.laidOutFor = None
+        self.cells = None
+        return widget
+
+    def remove(self, widget):
+        widget.tree = None
+        self.widgets.remove(widget)
+        self.layouts.clear()
+        self.laidOutFor = None
+        self.cells = None
+
+    def moved(self):
+        self.cells = None
+
+    def arrange(self):
+        size = self.backend.logicalSize
+        if self.layout is None or size == self.laidOutFor:
+            return
+        rects = self.layouts.get(size)
+        if rects is None:
+            rects = self.layout(size)
+            self.layouts[size] = rects
+        for widget, rect in zip(self.widgets, rects):
+            widget.set_rect(*rect)
+        self.laidOutFor = size
+
+    def build_index(self):
+        cellSize = self.CELL_SIZE
+        self.cells = {}
+        for widget in self.widgets:
+            rect = widget.rect
+            for cellX in range(rect.left // cellSize, (rect.right - 1) // cellSize + 1):
+                for cellY in range(rect.top // cellSize, (rect.bottom - 1) // cellSize + 1):
+                    self.cells.setdefault((cellX, cellY), []).append(widget)
+
+    # Topmost visible widget at pos (logical coordinates), -1 if none
+    def hit_test(self, pos):
+        self.arrange()
+        if self.cells is None:
+            self.build_index()
+        posX, posY = int(pos[0]), int(pos[1])
+        for widget in reversed(self.cells.get((posX // self.CELL_SIZE, posY // self.CELL_SIZE), ())):
+            if widget.visible and widget.rect.collidepoint(posX, posY):
+                return widget
+        return -1
+
     def draw(self):
-        pygame.draw.rect(self.screen, self.color, rect=((self.x, self.y), (self.width, self.height)))
-        text = pygame.font.SysFont('Monocraft', self.BUTTON_FONT_SIZE)
-        buttonText = text.render(self.text, False, self.textColor)
-        self.screen.blit(buttonText, (self.x + self.width / 2 - buttonText.get_width() / 2, self.y + self.height / 2 - buttonText.get_height() / 2))
\ No newline at end of file
+        self.arrange()
+        return self.backend.blits([(widget.get_surface(), (widget.x, widget.y)) for widget in self.widgets if widget.visible])
@@ -0,0 +1,166 @@
+import os
+
+import numpy as np
+
+import core
+from settings import *
+
+# Batched version of the GameCore rules for ENDURANCE and FRENZY that steps
+# count independent boards at once over NumPy arrays, for training and
+# evaluating bots headless.
+#
+# Conventions are the same as the interactive game: a board is tileCount
+# tiles indexed x + y * size with 1 = black (GameCore.tiles), an action is
+# the tile clicked this frame or -1 for no click (Game.get_tile_from_pos),
+# and a step is GameCore.step([action], dt): the click, then one frame of
+# combo decay, bonus and timer rules. Boards whose game ended are reset
+# right away and report it through the dones array.
+#
+# Every board draws spawns from its own SplitMix64 stream, so a board plays
+# out the same for a given seed and actions whatever else is in the batch.
+
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+MIX2 = np.uint64(0x94D049BB133111EB)
+
+class BatchEnv:
+
+    def __init__(self, count, mode=ENDURANCE, seeds=None, size=SIZE, dt=1 / TICK_RATE) -> None:
+        if mode is not ENDURANCE and mode is not FRENZY:
+            raise ValueError("BatchEnv only supports ENDURANCE and FRENZY")
+        self.count = count
+        self.mode = mode
+        self.size = size
+        self.tileCount = size * size
+        self.dt = dt
+        self.rows = np.arange(count)
+
+        self.board = np.zeros((count, self.tileCount), dtype=bool)
+        self.blackTiles = np.zeros(count, dtype=np.int64)
+        self.score = np.zeros(count, dtype=np.int64)
+        self.combo = np.zeros(count)
+        self.timer = np.zeros(count)
+        self.bonusActive = np.zeros(count, dtype=bool)
+        self.state = np.zeros(count, dtype=np.uint64) # RNG state per board
+
+        self.rewards = np.zeros(count, dtype=np.int64)
+        self.dones = np.zeros(count, dtype=bool)
+        self.finalScores = np.zeros(count, dtype=np.int64) # score of the last finished game per board
+        self.episodes = np.zeros(count, dtype=np.int64)
+
+        self.seed(seeds)
+        self.reset()
+
+    # seeds is None (random), one int (board i gets seed + i) or one int per board
+    def seed(self, seeds=None):
+        if seeds is None:
+            seeds = int.from_bytes(os.urandom(8), 'little')
+        if np.ndim(seeds) == 0:
+            seeds = (int(seeds) + np.arange(self.count, dtype=np.uint64)) & 0xFFFFFFFFFFFFFFFF
+        self.state[:] = np.asarray(seeds, dtype=np.uint64)
+
+    # Uniform floats in [0, 1) for the given boards, advancing only their streams
+    def random(self, rows):
+        state = self.state[rows] + GOLDEN
+        self.state[rows] = state
+        z = (state ^ (state >> np.uint64(30))) * MIX1
+        z = (z ^ (z >> np.uint64(27))) * MIX2
+        z ^= z >> np.uint64(31)
+        return (z >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    # Board state as uint8, shares memory with the batch
+    def observe(self):
+        return self.board.view(np.uint8)
+
+    def reset(self, rows=None):
+        rows = self.rows if rows is None else rows
+        self.board[rows] = False
+        self.blackTiles[rows] = 0
+        self.score[rows] = 0
+        self.combo[rows] = 0
+        self.bonusActive[rows] = False
+        self.timer[rows] = ENDURANCE_START_TIMER if self.mode is ENDURANCE else FRENZY_START_TIMER
+        self.init_tiles(rows)
+        return self.observe()
+
+    def init_tiles(self, rows):
+        for i in range(BLACK_TILES):
+            self.make_random_tiles_black(rows)
+
+    # make_random_tile_black for every board in rows, never picking the
+    # tile in ignore (one per row) if given
+    def make_random_tiles_black(self, rows, ignore=None):
+        if len(rows) == 0:
+            return
+        white = ~self.board[rows]
+        if ignore is not None:
+            white[np.arange(len(rows)), ignore] = False
+        whiteTiles = np.count_nonzero(white, axis=1)
+
+        # the k-th white tile, like tileOrder[blackTiles + k] in GameCore
+        k = (self.random(rows) * whiteTiles).astype(np.int64)
+        tileIdx = np.argmax(np.cumsum(white, axis=1, dtype=np.int32) > k[:, None], axis=1)
+
+        spawned = whiteTiles > 0
+        rows, tileIdx = rows[spawned], tileIdx[spawned]
+        self.board[rows, tileIdx] = True
+        self.blackTiles[rows] += 1
+
+    # One frame for every board, actions holds a tile index or -1 per board.
+    # Returns (observation, score gained, game ended) per board.
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = self.rewards
+        rewards[:] = 0
+        running = np.ones(self.count, dtype=bool)
+
+        # click
+        clicked = np.flatnonzero(actions >= 0)
+        tiles = actions[clicked]
+        black = self.board[clicked, tiles]
+        running[clicked[~black]] = False # clicked a white tile
+        rows, tiles = clicked[black], tiles[black]
+        if len(rows):
+            self.board[rows, tiles] = False
+            self.blackTiles[rows] -= 1
+
+            bonus = self.bonusActive[rows]
+            self.make_random_tiles_black(rows[~bonus], tiles[~bonus])
+            cleared = rows[bonus & (self.blackTiles[rows] == 0)]
+            self.bonusActive[cleared] = False
+            self.init_tiles(cleared)
+
+            if self.mode is FRENZY:
+                gain = (self.combo[rows] * FRENZY_SCORE_STEPS / core.GameCore.COMBO_THRESHOLD).astype(np.int64) + 1
+            else:
+                gain = 1
+            self.score[rows] += gain
+            rewards[rows] = gain
+            self.combo[rows] += core.GameCore.COMBO_GAIN
+
+            if self.mode is ENDURANCE:
+                self.timer[rows[self.score[rows] % ENDURANCE_TIME_GAIN_THRESHOLD == 0]] += EUNDRANCE_TIME_GAIN
+
+        # advance, boards that just lost don't run the frame rules
+        combo = self.combo
+        if self.mode is ENDURANCE:
+            bonus = running & (combo >= core.GameCore.COMBO_THRESHOLD)
+            self.board[bonus] = True
+            self.blackTiles[bonus] = self.tileCount
+            combo[bonus] = 0
+            self.bonusActive[bonus] = True
+
+        decay = running & (combo > 0)
+        combo[decay] -= core.GameCore.COMBO_LOSS_PER_FRAME
+        self.timer[running] -= self.dt
+        if self.mode is FRENZY:
+            np.minimum(combo, core.GameCore.COMBO_THRESHOLD, out=combo)
+
+        dones = self.dones
+        np.logical_or(~running, self.timer <= 0, out=dones)
+        ended = np.flatnonzero(dones)
+        if len(ended):
+            self.finalScores[ended] = self.score[ended]
+            self.episodes[ended] += 1
+            self.reset(ended)
+        return self.observe(), rewards, dones